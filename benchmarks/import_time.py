@@ -0,0 +1,91 @@
+"""
+Import-time benchmark for swiftllm.
+
+Runs each import statement in a fresh interpreter with `python -X importtime` and reports the cumulative import time of the
+statement and the heaviest modules it pulled in, as JSON. Use --max-ms to fail (exit code 1) when `import swiftllm` gets slower
+than a threshold, e.g. in CI.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --max-ms 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+STATEMENTS: list[str] = [
+    'import swiftllm',
+    'from swiftllm import LanguageModel',
+    'from swiftllm import OpenAI',
+    'from swiftllm import Groq',
+]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str):
+    """
+    Parses the output of -X importtime into a list of (module, depth, cumulative_us) tuples. Modules imported directly by
+    the statement have depth 0.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(cumulative_us)))
+
+    return modules
+
+
+def run_importtime(statement: str):
+    """
+    Runs the statement in a fresh interpreter with -X importtime and returns the completed process.
+    """
+    env = {**os.environ, 'PYTHONPATH': REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', '')}
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, env=env)
+
+
+def measure(statement: str, startup_modules: set):
+    """
+    Runs the statement in a fresh interpreter and returns the total import time in ms, the number of modules imported and the
+    five slowest top-level imports. Modules the interpreter imports at startup are not counted.
+    """
+    result = run_importtime(statement)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1]}
+    modules = [module for module in parse_importtime(result.stderr) if module[0] not in startup_modules]
+    top_level = [(name, cumulative) for name, depth, cumulative in modules if depth == 0]
+    total_us = sum(cumulative for _, cumulative in top_level)
+    heaviest = sorted(top_level, key=lambda item: item[1], reverse=True)[:5]
+
+    return {
+        'total_ms': round(total_us / 1000, 2),
+        'modules': len(modules),
+        'heaviest_ms': {name: round(cumulative / 1000, 2) for name, cumulative in heaviest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per statement, the fastest one is reported')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if "import swiftllm" takes longer than this')
+    args = parser.parse_args()
+
+    startup_modules = {name for name, _, _ in parse_importtime(run_importtime('pass').stderr)}
+    results = {}
+    for statement in STATEMENTS:
+        runs = [measure(statement, startup_modules) for _ in range(args.repeat)]
+        valid = [run for run in runs if 'error' not in run]
+        results[statement] = min(valid, key=lambda run: run['total_ms']) if valid else runs[0]
+
+    print(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2))
+
+    if args.max_ms is not None and results['import swiftllm'].get('total_ms', float('inf')) > args.max_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Local stand-in for the OpenAI and Groq chat completions API, for benchmarks that must not hit (or pay for) the real APIs.
+
+It answers POST .../chat/completions (both /v1/chat/completions for the OpenAI SDK and /openai/v1/chat/completions for the
+Groq SDK) with a canned reply, either as one JSON body or as a server-sent event stream, after a configurable latency. A
+share of the requests can fail with a 500 or a 429 (with retry-after-ms), so retries and rate limit handling are exercised
+too. Point the wrappers at it with base_url:
+
+    with MockServer(MockConfig(latency=0.05)) as server:
+        model = OpenAI(model='gpt-4o', api_key='mock', base_url=server.openai_base_url)
+        model = Groq(model='llama3-8b', api_key='mock', base_url=server.groq_base_url)
+
+Run it on its own with `python benchmarks/mock_server.py --port 8000 --latency 0.05`.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockConfig:
+
+    """
+    Behavior of the mock server.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, tokens_per_second: float | None = None, error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 0.01, content: str | dict = 'Hello! How can I help you today?', json_content: dict | None = None, seed: int | None = None, slow_rate: float = 0.0, slow_latency: float = 0.0):
+        """
+        Initialize the MockConfig object.
+
+        Args:
+            latency (float, optional): Seconds before the response (or the first streamed token) is sent. Defaults to 0.0.
+            jitter (float, optional): Extra random latency between 0 and jitter seconds. Defaults to 0.0.
+            tokens_per_second (float | None, optional): Pace of streamed tokens. Defaults to None (as fast as possible).
+            error_rate (float, optional): Share of requests answered with a 500. Defaults to 0.0.
+            rate_limit_rate (float, optional): Share of requests answered with a 429. Defaults to 0.0.
+            retry_after (float, optional): Seconds sent in the retry-after-ms header of a 429. Defaults to 0.01.
+            content (str | dict, optional): Reply to normal requests (dicts are sent as JSON). Defaults to a greeting.
+            json_content (dict | None, optional): Reply to requests that ask for JSON (see wants_json). Defaults to None (content).
+            seed (int | None, optional): Seed of the random error injection and jitter. Defaults to None.
+            slow_rate (float, optional): Share of requests delayed by slow_latency on top, like the latency spikes of a
+                busy provider. Defaults to 0.0.
+            slow_latency (float, optional): Extra seconds of a slow request. Defaults to 0.0.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.content = content
+        self.json_content = json_content
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock() # Random is shared by the handler threads
+
+    def draw(self):
+        """
+        Returns a random number in [0, 1) and the extra latency (jitter and slow requests) in seconds for one request.
+        """
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                extra += self.slow_latency
+            return self.random.random(), extra
+
+
+def split_tokens(text: str):
+    """
+    Splits text into stream deltas of roughly one word each, keeping the whitespace so they join back to the text.
+    """
+    tokens = []
+    start = 0
+    for index in range(1, len(text) + 1):
+        if index == len(text) or text[index] == ' ':
+            tokens.append(text[start:index])
+            start = index
+    return tokens
+
+
+def wants_json(request: dict):
+    """
+    Returns True if a request asks for JSON: it sets response_format json_object, or its first system message or last message
+    mentions JSON (the system message of models with a schema does).
+    """
+    if (request.get('response_format') or {}).get('type') == 'json_object':
+        return True
+    messages = request.get('messages') or [{}]
+    system = next((message for message in messages if message.get('role') == 'system'), {})
+    return any('JSON' in str(message.get('content') or '') for message in (system, messages[-1]))
+
+
+def count_prompt_tokens(messages: list):
+    """
+    Returns the prompt tokens the mock reports for a list of messages: about 4 characters per token plus 4 per message.
+    """
+    return sum(len(str(message.get('content') or '')) // 4 + 4 for message in messages)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    """
+    Request handler of the mock server. The server's config attribute holds its MockConfig and its stats attribute counts the
+    answered requests by status.
+    """
+
+    protocol_version = 'HTTP/1.1' # keep connections alive like the real APIs
+    disable_nagle_algorithm = True # send every streamed token right away
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output clean
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # the client gave up on the request, e.g. the cancelled loser of a hedged request
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not self.path.endswith('/chat/completions'):
+            return self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+        request = json.loads(body or b'{}')
+        config = self.server.config
+        roll, extra = config.draw()
+        time.sleep(config.latency + extra)
+        if roll < config.rate_limit_rate:
+            headers = {'retry-after-ms': str(int(config.retry_after * 1000))}
+            return self.send_json(429, {'error': {'message': 'Rate limit reached (mock).', 'type': 'rate_limit_exceeded'}}, headers)
+        if roll < config.rate_limit_rate + config.error_rate:
+            return self.send_json(500, {'error': {'message': 'Internal server error (mock).', 'type': 'server_error'}})
+
+        content = config.content
+        if config.json_content is not None and wants_json(request):
+            content = config.json_content
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        prompt_tokens = count_prompt_tokens(request.get('messages', []))
+        completion_tokens = len(split_tokens(content))
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+        completion = {
+            'id': 'chatcmpl-mock',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'system_fingerprint': 'mock',
+        }
+        if request.get('stream'):
+            return self.send_stream(completion, content, usage, request)
+        self.send_json(200, {
+            **completion,
+            'object': 'chat.completion',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None, 'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage,
+        })
+
+    def send_json(self, status: int, payload: dict, headers: dict | None = None):
+        """
+        Sends a JSON response.
+        """
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.stats[status] = self.server.stats.get(status, 0) + 1
+
+    def send_stream(self, completion: dict, content: str, usage: dict, request: dict):
+        """
+        Sends the content as a server-sent event stream of chat.completion.chunk objects, paced by tokens_per_second. The usage
+        is sent in a final chunk if stream_options.include_usage is set (OpenAI) and in x_groq of the last chunk (Groq).
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        interval = 1 / self.server.config.tokens_per_second if self.server.config.tokens_per_second else 0.0
+        tokens = split_tokens(content)
+        for index, token in enumerate(tokens):
+            if index and interval:
+                time.sleep(interval)
+            delta = {'role': 'assistant', 'content': token} if index == 0 else {'content': token}
+            self.send_event({**completion, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None, 'logprobs': None}]})
+        last = {**completion, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop', 'logprobs': None}]}
+        if self.path.startswith('/openai/'):
+            last['x_groq'] = {'id': 'req-mock', 'usage': usage}
+        self.send_event(last)
+        if (request.get('stream_options') or {}).get('include_usage'):
+            self.send_event({**completion, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})
+        self.send_chunk(b'data: [DONE]\n\n')
+        self.send_chunk(b'')
+        self.server.stats[200] = self.server.stats.get(200, 0) + 1
+
+    def send_event(self, payload: dict):
+        """
+        Sends one server-sent event.
+        """
+        self.send_chunk(b'data: ' + json.dumps(payload).encode('utf-8') + b'\n\n')
+
+    def send_chunk(self, data: bytes):
+        """
+        Sends one chunk of a chunked transfer encoded body (an empty chunk ends the body).
+        """
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+
+    """
+    ThreadingHTTPServer with a listen backlog large enough for a burst of concurrent connections. With the default of 5, the
+    connections of a concurrent benchmark overflow it and wait a whole SYN retransmission (about 1 second) to be accepted.
+    """
+
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class MockServer:
+
+    """
+    Runs the mock API on a background thread. Use it as a context manager or call start() and stop().
+    """
+
+    def __init__(self, config: MockConfig | None = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Initialize the MockServer object.
+
+        Args:
+            config (MockConfig | None, optional): Behavior of the server. Defaults to None (MockConfig()).
+            host (str, optional): Interface to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on. Defaults to 0 (a free port).
+        """
+        self.server = MockHTTPServer((host, port), MockHandler)
+        self.server.config = config or MockConfig()
+        self.server.stats = {} # status code -> number of responses
+        self.thread = None
+
+    @property
+    def config(self):
+        return self.server.config
+
+    @property
+    def stats(self):
+        return self.server.stats
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def openai_base_url(self):
+        return self.url + '/v1'
+
+    @property
+    def groq_base_url(self):
+        return self.url
+
+    def start(self):
+        """
+        Starts serving on a background thread.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name='swiftllm-mock-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and closes its socket.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency in seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='pace of streamed tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of requests delayed by --slow-latency')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='extra seconds of a slow request')
+    parser.add_argument('--content', default=None, help='canned reply (JSON objects are sent as they are)')
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.jitter, args.tokens_per_second, args.error_rate, args.rate_limit_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    if args.content is not None:
+        config.content = args.content
+    server = MockServer(config, args.host, args.port)
+    print(f'Mock API on {server.url} (OpenAI base_url {server.openai_base_url}, Groq base_url {server.groq_base_url})')
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
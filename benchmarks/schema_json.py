@@ -0,0 +1,161 @@
+"""
+Micro-benchmarks for response validation and JSON extraction.
+
+Compares the compiled SchemaValidator with the recursive validator LanguageModel used before, and find_json with the greedy
+regex parse_json_content used before, on typical and adversarial model outputs. Prints the best time per call in
+microseconds as JSON; calls that raise are timed too and their exception is reported. The previous implementations are
+copied here so the comparison keeps working.
+
+    python benchmarks/schema_json.py
+    python benchmarks/schema_json.py --number 200 --repeat 5
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftllm.schema import SchemaValidator, find_json
+
+SCHEMA: dict = {
+    'name': 'str',
+    'age': 'int',
+    'title': 'str',
+    'address': {'street': 'str', 'city': 'str', 'zip': 'str'},
+    'jobs': [{'company': 'str', 'role': 'str', 'years': 'float'}],
+    'skills': ['str'],
+}
+
+STRUCTURE_SCHEMA: dict = { # leaves are descriptions, so only keys and containers are checked (what the legacy validator checks)
+    'name': 'full name',
+    'age': 'age in years',
+    'title': 'job title',
+    'address': {'street': 'street', 'city': 'city', 'zip': 'postal code'},
+    'jobs': [{'company': 'employer', 'role': 'position', 'years': 'years employed'}],
+    'skills': ['skill'],
+}
+
+RESPONSE: dict = {
+    'name': 'Zachary Ivie',
+    'age': 29,
+    'title': 'data scientist',
+    'address': {'street': '1 Main St', 'city': 'Provo', 'zip': '84601'},
+    'jobs': [{'company': f'Company {i}', 'role': 'engineer', 'years': 1.5} for i in range(50)],
+    'skills': [f'skill {i}' for i in range(50)],
+}
+
+
+def legacy_validate(response: dict, schema: dict):
+    """
+    The recursive validator LanguageModel.validate_response_schema used before schemas were compiled.
+    """
+    if schema.keys() != response.keys():
+        raise KeyError('Generated response does not match the schema.')
+    for k in schema.keys():
+        if isinstance(schema[k], dict):
+            legacy_validate(response[k], schema[k])
+        if isinstance(schema[k], list) and not isinstance(response[k], list):
+            raise ValueError(f'Expected a list for key "{k}" in response.')
+        if not schema[k] or not response[k] or not isinstance(schema[k], list):
+            continue
+        if isinstance(schema[k][0], dict):
+            for obj in response[k]:
+                legacy_validate(obj, schema[k][0])
+    return True
+
+
+def legacy_parse(content: str):
+    """
+    The greedy regex LanguageModel.parse_json_content used before find_json.
+    """
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            raise ValueError('Model failed to generate a valid JSON string.')
+    raise ValueError('Model failed to generate a valid JSON string.')
+
+
+def texts():
+    """
+    Returns the model outputs the extractors are timed on.
+    """
+    document = json.dumps(RESPONSE)
+    return {
+        'bare_json': document,
+        'prose_around_json': f'Here is the JSON you asked for:\n```json\n{document}\n```\nLet me know if you need anything else.',
+        'two_objects': f'{document}\n\nAlternative answer: {document}',
+        'stray_braces_after_json': document + ' Note: fill in {name} and {age} as needed.' * 200,
+        'unclosed_braces': 'The template uses { for every field ' * 2000,
+    }
+
+
+def best_us(function, number: int, repeat: int):
+    """
+    Returns the best time of one call of function in microseconds, and the name of the exception it raises (or None).
+    Calls that raise are timed too, since failing slowly on a bad output is part of the cost.
+    """
+    error = None
+    try:
+        function()
+    except Exception as e:
+        error = type(e).__name__
+
+    def call():
+        try:
+            function()
+        except Exception:
+            pass
+
+    return round(min(timeit.repeat(call, number=number, repeat=repeat)) / number * 1e6, 2), error
+
+
+def compare(functions: dict, number: int, repeat: int):
+    """
+    Times each function and returns {name_us: time}, plus {name_error: exception name} for the ones that raised.
+    """
+    result = {}
+    for name, function in functions.items():
+        result[f'{name}_us'], error = best_us(function, number, repeat)
+        if error:
+            result[f'{name}_error'] = error
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=100, help='calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the fastest one is reported')
+    args = parser.parse_args()
+
+    validator = SchemaValidator(SCHEMA)
+    structure = SchemaValidator(STRUCTURE_SCHEMA)
+    results = {
+        'validate': {
+            'typed_schema': compare({
+                'legacy': lambda: legacy_validate(RESPONSE, SCHEMA),
+                'compiled': lambda: validator.validate(RESPONSE),
+                'compile': lambda: SchemaValidator(SCHEMA),
+            }, args.number, args.repeat),
+            'descriptive_schema': compare({
+                'legacy': lambda: legacy_validate(RESPONSE, STRUCTURE_SCHEMA),
+                'compiled': lambda: structure.validate(RESPONSE),
+            }, args.number, args.repeat),
+        },
+        'extract': {},
+    }
+    for name, text in texts().items():
+        results['extract'][name] = {'chars': len(text), **compare({
+            'legacy': lambda: legacy_parse(text),
+            'find_json': lambda: find_json(text),
+        }, args.number, args.repeat)}
+
+    print(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
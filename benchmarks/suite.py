@@ -0,0 +1,354 @@
+"""
+Offline benchmark suite for swiftllm. Starts the mock API from mock_server.py and measures, without network access or cost:
+
+    prompt_serial        prompt() latency and throughput one call at a time, and the library overhead on top of the server latency
+    prompt_concurrent    prompt_many() (threads) and aprompt_many() (asyncio) throughput and speedup over serial
+    stream               time to first token and token rate of stream()
+    json                 end-to-end JSON prompts, and the in-process cost of extracting and validating the JSON
+    memory               growth of prev_messages, activity_log and traced memory over one long conversation, with the
+                         default configuration (every message kept and resent) and with a LastNTurns history policy
+    prompt_tokens        prompt tokens per JSON call with the compiled prompt template, against the layout before it
+    router               tail latency of one model with latency spikes, and of a Router over it and a second backend,
+                         without and with hedged requests
+
+Results are printed as JSON (and written to --output) so runs can be compared across releases:
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --provider groq --latency 0.05 --calls 500 --output results.json
+    python benchmarks/suite.py --only memory --memory-calls 10000 --memory-default-calls 500
+    python benchmarks/suite.py --only router --slow-rate 0.02 --slow-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockServer, MockConfig, count_prompt_tokens
+from swiftllm.schema import SchemaValidator, find_json
+
+SCHEMA: dict = {'name': 'str', 'age': 'int', 'title': 'str', 'skills': ['str']}
+JSON_CONTENT: dict = {'name': 'Zachary Ivie', 'age': 29, 'title': 'data scientist', 'skills': ['python', 'sql', 'statistics']}
+INSTRUCTIONS: str = 'Find all the names, ages, titles and skills in the text provided.'
+TARGET_TEXT: str = 'Zachary Ivie is a 29 year old data scientist currently looking for new opportunities.'
+STREAM_CONTENT: str = ' '.join(f'token{i}' for i in range(50))
+BENCHMARKS: tuple = ('prompt_serial', 'prompt_concurrent', 'stream', 'json', 'memory', 'prompt_tokens', 'router')
+
+
+def make_model(provider: str, server: MockServer, **kwargs):
+    """
+    Returns an OpenAI or Groq model pointed at the mock server.
+    """
+    if provider == 'groq':
+        from swiftllm import Groq
+        return Groq(model='llama3-8b', api_key='mock', base_url=server.groq_base_url, **kwargs)
+    from swiftllm import OpenAI
+    return OpenAI(model='gpt-4o', api_key='mock', base_url=server.openai_base_url, **kwargs)
+
+
+def latency_stats(latencies: list):
+    """
+    Returns the mean, p50, p95, p99 and max of a list of latencies in milliseconds.
+    """
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return {
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(pick(0.5) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def bench_prompt_serial(provider: str, server: MockServer, args):
+    model = make_model(provider, server)
+    model.prompt('warm up') # opens the connection
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.calls):
+        history = model.new_history()
+        call_start = time.perf_counter()
+        model.prompt(f'prompt {i}', history=history)
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    stats = latency_stats(latencies)
+    model.close()
+
+    return {
+        'calls': args.calls,
+        'calls_per_second': round(args.calls / elapsed, 2),
+        **stats,
+        'overhead_ms': round(stats['mean_ms'] - server.config.latency * 1000, 3),
+    }
+
+
+def bench_prompt_concurrent(provider: str, server: MockServer, args):
+    model = make_model(provider, server)
+    inputs = [f'prompt {i}' for i in range(args.calls)]
+    model.prompt('warm up')
+
+    start = time.perf_counter()
+    results = model.prompt_many(inputs, max_concurrency=args.concurrency)
+    threaded = time.perf_counter() - start
+
+    async def run():
+        await model.aprompt('warm up', history=model.new_history()) # opens this event loop's async client and connection
+        start = time.perf_counter()
+        results = await model.aprompt_many(inputs, max_concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        await model.aclose() # the async client's connections belong to this event loop
+        return results, elapsed
+    async_results, asynchronous = asyncio.run(run())
+    serial_estimate = args.calls * (server.config.latency or 1e-9)
+
+    return {
+        'calls': args.calls,
+        'concurrency': args.concurrency,
+        'threads_calls_per_second': round(args.calls / threaded, 2),
+        'threads_failed': sum(isinstance(result, Exception) or result is None for result in results),
+        'asyncio_calls_per_second': round(args.calls / asynchronous, 2),
+        'asyncio_failed': sum(isinstance(result, Exception) or result is None for result in async_results),
+        'threads_speedup_vs_serial_latency': round(serial_estimate / threaded, 2),
+        'asyncio_speedup_vs_serial_latency': round(serial_estimate / asynchronous, 2),
+    }
+
+
+def bench_stream(provider: str, server: MockServer, args):
+    server.config.content = STREAM_CONTENT
+    server.config.tokens_per_second = args.tokens_per_second
+    model = make_model(provider, server)
+    try:
+        list(model.stream('warm up', history=model.new_history()))
+        ttfts, rates = [], []
+        for i in range(args.streams):
+            for _ in model.stream(f'prompt {i}', history=model.new_history()):
+                pass
+            ttfts.append(model.last_stream_stats['time_to_first_token'])
+            rates.append(model.last_stream_stats['tokens_per_second'] or 0.0)
+    finally:
+        server.config.content = MockConfig().content
+        server.config.tokens_per_second = None
+        model.close()
+    stats = latency_stats(ttfts)
+
+    return {
+        'streams': args.streams,
+        'tokens_per_stream': len(STREAM_CONTENT.split()),
+        'server_tokens_per_second': args.tokens_per_second,
+        **{f'ttft_{name}': value for name, value in stats.items()},
+        'ttft_overhead_ms': round(stats['mean_ms'] - server.config.latency * 1000, 3),
+        'mean_tokens_per_second': round(sum(rates) / len(rates), 1),
+    }
+
+
+def bench_json(provider: str, server: MockServer, args):
+    server.config.json_content = JSON_CONTENT
+    model = make_model(provider, server, schema=SCHEMA, response_type='JSON')
+    try:
+        model.prompt('warm up', history=model.new_history())
+        latencies = []
+        for i in range(args.calls):
+            call_start = time.perf_counter()
+            response = model.prompt(f'prompt {i}', history=model.new_history())
+            latencies.append(time.perf_counter() - call_start)
+    finally:
+        server.config.json_content = None
+        model.close()
+
+    content = f'Here is the JSON:\n```json\n{json.dumps(JSON_CONTENT)}\n```'
+    validator = SchemaValidator(SCHEMA)
+    number = 10000
+    return {
+        'calls': args.calls,
+        'valid_response': response == JSON_CONTENT,
+        **latency_stats(latencies),
+        'find_json_us': round(timeit.timeit(lambda: find_json(content), number=number) / number * 1e6, 3),
+        'validate_us': round(timeit.timeit(lambda: validator.validate(JSON_CONTENT), number=number) / number * 1e6, 3),
+    }
+
+
+def measure_conversation(model, calls: int):
+    """
+    Prompts the model calls times in one conversation and returns the time taken and memory growth, with checkpoints.
+    """
+    model.prompt('warm up')
+    checkpoints = []
+    step = max(calls // 10, 1)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(1, calls + 1):
+        model.prompt(f'prompt {i}')
+        if i % step == 0 or i == calls:
+            checkpoints.append({
+                'calls': i,
+                'prev_messages': len(model.prev_messages),
+                'activity_log': len(model.activity_log),
+                'traced_kb': round((tracemalloc.get_traced_memory()[0] - baseline) / 1024, 1),
+            })
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    model.close()
+
+    return {
+        'calls': calls,
+        'seconds': round(elapsed, 2),
+        'bytes_per_call': round(checkpoints[-1]['traced_kb'] * 1024 / calls, 1),
+        'checkpoints': checkpoints,
+    }
+
+
+def bench_memory(provider: str, server: MockServer, args):
+    from swiftllm.history import LastNTurns
+    # One long conversation. By default every message stays in prev_messages and is resent with every request, so memory and
+    # time per call grow with the conversation (the run is quadratic, mostly in the SDK's request encoding, hence fewer
+    # calls). With a history policy prev_messages is trimmed after every turn, and what is left to grow is the bounded
+    # activity log and metrics buffers.
+    return {
+        'default': {'history_policy': None, **measure_conversation(make_model(provider, server), args.memory_default_calls)},
+        'last_n_turns': {'history_policy': 'LastNTurns(5)', **measure_conversation(make_model(provider, server, history_policy=LastNTurns(5)), args.memory_calls)},
+    }
+
+
+def legacy_messages(provider: str, prompt: str):
+    """
+    Returns the messages a JSON prompt was sent with before the prompt template: OpenAI sent its system message and
+    acknowledgement twice and repeated the schema and samples in every user message, and Groq formatted its instructions
+    twice, so the schema was in the system message twice. Schemas were serialized with json.dumps defaults.
+    """
+    acknowledgement = {'role': 'assistant', 'content': 'OK. I will follow the system instructions to the best of my ability.'}
+    samples = [JSON_CONTENT]
+    if provider == 'openai':
+        system = {'role': 'system', 'content': INSTRUCTIONS}
+        wrapper = f'Input: {prompt}\n\nOutput JSON Schema:\n{json.dumps(SCHEMA)}\n\nList of Sample Outputs:\n{json.dumps(samples)}'
+        return [system, acknowledgement, system, acknowledgement, {'role': 'user', 'content': wrapper}]
+
+    def format_instructions(instructions):
+        instructions = 'SYSTEM INSTRUCTIONS:\n' + instructions.strip()
+        instructions += '\n\nReturn your output as a correct JSON string. It should be loadable with the python command json.loads(output).\n\nOutput Schema:\n' + json.dumps(SCHEMA)
+        return instructions + '\n\n'.join([f'Sample Output {i+1}:\n{json.dumps(s)}' for i, s in enumerate(samples)])
+    return [{'role': 'system', 'content': format_instructions(format_instructions(INSTRUCTIONS))}, acknowledgement, {'role': 'user', 'content': prompt}]
+
+
+def bench_prompt_tokens(provider: str, server: MockServer, args):
+    server.config.json_content = JSON_CONTENT
+    model = make_model(provider, server, instructions=INSTRUCTIONS, schema=SCHEMA, sample_outputs=[JSON_CONTENT], response_type='JSON')
+    try:
+        model.prompt(TARGET_TEXT, history=model.new_history())
+        compact = model.metrics.calls[-1].prompt_tokens # as counted by the mock server
+    finally:
+        server.config.json_content = None
+        model.close()
+    legacy = count_prompt_tokens(legacy_messages(provider, TARGET_TEXT))
+    number = 10000
+    samples = [JSON_CONTENT]
+
+    return {
+        'legacy_prompt_tokens': legacy,
+        'compact_prompt_tokens': compact,
+        'saved_tokens_per_call': legacy - compact,
+        'saved_share': round((legacy - compact) / legacy, 4),
+        'saved_tokens_per_1000_calls': (legacy - compact) * 1000,
+        'template_tokens': model.template.overhead_tokens(),
+        'legacy_wrapper_us': round(timeit.timeit(lambda: f'Input: {TARGET_TEXT}\n\nOutput JSON Schema:\n{json.dumps(SCHEMA)}\n\nList of Sample Outputs:\n{json.dumps(samples)}', number=number) / number * 1e6, 3),
+    }
+
+
+def bench_router(provider: str, server: MockServer, args):
+    from swiftllm.router import Router
+    # The main server has occasional latency spikes; a second server is a backend that is a bit slower but steady.
+    server.config.slow_rate, server.config.slow_latency = args.slow_rate, args.slow_latency
+    secondary = MockServer(MockConfig(latency=args.latency * 1.5, seed=1)).start()
+
+    def measure(prompt):
+        prompt('warm up')
+        latencies = []
+        for i in range(args.router_calls):
+            call_start = time.perf_counter()
+            prompt(f'prompt {i}')
+            latencies.append(time.perf_counter() - call_start)
+        return latency_stats(latencies)
+
+    results = {}
+    try:
+        model = make_model(provider, server)
+        results['single_model'] = measure(lambda text: model.prompt(text, history=model.new_history()))
+        model.close()
+
+        for name, hedge in (('router', False), ('router_hedged', True)):
+            with Router([make_model(provider, server), make_model(provider, secondary)], hedge=hedge) as router:
+                results[name] = measure(router.prompt)
+                summary = router.summary()
+            extra = sum(backend['hedges'] for backend in summary['backends'].values()) + summary['failovers'] # one extra request per hedge and per failover
+            results[name]['extra_requests'] = round(extra / (args.router_calls + 1), 4)
+            results[name]['backends'] = summary['backends']
+    finally:
+        server.config.slow_rate = 0.0
+        secondary.stop()
+
+    results['p99_speedup'] = round(results['single_model']['p99_ms'] / results['router_hedged']['p99_ms'], 2)
+    return {'calls': args.router_calls, 'slow_rate': args.slow_rate, 'slow_latency': args.slow_latency, **results}
+
+
+def git_revision():
+    """
+    Returns the git commit of the working tree, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', choices=['openai', 'groq'], default='openai')
+    parser.add_argument('--only', choices=BENCHMARKS, nargs='+', default=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency in seconds')
+    parser.add_argument('--calls', type=int, default=200, help='calls per throughput benchmark')
+    parser.add_argument('--concurrency', type=int, default=16, help='max_concurrency of prompt_many/aprompt_many')
+    parser.add_argument('--streams', type=int, default=20, help='streams in the streaming benchmark')
+    parser.add_argument('--tokens-per-second', type=float, default=500.0, help='server token rate of streams')
+    parser.add_argument('--memory-calls', type=int, default=10000, help='calls in the memory benchmark with a history policy')
+    parser.add_argument('--memory-default-calls', type=int, default=200, help='calls in the memory benchmark without a history policy')
+    parser.add_argument('--router-calls', type=int, default=500, help='prompts per configuration in the router benchmark')
+    parser.add_argument('--slow-rate', type=float, default=0.02, help='share of slow requests in the router benchmark')
+    parser.add_argument('--slow-latency', type=float, default=0.5, help='extra seconds of a slow request in the router benchmark')
+    parser.add_argument('--output', default=None, help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with MockServer(MockConfig(latency=args.latency)) as server:
+        for name in args.only:
+            server.config.latency = 0.0 if name == 'memory' else args.latency
+            results[name] = globals()[f'bench_{name}'](args.provider, server, args)
+        server_stats = dict(server.stats)
+
+    report = {
+        'python': sys.version.split()[0],
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'server_responses': server_stats,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of NumpyVectorStore on random unit vectors: time to append the corpus, to reopen the store and answer the first
+query, exact top-k latency for one query and per query in a batch, and the latency and recall@k of the IVF index. Prints
+the results as JSON.
+
+    python benchmarks/vectorstore.py
+    python benchmarks/vectorstore.py --rows 300000 --dim 384 --dtype float16
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from swiftllm.vectorstore import NumpyVectorStore
+
+
+def timed(function, repeat: int = 1):
+    """
+    Returns the result of the last call and the mean seconds per call.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def recall(results: list, truth: list):
+    return float(np.mean([len({row for row, _ in hits} & set(rows)) / len(rows) for hits, rows in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=64, help='queries in the batched search')
+    parser.add_argument('--clusters', type=int, default=256, help='clusters of the synthetic corpus')
+    args = parser.parse_args()
+
+    random = np.random.default_rng(0)
+    # clustered data, like real embeddings, so the IVF recall is meaningful
+    centers = random.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    vectors = centers[random.integers(args.clusters, size=args.rows)] + 0.5 * random.normal(size=(args.rows, args.dim)).astype(np.float32)
+    queries = centers[random.integers(args.clusters, size=args.queries)] + 0.5 * random.normal(size=(args.queries, args.dim)).astype(np.float32)
+    results = {'rows': args.rows, 'dim': args.dim, 'dtype': args.dtype, 'k': args.k}
+
+    with tempfile.TemporaryDirectory() as path:
+        store = NumpyVectorStore(path, dtype=args.dtype)
+        texts = [''] * 10_000
+
+        def append():
+            for start in range(0, args.rows, 10_000):
+                store.add_vectors(vectors[start:start + 10_000], texts[:len(vectors[start:start + 10_000])])
+            store.persist()
+        results['append_seconds'] = round(timed(append)[1], 3)
+
+        store = NumpyVectorStore(path)
+        results['open_and_first_query_ms'] = round(timed(lambda: store.search_vectors(queries[0], args.k))[1] * 1000, 3)
+        exact, seconds = timed(lambda: store.search_vectors(queries, args.k))
+        results['exact_batched_ms_per_query'] = round(seconds / args.queries * 1000, 3)
+        results['exact_single_ms'] = round(timed(lambda: store.search_vectors(queries[0], args.k), repeat=10)[1] * 1000, 3)
+
+        _, seconds = timed(store.build_ivf)
+        results['ivf_build_seconds'] = round(seconds, 3)
+        results['ivf_nlist'] = len(store.centroids)
+        results['ivf_nprobe'] = store.nprobe
+        truth = [[row for row, _ in hits] for hits in exact]
+        ivf, seconds = timed(lambda: store.search_vectors(queries, args.k))
+        results['ivf_ms_per_query'] = round(seconds / args.queries * 1000, 3)
+        results['ivf_recall'] = round(recall(ivf, truth), 4)
+
+    print(json.dumps({'python': sys.version.split()[0], 'numpy': np.__version__, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
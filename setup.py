@@ -15,10 +15,27 @@ setup(
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: OS Independent'
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.10',
     install_requires=[
         'openai',
-        'requests',
         'groq',
     ],
+    extras_require={
+        'rag': [
+            'langchain',
+            'langchain-community',
+            'langchain-openai',
+            'chromadb',
+            'python-dotenv',
+            'numpy',
+        ],
+        'all': [
+            'langchain',
+            'langchain-community',
+            'langchain-openai',
+            'chromadb',
+            'python-dotenv',
+            'numpy',
+        ],
+    },
 )
\ No newline at end of file
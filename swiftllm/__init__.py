@@ -1,3 +1,24 @@
-from .genai_wrapper import LanguageModel
-from .openai_wrapper import OpenAI
-from .groq_wrapper import Groq
\ No newline at end of file
+import importlib
+
+# Provider classes (and RAG) are imported on first access so "import swiftllm" only loads the SDKs you actually use.
+_LAZY_ATTRIBUTES: dict = {
+    'LanguageModel': '.genai_wrapper',
+    'OpenAI': '.openai_wrapper',
+    'Groq': '.groq_wrapper',
+    'RAG': '.rag',
+    'Router': '.router',
+}
+
+__all__ = ['LanguageModel', 'OpenAI', 'Groq', 'Router'] # RAG is left out so "from swiftllm import *" doesn't require langchain
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value # cache it so __getattr__ is only called once per name
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,254 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+LOG_OFF: int = 0 # record nothing
+LOG_METADATA: int = 1 # record the time, role and cost of every entry but not the message
+LOG_MESSAGES: int = 2 # record messages too
+
+TIMESTAMP_FORMAT: str = '%Y-%m-%d %H:%M:%S'
+
+
+def is_http_response(obj: any):
+    """
+    Returns True if obj is a requests or httpx Response. Checked by module name so neither library has to be imported.
+    """
+    return type(obj).__module__.split('.')[0] in ('requests', 'httpx', 'httpx2') and hasattr(obj, 'status_code')
+
+
+def format_message(message: any):
+    """
+    Returns the text shown for a logged message: strings as they are, dicts and lists as JSON, HTTP responses as their body
+    and anything else (e.g. a RAW ChatCompletion) as str().
+    """
+    if message is None or isinstance(message, str):
+        return message
+    if isinstance(message, (dict, list)):
+        return json.dumps(message, default=str)
+    if is_http_response(message):
+        try:
+            return message.text
+        except Exception:
+            return f'model generated Response object with status code: {message.status_code}'
+    return str(message)
+
+
+class ActivityRecord:
+
+    """
+    One entry of the activity log. It keeps the raw timestamp and message, and only formats them when they are read, so
+    logging costs a single allocation on the request path. Dicts and lists are the exception: ActivityLog serializes them
+    when they are recorded, since the caller owns them and may change them afterwards. Supports dict-style access to
+    'timestamp', 'role', 'message' and 'total_inference_cost' like the dicts the log used to hold.
+    """
+
+    __slots__ = ('time', 'role', 'message', 'total_inference_cost')
+
+    def __init__(self, time: float, role: str, message: any, total_inference_cost: float):
+        self.time = time
+        self.role = role
+        self.message = message
+        self.total_inference_cost = total_inference_cost
+
+    def __getitem__(self, key: str):
+        if key == 'timestamp':
+            return datetime.fromtimestamp(self.time).strftime(TIMESTAMP_FORMAT)
+        if key == 'message':
+            return format_message(self.message)
+        if key in ('role', 'total_inference_cost'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: any):
+        if key not in ('role', 'message', 'total_inference_cost'):
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def as_dict(self):
+        """
+        Returns the record as a dict with a formatted timestamp and message.
+        """
+        return {'timestamp': self['timestamp'], 'role': self.role, 'message': self['message'], 'total_inference_cost': self.total_inference_cost}
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+class JSONLSink:
+
+    """
+    Writes activity records to a JSONL file from a background thread. Records are queued without blocking, written in batches
+    and the file is rotated (path -> path.1 -> path.2 ...) when it grows past max_bytes. If the writer falls behind by more
+    than max_queue records, new records are dropped and counted instead of slowing down the model. Records that can't be
+    serialized or written (e.g. the disk is full) are counted in errors, and the writer carries on with the next batch.
+    """
+
+    def __init__(self, path: str = 'swiftllm_activity.jsonl', max_bytes: int = 10_000_000, backups: int = 3, batch_size: int = 256, flush_interval: float = 1.0, max_queue: int = 10_000):
+        """
+        Initialize the JSONLSink object and start its writer thread.
+
+        Args:
+            path (str, optional): Path of the JSONL file. Defaults to 'swiftllm_activity.jsonl'.
+            max_bytes (int, optional): Size in bytes after which the file is rotated. Defaults to 10_000_000.
+            backups (int, optional): Number of rotated files kept. Defaults to 3.
+            batch_size (int, optional): Maximum number of records written at once. Defaults to 256.
+            flush_interval (float, optional): Seconds between flushes while records keep coming. Defaults to 1.0.
+            max_queue (int, optional): Maximum number of records waiting to be written. Defaults to 10_000.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.dropped: int = 0 # records dropped because the queue was full
+        self.written: int = 0
+        self.errors: int = 0 # records that could not be serialized or written
+        self.last_error: Exception | None = None
+        self.file = open(path, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self.run, name='swiftllm-activity-sink', daemon=True)
+        self.thread.start()
+        atexit.register(self.close) # write what is still queued when the interpreter exits
+
+    def write(self, record: ActivityRecord):
+        """
+        Queues a record for writing. Never blocks.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        """
+        Writer thread: waits for records and writes them in batches. The file is flushed when the queue runs empty, and at
+        least every flush_interval seconds while records keep coming.
+        """
+        last_flush = time.monotonic()
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in batch # close() queues None
+            lines = self.serialize([record for record in batch if record is not None])
+            try:
+                if self.file.closed: # a failed rotation left no file open
+                    self.file = open(self.path, 'a', encoding='utf-8')
+                if lines:
+                    self.file.write(''.join(lines))
+                    self.written += len(lines)
+                if closing or self.queue.empty() or time.monotonic() - last_flush >= self.flush_interval:
+                    self.file.flush()
+                    last_flush = time.monotonic()
+                    if self.file.tell() >= self.max_bytes:
+                        self.rotate()
+            except Exception as e: # e.g. OSError: keep the thread alive, or the queue would grow and close() would hang
+                self.errors += len(lines)
+                self.last_error = e
+            if closing:
+                self.file.close()
+                return
+
+    def serialize(self, records: list):
+        """
+        Returns the JSON lines of the records. A record that can't be serialized is counted in errors and skipped.
+        """
+        lines = []
+        for record in records:
+            try:
+                lines.append(json.dumps(record.as_dict(), default=str) + '\n')
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+        return lines
+
+    def rotate(self):
+        """
+        Renames path to path.1 (shifting older backups up and deleting the oldest) and reopens an empty file.
+        """
+        self.file.close()
+        try:
+            if self.backups > 0:
+                for index in range(self.backups - 1, 0, -1):
+                    if os.path.exists(f'{self.path}.{index}'):
+                        os.replace(f'{self.path}.{index}', f'{self.path}.{index + 1}')
+                os.replace(self.path, f'{self.path}.1')
+        finally:
+            self.file = open(self.path, 'a' if self.backups > 0 else 'w', encoding='utf-8') # appends to path if the rename failed
+
+    def close(self):
+        """
+        Writes the queued records, closes the file and stops the writer thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+class ActivityLog:
+
+    """
+    Bounded log of the prompts, responses and exceptions of a model. It keeps the last max_entries records in a ring buffer,
+    so long-running workers don't grow without limit, and can forward every record to a sink (e.g. JSONLSink) that keeps the
+    full history on disk. It behaves like a read-only list of ActivityRecords.
+    """
+
+    def __init__(self, max_entries: int | None = 1000, level: int = LOG_MESSAGES, sink: JSONLSink | None = None):
+        """
+        Initialize the ActivityLog object.
+
+        Args:
+            max_entries (int | None, optional): Number of records kept in memory. Defaults to 1000 (None keeps all of them).
+            level (int, optional): LOG_OFF, LOG_METADATA or LOG_MESSAGES. Defaults to LOG_MESSAGES.
+            sink (JSONLSink | None, optional): Receives every record as well. Defaults to None.
+        """
+        self.records: deque = deque(maxlen=max_entries)
+        self.level = level
+        self.sink = sink
+
+    def record(self, role: str, message: any, total_inference_cost: float):
+        """
+        Adds a record. Exceptions are stored as their message so their tracebacks (and the frames they reference) can be freed,
+        and dicts and lists as their JSON, so later changes to them by the caller don't change the log.
+        """
+        if self.level <= LOG_OFF:
+            return
+        if self.level < LOG_MESSAGES:
+            message = None
+        elif isinstance(message, BaseException):
+            message = str(message)
+        elif isinstance(message, (dict, list)):
+            message = format_message(message)
+        record = ActivityRecord(time.time(), role, message, total_inference_cost)
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink.write(record)
+
+    def clear(self):
+        """
+        Removes every record kept in memory.
+        """
+        self.records.clear()
+
+    def __getitem__(self, index: int):
+        return self.records[index]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
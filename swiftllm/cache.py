@@ -0,0 +1,199 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_request_key(kwargs: dict, response_type: str | None = None):
+    """
+    Returns a stable hash of the request kwargs (which include the model and messages) and the response type.
+    """
+    request = {'kwargs': kwargs, 'response_type': response_type}
+    serialized = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+
+    """
+    This is the base class for the response caches. A cache maps a stable hash of a request (model, messages, completion kwargs
+    and response type) to the serialized provider response, and counts hits and misses so you can see how much it saves.
+    """
+
+    def __init__(self, ttl: float | None = None):
+        """
+        Initialize the ResponseCache object.
+
+        Args:
+            ttl (float | None, optional): Seconds an entry stays valid. Defaults to None (entries never expire).
+        """
+        self.ttl = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = threading.Lock() # guards the counters, and the entries of the child classes
+
+    def make_key(self, kwargs: dict, response_type: str | None = None):
+        """
+        Returns a stable hash of the request kwargs (which include the model and messages) and the response type.
+        """
+        return make_request_key(kwargs, response_type)
+
+    def get(self, key: str):
+        """
+        Returns the cached value for the key, or None if the key is missing or expired. Updates the hit/miss counters.
+        """
+        value = self.lookup(key)
+        with self.lock: # get is called from the worker threads of prompt_many
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def expired(self, created: float):
+        """
+        Returns True if an entry created at the given time is older than the ttl.
+        """
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def stats(self):
+        """
+        Returns a dict with the number of hits and misses and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def lookup(self, key: str):
+        """
+        This method should be implemented in the child class. It returns the stored value for the key or None.
+        """
+        raise NotImplementedError('The lookup method must be implemented in child class.')
+
+    def set(self, key: str, value: str):
+        """
+        This method should be implemented in the child class. It stores the value under the key.
+        """
+        raise NotImplementedError('The set method must be implemented in child class.')
+
+    def delete(self, key: str):
+        """
+        This method should be implemented in the child class. It removes the entry of the key, if there is one.
+        """
+        raise NotImplementedError('The delete method must be implemented in child class.')
+
+    def clear(self):
+        """
+        This method should be implemented in the child class. It removes every entry from the cache.
+        """
+        raise NotImplementedError('The clear method must be implemented in child class.')
+
+
+class LRUCache(ResponseCache):
+
+    """
+    In-process response cache that evicts the least recently used entry once max_size is reached and drops entries older than ttl.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = None):
+        """
+        Initialize the LRUCache object.
+
+        Args:
+            max_size (int, optional): Maximum number of entries kept in memory. Defaults to 1024.
+            ttl (float | None, optional): Seconds an entry stays valid. Defaults to None (entries never expire).
+        """
+        super().__init__(ttl)
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+
+    def lookup(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.expired(entry[0]):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCache(ResponseCache):
+
+    """
+    Persistent response cache stored in a SQLite file, so identical requests are free across runs of a pipeline.
+    """
+
+    def __init__(self, path: str = 'swiftllm_cache.sqlite', ttl: float | None = None):
+        """
+        Initialize the SQLiteCache object.
+
+        Args:
+            path (str, optional): Path of the SQLite database file. Defaults to 'swiftllm_cache.sqlite'.
+            ttl (float | None, optional): Seconds an entry stays valid. Defaults to None (entries never expire).
+        """
+        import sqlite3 # only needed by this backend, so it is not loaded on import
+
+        super().__init__(ttl)
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)')
+        self.connection.commit()
+
+    def lookup(self, key: str):
+        with self.lock:
+            row = self.connection.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self.expired(row[1]):
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.connection.commit()
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)', (key, value, time.time()))
+            self.connection.commit()
+
+    def delete(self, key: str):
+        with self.lock:
+            self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM responses')
+            self.connection.commit()
+
+    def close(self):
+        """
+        Closes the connection to the SQLite file.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
@@ -0,0 +1,183 @@
+import asyncio
+import inspect
+import itertools
+import threading
+import weakref
+
+
+class PoolConfig:
+
+    """
+    Connection pool settings for the HTTP clients shared by model objects. Models with the same provider, credentials, base URL
+    and PoolConfig share one SDK client and therefore one pool of kept-alive connections.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0, timeout: float = 60.0):
+        """
+        Initialize the PoolConfig object.
+
+        Args:
+            max_connections (int, optional): Maximum number of open connections per client. Defaults to 100.
+            max_keepalive_connections (int, optional): Maximum number of idle connections kept open. Defaults to 20.
+            keepalive_expiry (float, optional): Seconds an idle connection is kept open. Defaults to 30.0.
+            timeout (float, optional): Request timeout in seconds. Defaults to 60.0.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+
+    def key(self):
+        """
+        Returns a tuple that identifies the settings, used as part of the client registry key.
+        """
+        return (self.max_connections, self.max_keepalive_connections, self.keepalive_expiry, self.timeout)
+
+    def http_client(self, sdk, is_async: bool = False):
+        """
+        Returns an HTTP client with these pool limits for an SDK module (openai or groq), built with the SDK's own default
+        client class so it matches the httpx flavor the SDK expects.
+        """
+        limits = type(sdk._constants.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        factory = sdk.DefaultAsyncHttpxClient if is_async else sdk.DefaultHttpxClient
+        return factory(limits=limits)
+
+
+DEFAULT_POOL = PoolConfig()
+
+LOOP_IDS = weakref.WeakKeyDictionary() # event loop -> number identifying it in client keys
+LOOP_COUNTER = itertools.count(1)
+LOOP_LOCK = threading.Lock()
+
+
+def get_loop_id(loop=None):
+    """
+    Returns a number that identifies an event loop (the running one by default) in the key of an async client. Unlike
+    id(loop) it is never reused by a later loop, so a key never matches the client of a loop that is gone.
+    """
+    loop = loop or asyncio.get_running_loop()
+    with LOOP_LOCK:
+        if (loop_id := LOOP_IDS.get(loop)) is None:
+            loop_id = LOOP_IDS[loop] = next(LOOP_COUNTER)
+    return loop_id
+
+
+def loop_closed(loop_ref):
+    """
+    Returns True if loop_ref is a weak reference to an event loop that is closed or gone, False for None (a sync client).
+    """
+    if loop_ref is None:
+        return False
+    loop = loop_ref()
+    return loop is None or loop.is_closed()
+
+
+def close_client(client):
+    """
+    Closes an SDK client. Async clients are closed on the running event loop if there is one, otherwise on a new one.
+    """
+    result = client.close()
+    if not inspect.isawaitable(result):
+        return
+    try:
+        asyncio.get_running_loop().create_task(result)
+    except RuntimeError:
+        try:
+            asyncio.run(result)
+        except RuntimeError:
+            pass # the client's connections belonged to an event loop that is already closed, so they are gone already
+
+
+async def aclose_client(client):
+    """
+    Async version of close_client. Async clients are awaited on the running event loop.
+    """
+    result = client.close()
+    if inspect.isawaitable(result):
+        await result
+
+
+class ClientRegistry:
+
+    """
+    Reference counted registry of SDK clients. acquire() returns the existing client for a key or creates it, and release()
+    hands the client back for closing once no model uses it anymore.
+
+    Async clients are bound to the event loop they were created on (their connections belong to it), so their keys contain
+    the loop's id (see get_loop_id) and each entry remembers its loop. Entries of loops that have closed are dropped: their
+    connections closed with the loop, and using them would fail with 'Event loop is closed'.
+    """
+
+    def __init__(self):
+        """
+        Initialize the ClientRegistry object.
+        """
+        self.clients: dict = {} # key -> [client, number of models using it, weak reference to the event loop of an async client or None]
+        self.lock = threading.Lock()
+
+    def acquire(self, key: tuple, factory, loop=None):
+        """
+        Returns the client registered under key, creating it with factory() if it doesn't exist yet. Pass the event loop of
+        an async client as loop.
+        """
+        with self.lock:
+            if loop is not None:
+                self.prune()
+            entry = self.clients.get(key)
+            if entry is None:
+                entry = self.clients[key] = [factory(), 0, None if loop is None else weakref.ref(loop)]
+            entry[1] += 1
+            return entry[0]
+
+    def prune(self):
+        """
+        Drops the async clients of event loops that have closed. Called with the lock held.
+        """
+        for key in [key for key, entry in self.clients.items() if loop_closed(entry[2])]:
+            del self.clients[key]
+
+    def release(self, key: tuple):
+        """
+        Releases one use of the client registered under key. Returns the client if it is no longer used (the caller should
+        close it), otherwise None.
+        """
+        with self.lock:
+            entry = self.clients.get(key)
+            if entry is None:
+                return None
+            entry[1] -= 1
+            if entry[1] > 0 and not loop_closed(entry[2]):
+                return None
+            del self.clients[key]
+            return None if loop_closed(entry[2]) else entry[0]
+
+    def close_all(self):
+        """
+        Closes every registered client, e.g. at interpreter shutdown or between tests.
+        """
+        with self.lock:
+            entries = list(self.clients.values())
+            self.clients.clear()
+        for client, _, loop_ref in entries:
+            if not loop_closed(loop_ref):
+                close_client(client)
+
+    def __contains__(self, key: tuple):
+        return key in self.clients
+
+    def __len__(self):
+        return len(self.clients)
+
+
+registry = ClientRegistry()
+
+
+def close_clients():
+    """
+    Closes every shared SDK client.
+    """
+    registry.close_all()
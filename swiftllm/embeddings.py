@@ -0,0 +1,340 @@
+import hashlib
+import math
+import re
+import threading
+import zlib
+from array import array
+
+WORD_PATTERN: re.Pattern = re.compile(r'\w+')
+SQLITE_MAX_VARIABLES: int = 900 # stay below SQLite's limit on the number of ? in one statement
+
+
+def embed_shard(embeddings, texts: list):
+    """
+    Embeds one shard of texts in a worker process. Module-level so ProcessPoolExecutor can pickle it.
+    """
+    return embeddings.embed_batches(texts)
+
+
+class Embeddings:
+
+    """
+    This is the base class for the embedding backends. It implements the embed_documents/embed_query interface LangChain
+    vector stores such as Chroma expect, embeds documents in batches of batch_size, and optionally shards large inputs over
+    several processes. The worker processes are started on the first large input and kept until close is called, so they
+    are not started again for every batch of an ingest. model_id identifies the model and its settings, so cached vectors
+    are only reused by the same model.
+    """
+
+    model_id: str = 'embeddings'
+
+    def __init__(self, batch_size: int = 64, processes: int = 1):
+        """
+        Initialize the Embeddings object.
+
+        Args:
+            batch_size (int, optional): Number of texts embedded per call of embed_batch. Defaults to 64.
+            processes (int, optional): Worker processes used when there are more texts than one batch. Defaults to 1.
+        """
+        self.batch_size = max(1, batch_size)
+        self.processes = max(1, processes)
+        self.executor = None # ProcessPoolExecutor, created on the first input that is sharded
+        self.executor_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy() # the object is pickled to the worker processes, which need neither the pool nor the lock
+        state['executor'] = None
+        del state['executor_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.executor_lock = threading.Lock()
+
+    def embed_batch(self, texts: list):
+        """
+        This method should be implemented in the child class. It returns one vector (a list of floats) per text.
+        """
+        raise NotImplementedError('The embed_batch method must be implemented in child class.')
+
+    def embed_batches(self, texts: list):
+        """
+        Embeds texts in batches of batch_size in this process.
+        """
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.embed_batch(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_documents(self, texts: list):
+        """
+        Returns one vector per text, in order. Inputs larger than one batch are split into one contiguous shard per process
+        if processes > 1.
+        """
+        texts = list(texts)
+        if self.processes <= 1 or len(texts) <= self.batch_size:
+            return self.embed_batches(texts)
+
+        size = -(-len(texts) // self.processes)
+        shards = [texts[start:start + size] for start in range(0, len(texts), size)]
+        executor = self.get_executor()
+        return [vector for shard in executor.map(embed_shard, [self] * len(shards), shards) for vector in shard]
+
+    def embed_query(self, text: str):
+        return self.embed_batch([text])[0]
+
+    def embed_queries(self, texts: list):
+        """
+        Returns one query vector per text, in order. Models that embed queries like documents embed them in batches; models
+        with a query mode of their own (see LangChainEmbeddings) override this.
+        """
+        return self.embed_batches(list(texts))
+
+    def get_executor(self):
+        if self.executor is None:
+            with self.executor_lock:
+                if self.executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    self.executor = ProcessPoolExecutor(self.processes)
+        return self.executor
+
+    def close(self):
+        """
+        Stops the worker processes. They are started again if more inputs are sharded.
+        """
+        with self.executor_lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HashingEmbeddings(Embeddings):
+
+    """
+    Fully local embeddings for offline use: word unigrams and n-grams are hashed into a fixed number of dimensions with a
+    signed hash, weighted by sublinear term frequency and L2-normalized. Needs no model download, no fit over the corpus
+    (so vectors stay valid as documents are added) and no dependencies, and matches lexical rather than semantic similarity.
+    """
+
+    def __init__(self, dimensions: int = 512, ngrams: int = 2, batch_size: int = 256, processes: int = 1):
+        """
+        Initialize the HashingEmbeddings object.
+
+        Args:
+            dimensions (int, optional): Length of the vectors. Defaults to 512.
+            ngrams (int, optional): Longest word n-gram hashed. Defaults to 2 (words and word pairs).
+            batch_size (int, optional): Number of texts embedded per batch. Defaults to 256.
+            processes (int, optional): Worker processes for large inputs. Defaults to 1.
+        """
+        super().__init__(batch_size, processes)
+        self.dimensions = dimensions
+        self.ngrams = max(1, ngrams)
+        self.model_id = f'hashing-{dimensions}-{self.ngrams}'
+
+    def embed_batch(self, texts: list):
+        return [self.embed_text(text) for text in texts]
+
+    def embed_text(self, text: str):
+        words = WORD_PATTERN.findall(text.lower())
+        counts = {}
+        for n in range(1, self.ngrams + 1):
+            for start in range(len(words) - n + 1):
+                feature = ' '.join(words[start:start + n])
+                counts[feature] = counts.get(feature, 0) + 1
+
+        vector = [0.0] * self.dimensions
+        for feature, count in counts.items():
+            digest = zlib.crc32(feature.encode('utf-8')) # stable across processes and runs, unlike hash()
+            weight = 1.0 + math.log(count)
+            vector[(digest >> 1) % self.dimensions] += weight if digest & 1 else -weight
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+
+    """
+    Local CPU/GPU embeddings with a sentence-transformers model. The model is downloaded on first use and cached by Hugging
+    Face. With processes > 1, large inputs are encoded by sentence-transformers' own multi-process pool, so each worker
+    loads the model once.
+    """
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', device: str | None = None, normalize: bool = True, batch_size: int = 32, processes: int = 1):
+        """
+        Initialize the SentenceTransformerEmbeddings object.
+
+        Args:
+            model_name (str, optional): Name or path of the model. Defaults to 'all-MiniLM-L6-v2'.
+            device (str | None, optional): Torch device, e.g. 'cpu' or 'cuda'. Defaults to None (picked automatically).
+            normalize (bool, optional): L2-normalize the vectors. Defaults to True.
+            batch_size (int, optional): Number of texts encoded per batch. Defaults to 32.
+            processes (int, optional): Worker processes for large inputs. Defaults to 1.
+        """
+        super().__init__(batch_size, processes)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError('SentenceTransformerEmbeddings requires sentence-transformers. Install it with "pip install sentence-transformers".')
+        self.model_name = model_name
+        self.normalize = normalize
+        self.model = SentenceTransformer(model_name, device=device)
+        self.model_id = f'sentence-transformers/{model_name}'
+        self.pool = None # sentence-transformers' multi-process pool, started on the first input that is sharded
+
+    def embed_batch(self, texts: list):
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=self.normalize).tolist()
+
+    def embed_documents(self, texts: list):
+        texts = list(texts)
+        if self.processes <= 1 or len(texts) <= self.batch_size:
+            return self.embed_batches(texts)
+        with self.executor_lock:
+            if self.pool is None:
+                self.pool = self.model.start_multi_process_pool(['cpu'] * self.processes)
+        vectors = self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size, normalize_embeddings=self.normalize)
+        return vectors.tolist()
+
+    def close(self):
+        with self.executor_lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            self.model.stop_multi_process_pool(pool)
+
+
+class LangChainEmbeddings(Embeddings):
+
+    """
+    Adapts a LangChain embeddings object (e.g. OpenAIEmbeddings) to this interface, so it is batched and can be cached.
+    """
+
+    def __init__(self, embeddings, model_id: str | None = None, batch_size: int = 256):
+        """
+        Initialize the LangChainEmbeddings object.
+
+        Args:
+            embeddings: Object with embed_documents and embed_query methods.
+            model_id (str | None, optional): Cache identity of the model. Defaults to None (class name and model attribute).
+            batch_size (int, optional): Number of texts sent per request. Defaults to 256.
+        """
+        super().__init__(batch_size)
+        self.embeddings = embeddings
+        self.model_id = model_id or f'{type(embeddings).__name__}/{getattr(embeddings, "model", None) or getattr(embeddings, "model_name", "default")}'
+
+    def embed_batch(self, texts: list):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: list):
+        return [self.embeddings.embed_query(text) for text in texts] # LangChain has no batched query call
+
+
+class CachedEmbeddings(Embeddings):
+
+    """
+    Persistent embedding cache in a SQLite file. Vectors are stored as float32 under a hash of the model ID and the text, so
+    unchanged chunks are never embedded twice, across runs and across RAG objects using the same model. Only the texts
+    missing from the cache are passed to the wrapped embeddings, in one call so its batching and sharding still apply.
+    Queries are passed through uncached, since a model may embed a query differently from a document with the same text.
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str):
+        """
+        Initialize the CachedEmbeddings object.
+
+        Args:
+            embeddings (Embeddings): The embeddings whose vectors are cached.
+            path (str): Path of the SQLite database file.
+        """
+        import sqlite3 # only needed by this class, so it is not loaded on import
+
+        super().__init__(embeddings.batch_size)
+        self.embeddings = embeddings
+        self.model_id = embeddings.model_id
+        self.path = path
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+        self.connection.commit()
+
+    def make_key(self, text: str):
+        return hashlib.sha256(f'{self.model_id}\0{text}'.encode('utf-8')).hexdigest()
+
+    def lookup(self, keys: list):
+        """
+        Returns {key: vector} of the keys found in the cache.
+        """
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                rows = self.connection.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(batch))})', batch)
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def store(self, vectors: dict):
+        """
+        Stores {key: vector} and returns the vectors rounded to float32, so callers get the same values on a hit and a miss.
+        """
+        packed = {key: array('f', vector) for key, vector in vectors.items()}
+        with self.lock:
+            self.connection.executemany('INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)', [(key, vector.tobytes()) for key, vector in packed.items()])
+            self.connection.commit()
+        return {key: vector.tolist() for key, vector in packed.items()}
+
+    def embed_documents(self, texts: list):
+        texts = list(texts)
+        keys = [self.make_key(text) for text in texts]
+        found = self.lookup(list(set(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found} # also dedups texts within the call
+        self.hits += len(found) # one per distinct text served from the cache, so duplicates don't inflate the hit rate
+        self.misses += len(missing)
+        if missing:
+            vectors = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            found.update(self.store(vectors))
+        return [found[key] for key in keys]
+
+    def embed_batch(self, texts: list):
+        return self.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: list):
+        return self.embeddings.embed_queries(texts)
+
+    def stats(self):
+        """
+        Returns a dict with the number of hits and misses and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM embeddings')
+            self.connection.commit()
+
+    def close(self):
+        """
+        Closes the connection to the SQLite file and the wrapped embeddings.
+        """
+        with self.lock:
+            self.connection.close()
+        self.embeddings.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
@@ -0,0 +1,169 @@
+import json
+from collections import Counter, defaultdict
+from .history import estimate_tokens
+
+EXTRACT_WINDOW_TOKENS: int = 4000 # largest default window; smaller windows run in parallel and finish sooner
+EXTRACT_OUTPUT_TOKENS: int = 1024 # tokens kept free for the JSON output of a window
+EXTRACT_OVERLAP: float = 0.1 # share of a window repeated at the start of the next one
+WINDOW_BREAKS: tuple = ('\n\n', '\n', '. ', '? ', '! ', '; ', ', ', ' ') # preferred window boundaries, best first
+
+
+def find_break(text: str, low: int, high: int, last: bool = True):
+    """
+    Returns the position right after the best separator (see WINDOW_BREAKS) in text[low:high]: the last one if last is True,
+    otherwise the first one. Returns high if text[low:high] has no separator.
+    """
+    for separator in WINDOW_BREAKS:
+        index = text.rfind(separator, low, high) if last else text.find(separator, low, high)
+        if index != -1:
+            return index + len(separator)
+    return high
+
+
+def split_windows(text: str, window_tokens: int, overlap_tokens: int = 0, estimator=estimate_tokens):
+    """
+    Splits a text into windows of at most about window_tokens tokens. Windows end at paragraph, sentence or word
+    boundaries where possible, and each window starts overlap_tokens before the end of the previous one, so a fact cut by
+    one boundary is complete in at least one window.
+
+    Args:
+        text (str): The text to split.
+        window_tokens (int): Estimated tokens per window.
+        overlap_tokens (int, optional): Estimated tokens shared by consecutive windows. Defaults to 0.
+        estimator (callable, optional): Function that returns the number of tokens in a string. Defaults to estimate_tokens.
+    """
+    tokens = estimator(text)
+    if tokens <= window_tokens:
+        return [text]
+    chars_per_token = len(text) / tokens
+    size = max(int(window_tokens * chars_per_token), 2)
+    overlap = min(int(overlap_tokens * chars_per_token), size // 2 - 1) # always move forward by more than half a window
+
+    windows = []
+    start = 0
+    while len(text) - start > size:
+        end = find_break(text, start + size // 2, start + size)
+        windows.append(text[start:end])
+        start = find_break(text, end - overlap, end, last=False) if overlap > 0 else end
+    windows.append(text[start:])
+
+    return windows
+
+
+def is_missing(value):
+    """
+    Returns True for the values a window returns when it found nothing: None, empty strings, lists and dicts.
+    """
+    return value is None or value == '' or value == [] or value == {}
+
+
+def normalize(value):
+    """
+    Returns the value with its strings lower-cased and their whitespace collapsed, for comparing values.
+    """
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items() if not is_missing(item)}
+    return value
+
+
+def value_key(value):
+    """
+    Returns a hashable key that is equal for values that only differ in case, whitespace, key order or missing fields.
+    """
+    return json.dumps(normalize(value), sort_keys=True, default=str)
+
+
+def dedupe(items: list):
+    """
+    Returns the items without duplicates, in order. Records (dicts) whose fields are all found with the same values in a
+    more complete record are dropped: they are the same record seen partially (e.g. cut off by a window boundary).
+    """
+    unique = {}
+    for item in items:
+        if not is_missing(item):
+            unique.setdefault(value_key(item), item)
+    items = list(unique.values())
+
+    # index the records by field value, so only records sharing every field of a record are compared with it
+    fields = [[(key, value_key(value)) for key, value in normalize(item).items()] if isinstance(item, dict) else None for item in items]
+    index = defaultdict(set)
+    for i, record in enumerate(fields):
+        for field in record or ():
+            index[field].add(i)
+    records = {i for i, record in enumerate(fields) if record is not None}
+
+    def subsumed(i):
+        if fields[i] is None:
+            return False
+        postings = [index[field] for field in fields[i]]
+        candidates = min(postings, key=len) if postings else records
+        return any(j != i and all(j in posting for posting in postings) for j in candidates)
+
+    return [item for i, item in enumerate(items) if not subsumed(i)]
+
+
+def most_common(values: list):
+    """
+    Returns the value found by the most windows; ties go to the earliest window.
+    """
+    counts = Counter(value_key(value) for value in values)
+    return max(values, key=lambda value: counts[value_key(value)]) # max keeps the first of equal counts
+
+
+def collect(values: list):
+    """
+    Returns the distinct values as a list, or the value itself if the windows agree.
+    """
+    values = dedupe(values)
+    return values[0] if len(values) == 1 else values
+
+
+# Resolve a field that windows returned different scalar values for. A callable that takes the list of values (in window
+# order, missing values removed) and returns one can be used instead.
+CONFLICT_POLICIES: dict = {
+    'first': lambda values: values[0],
+    'last': lambda values: values[-1],
+    'most_common': most_common,
+    'longest': lambda values: max(values, key=lambda value: len(str(value))),
+    'collect': collect,
+}
+
+
+def merge_results(results: list, conflict='most_common'):
+    """
+    Merges the JSON results of the windows of a document into one. Objects are merged field by field, lists are
+    concatenated and deduplicated, and scalars that differ between windows are resolved by the conflict policy. Missing
+    values (None, '', [] and {}) never override values found by another window.
+
+    Args:
+        results (list): The parsed JSON result of every window, in document order.
+        conflict (str | callable, optional): Key of CONFLICT_POLICIES or a function of the list of values. Defaults to 'most_common'.
+    """
+    if not callable(conflict):
+        if conflict not in CONFLICT_POLICIES:
+            raise ValueError(f'conflict must be one of {list(CONFLICT_POLICIES)} or a callable. Received {conflict!r} instead.')
+        conflict = CONFLICT_POLICIES[conflict]
+
+    return merge_values(results, conflict)
+
+
+def merge_values(values: list, conflict):
+    """
+    Merges the values one field had in every window (see merge_results).
+    """
+    values = [value for value in values if not is_missing(value)]
+    if not values:
+        return None
+    if all(isinstance(value, dict) for value in values):
+        keys = dict.fromkeys(key for value in values for key in value) # every key, in first-seen order
+        return {key: merge_values([value[key] for value in values if key in value], conflict) for key in keys}
+    if any(isinstance(value, list) for value in values):
+        return dedupe([item for value in values for item in (value if isinstance(value, list) else [value])])
+    if len({value_key(value) for value in values}) == 1:
+        return values[0]
+
+    return conflict(values)
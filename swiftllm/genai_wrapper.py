@@ -1,7 +1,22 @@
-import json
-import re
-from datetime import datetime
-from requests import Response
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .cache import ResponseCache
+from .history import HistoryPolicy, estimate_message_tokens, MESSAGE_OVERHEAD_TOKENS
+from .extract import split_windows, merge_results, EXTRACT_WINDOW_TOKENS, EXTRACT_OUTPUT_TOKENS, EXTRACT_OVERLAP
+from .ratelimit import RateLimiter
+from .clients import registry, close_client, aclose_client
+from .retry import RetryPolicy, classify_error
+from .jsonstream import IncrementalJSONParser
+from .schema import SchemaValidator, SchemaViolation, find_json
+from .activity import ActivityLog
+from .metrics import Metrics, CallRecord, current_call
+from .session import Session, current_session
+from .prompt import PromptTemplate
+from .singleflight import SingleFlight
+from types import SimpleNamespace
 
 class LanguageModel:
     
@@ -11,7 +26,7 @@ class LanguageModel:
     schema.
     """
     
-    def __init__(self, instructions: str, sample_outputs: list | None = None, schema: dict | None = None, prev_messages: list | None = None, response_type: str = None):
+    def __init__(self, instructions: str, sample_outputs: list | None = None, schema: dict | None = None, prev_messages: list | None = None, response_type: str = None, cache: ResponseCache | None = None, history_policy: HistoryPolicy | None = None, retry_policy: RetryPolicy | None = None, rate_limit: RateLimiter | bool | None = None, stream_validation: bool = False, activity_log: ActivityLog | None = None, metrics: Metrics | None = None, single_flight: SingleFlight | bool | None = None):
         """
         Initialize the LanguageModel object.
 
@@ -21,9 +36,31 @@ class LanguageModel:
             schema (dict | None, optional): Schema that defines object the model should generate in JSON mode. Defaults to None.
             prev_messages (list | None, optional): List of previous messages. Defaults to None.
             response_type (str, optional): Format the model should return as a response. Valid options: ('JSON', 'CONTENT', 'RAW'). Defaults to None.
+            cache (ResponseCache | None, optional): Cache that serves identical requests without calling the provider. Defaults to None.
+            history_policy (HistoryPolicy | None, optional): Decides which previous messages are sent with each prompt. Defaults to None (all of them).
+            retry_policy (RetryPolicy | None, optional): Decides when and how long to wait before retrying a failed prompt. Defaults to None (RetryPolicy()).
+            rate_limit (RateLimiter | bool | None, optional): Client-side rate limiter, or True to share the provider's limiter for the model. Defaults to None.
+            stream_validation (bool, optional): In JSON mode, stream responses and cancel them as soon as they stop matching the schema. Defaults to False.
+            activity_log (ActivityLog | None, optional): Log of prompts, responses and exceptions, with its size, verbosity and sink. Defaults to None (ActivityLog() with the last 1000 entries).
+            metrics (Metrics | None, optional): Collects latency, tokens, cost and cache status per call and calls the metrics hooks. Defaults to None (a Metrics of its own).
+            single_flight (SingleFlight | bool | None, optional): Coalesce identical requests that are in flight at the same time into one provider call, or True for a SingleFlight of this model's own. Defaults to None.
         """
-        self.activity_log: list = [] # store all prompts, responses, and exceptions in the order they occur
+        self.activity_log = activity_log if activity_log is not None else ActivityLog() # store recent prompts, responses, and exceptions in the order they occur
         self.last_inference_cost: float = 0.0 # store the total cost of all inference calls
+        self.cost_lock = threading.Lock() # inference cost is added from many threads by prompt_many
+        self.client_lock = threading.Lock() # clients created lazily must be created once even if many threads ask at once
+        self.metrics = metrics if metrics is not None else Metrics() # per-call records and cumulative ledger (see swiftllm.metrics)
+        self.cache = cache # opt-in response cache (see swiftllm.cache)
+        self.single_flight = SingleFlight() if single_flight is True else single_flight or None # opt-in request coalescing (see swiftllm.singleflight)
+        self.history_policy = history_policy # opt-in conversation window (see swiftllm.history)
+        self.retry_policy = retry_policy # backoff and error classification for prompt retries (see swiftllm.retry)
+        self.rate_limit = rate_limit # client-side RPM/TPM limiter (see swiftllm.ratelimit)
+        self.client_keys: list = [] # keys of the shared SDK clients this model uses (see swiftllm.clients)
+        self.async_clients: dict = {} # key -> async SDK client, one per event loop (see acquire_async_client)
+        self.last_stream_stats: dict = {} # time to first token and throughput of the last streamed call
+        self.stream_validation = stream_validation # validate JSON responses while they stream (see swiftllm.jsonstream)
+        self.rag = None # retriever whose context is added to every prompt (see attach_rag)
+        self.rag_options: dict = {}
         
         if not instructions or not isinstance(instructions, str):
             instructions = 'You will be provided instructions/prompts. Do your best to generate an appropriate response to the prompts.'
@@ -38,6 +75,7 @@ class LanguageModel:
         if not isinstance(schema, dict):
             schema = {}
         self.schema = schema
+        self.validator = SchemaValidator(schema) # compiled once, reused for every response
         
         # initialize or set previous messages
         if not isinstance(prev_messages, list):
@@ -50,12 +88,154 @@ class LanguageModel:
         self.response_type = response_type.upper()
         
         self.format_instructions()
+        self.save_initial_messages()
     
-    def format_messages(self, role: str, content: str):
+    def acquire_client(self, key: tuple, factory, loop=None):
         """
-        Saves the role and content as a message in the prev_messages list.
+        Returns the shared SDK client registered under key, creating it with factory() if no model uses it yet. The client is
+        released again by close(). loop is the event loop of an async client.
         """
-        self.prev_messages.append({'role': role, 'content': content})
+        client = registry.acquire(key, factory, loop)
+        self.client_keys.append(key)
+        
+        return client
+    
+    def acquire_async_client(self, key: tuple, factory):
+        """
+        Returns the shared async SDK client registered under key, acquiring it the first time this model needs it. An async
+        client only works on the event loop it was created on, so key must contain the id of the running loop (see
+        swiftllm.clients.get_loop_id) and every loop gets a client of its own. Clients of loops that have closed are dropped.
+        """
+        client = self.async_clients.get(key)
+        if client is None:
+            with self.client_lock: # checked again under the lock, so concurrent first calls acquire the client once
+                if (client := self.async_clients.get(key)) is None:
+                    client = self.acquire_client(key, factory, asyncio.get_running_loop())
+                    for stale in [stale for stale in self.async_clients if stale not in registry]: # pruned with their loops
+                        del self.async_clients[stale]
+                        self.client_keys.remove(stale)
+                    self.async_clients[key] = client
+        
+        return client
+    
+    def close(self):
+        """
+        Releases the shared SDK clients of this model. A client (and its connection pool) is closed once no model uses it anymore.
+        """
+        keys, self.client_keys, self.async_clients = self.client_keys, [], {}
+        for key in keys:
+            if (client := registry.release(key)) is not None:
+                close_client(client)
+    
+    async def aclose(self):
+        """
+        Async version of the close method. Async clients that are no longer used are closed on the running event loop.
+        """
+        keys, self.client_keys, self.async_clients = self.client_keys, [], {}
+        for key in keys:
+            if (client := registry.release(key)) is not None:
+                await aclose_client(client)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    def format_messages(self, role: str, content: str, history: list | None = None):
+        """
+        Saves the role and content as a message in the history list if one is provided, otherwise in the prev_messages list.
+        """
+        if history is None:
+            history = self.prev_messages
+        history.append({'role': role, 'content': content})
+    
+    def save_initial_messages(self):
+        """
+        Stores a copy of the messages every independent request starts from (previous messages and system instructions).
+        Child classes that add messages after the LanguageModel constructor should call this again at the end of their constructor.
+        """
+        self.initial_messages: list = list(self.prev_messages)
+    
+    def new_history(self):
+        """
+        Returns a fresh message history containing only the initial messages, for single-turn requests that should not see or
+        modify prev_messages.
+        """
+        return list(self.initial_messages)
+    
+    def session(self, messages: list | None = None):
+        """
+        Returns a new Session: one conversation with this model that keeps only its own messages, so one model object can be
+        shared by many threads and conversations (see swiftllm.session).
+        
+        Args:
+            messages (list | None, optional): Messages the conversation starts with, after the initial messages. Defaults to None.
+        """
+        return Session(self, messages)
+    
+    def get_context_window(self):
+        """
+        Returns the context window of the model in tokens, or None if it is unknown. Child classes should override this method.
+        """
+        return None
+    
+    def select_messages(self, history: list | None = None):
+        """
+        Returns the messages of the history (prev_messages by default) that should be sent to the provider according to the history policy.
+        The initial messages are always kept.
+        """
+        if history is None:
+            history = self.prev_messages
+        if self.history_policy is None:
+            return history
+        
+        return self.history_policy.select(history, len(self.initial_messages), self.get_context_window())
+    
+    def compact_history(self, history: list | None = None):
+        """
+        Drops the messages the history policy would no longer send from the history (prev_messages by default), so long
+        conversations use a bounded amount of memory.
+        """
+        if self.history_policy is None:
+            return
+        if history is None:
+            history = self.prev_messages
+        history[:] = self.select_messages(history)
+    
+    def attach_rag(self, rag, k: int = 4, max_tokens: int = 1500, mmr: bool = False):
+        """
+        Attaches a RAG (or any object with a context(text, k, max_tokens, mmr) method) to the model. Every prompt then retrieves
+        the chunks relevant to it and sends them, within max_tokens, as a system message right before the prompt. The context
+        is only sent, never stored in the message history. Pass None to detach it.
+        
+        Args:
+            rag (RAG | None): The retriever, or None to stop adding context.
+            k (int, optional): Chunks retrieved per prompt. Defaults to 4.
+            max_tokens (int, optional): Estimated token budget of the context. Defaults to 1500.
+            mmr (bool, optional): Re-rank the chunks by maximal marginal relevance. Defaults to False.
+        """
+        self.rag = rag
+        self.rag_options = {'k': k, 'max_tokens': max_tokens, 'mmr': mmr}
+    
+    def add_context(self, prompt: str, messages: list):
+        """
+        Returns the messages to send with the context the attached RAG retrieves for the prompt inserted before the last message
+        (the prompt). Returns the messages unchanged if no RAG is attached or nothing was retrieved.
+        """
+        if self.rag is None or not messages:
+            return messages
+        context = self.rag.context(prompt, **self.rag_options)
+        if not context:
+            return messages
+        
+        return messages[:-1] + [{'role': 'system', 'content': context}, messages[-1]]
     
     def predict_response_type(self):
         """
@@ -76,53 +256,365 @@ class LanguageModel:
     
     def format_instructions(self):
         """
-        Creates a final system instructions message that includes the system instructions, schema, and sample outputs.
+        Compiles the system instructions, schema and sample outputs into the model's PromptTemplate once and adds its system
+        message and acknowledgement to prev_messages. Every request reuses these messages, so the schema is neither serialized
+        nor sent again with each prompt.
         """
-        self.instructions = 'SYSTEM INSTRUCTIONS:\n' + self.instructions.strip()
-        if self.schema:
-            self.instructions = self.instructions + '\n\nReturn your output as a correct JSON string. It should be loadable with the python command json.loads(output).\n\nOutput Schema:\n' + json.dumps(self.schema)
-        if self.sample_outputs:
-            self. instructions = self. instructions + '\n\n'.join([f'Sample Output {i+1}:\n{json.dumps(s)}' for i, s in enumerate(self.sample_outputs)])
+        self.template = PromptTemplate(self.instructions, self.schema, self.sample_outputs)
+        self.prev_messages.extend(self.template.messages)
             
-    def prompt(self, prompt: str, retries: int = 3, **kwargs):
+    def prompt(self, prompt: str, retries: int | RetryPolicy | None = None, history: list | None = None, deadline: float | None = None, raise_errors: bool = False, **kwargs):
+        """
+        This method calls the generate method and handles any exceptions that occur. Failed attempts are retried according to the retry policy
+        (see get_retry_policy), and the messages a failed attempt added to the history are removed before the next one. If a history list is
+        provided, the prompt and response are stored there instead of in prev_messages. Returns None if every attempt fails, or raises
+        the last attempt's exception with raise_errors.
+        
+        Args:
+            prompt (str): The prompt to pass to the model.
+            retries (int | RetryPolicy | None, optional): Maximum number of attempts or the retry policy for this call. Defaults to None (model policy).
+            history (list | None, optional): Message history to use instead of prev_messages. Defaults to None.
+            deadline (float | None, optional): Maximum seconds this call may take including retries. Defaults to the policy deadline.
+            raise_errors (bool, optional): Raise the exception of the last attempt instead of returning None. Defaults to False.
         """
-        This method calls the generate method and handles any exceptions that occur. It will retry the generate method up to the number of retries specified
-        if an exception occurs. 
+        policy = self.get_retry_policy(retries)
+        messages = self.prev_messages if history is None else history
+        if history is not None:
+            kwargs['history'] = history
+        start = time.monotonic()
+        attempt = 0
+        record, previous = self.begin_call()
+        try:
+            while True:
+                attempt += 1
+                mark = len(messages)
+                record.attempts, record.retry_time = attempt, time.monotonic() - start
+                try:
+                    self.log_activity(prompt, role='user')
+                    response = self.get_generate()(prompt, **kwargs)
+                    self.settle_cache(record, True)
+                    self.compact_history(history)
+                    self.log_activity(response, role='assistant')
+                    return response
+                except Exception as e:
+                    self.log_activity(e, role='system')
+                    del messages[mark:] # roll back the failed attempt
+                    self.settle_cache(record, False)
+                    self.fail_attempt(record, e)
+                    delay = policy.next_delay(e, attempt, time.monotonic() - start, deadline)
+                    if delay is None:
+                        if raise_errors:
+                            raise
+                        return None
+                    record.error = None
+                    self.log_retry(e, attempt, delay)
+                    time.sleep(delay)
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.end_call(record, previous)
+
+    async def aprompt(self, prompt: str, retries: int | RetryPolicy | None = None, history: list | None = None, deadline: float | None = None, raise_errors: bool = False, **kwargs):
+        """
+        Async version of the prompt method. It awaits the agenerate method and handles any exceptions that occur the same way prompt does,
+        so many prompts can be in flight on a single event loop. Attempts still running when the deadline passes are cancelled.
+        """
+        policy = self.get_retry_policy(retries)
+        deadline = policy.deadline if deadline is None else deadline
+        messages = self.prev_messages if history is None else history
+        if history is not None:
+            kwargs['history'] = history
+        start = time.monotonic()
+        attempt = 0
+        record, previous = self.begin_call()
+        try:
+            while True:
+                attempt += 1
+                mark = len(messages)
+                record.attempts, record.retry_time = attempt, time.monotonic() - start
+                try:
+                    self.log_activity(prompt, role='user')
+                    timeout = None if deadline is None else max(deadline - (time.monotonic() - start), 0.0)
+                    response = await asyncio.wait_for(self.get_generate(is_async=True)(prompt, **kwargs), timeout)
+                    self.settle_cache(record, True)
+                    self.compact_history(history)
+                    self.log_activity(response, role='assistant')
+                    return response
+                except Exception as e:
+                    self.log_activity(e, role='system')
+                    del messages[mark:] # roll back the failed attempt
+                    self.settle_cache(record, False)
+                    self.fail_attempt(record, e)
+                    delay = policy.next_delay(e, attempt, time.monotonic() - start, deadline)
+                    if delay is None:
+                        if raise_errors:
+                            raise
+                        return None
+                    record.error = None
+                    self.log_retry(e, attempt, delay)
+                    await asyncio.sleep(delay)
+        except BaseException as e: # e.g. the caller cancelled the task
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.end_call(record, previous)
+    
+    def begin_call(self, streamed: bool = False):
+        """
+        Starts the CallRecord of a prompt or stream, makes it the current call (so send_request and calculate_inference_cost
+        can add to it) and runs the on_request hooks. Returns the record and the call that was current before.
+        """
+        record = CallRecord(self.get_model_name(), streamed)
+        previous = current_call.get()
+        current_call.set(record)
+        self.run_hooks('on_request', record)
+        
+        return record, previous
+    
+    def fail_attempt(self, record: CallRecord, error: Exception):
+        """
+        Marks an attempt of the call as failed and runs the on_error hooks.
         """
-        for _ in range(retries):
+        record.error = type(error).__name__
+        self.run_hooks('on_error', record, error)
+    
+    def end_call(self, record: CallRecord, previous: CallRecord | None = None):
+        """
+        Finishes a CallRecord: sets its latency, adds it to the metrics ledger and to the current session, runs the on_response
+        hooks and restores the call that was current before.
+        """
+        record.latency = time.monotonic() - record.clock
+        current_call.set(previous)
+        self.metrics.record(record)
+        if (session := current_session.get()) is not None:
+            session.add_call(record)
+        self.run_hooks('on_response', record)
+    
+    def run_hooks(self, event: str, *args):
+        """
+        Calls the event method (on_request, on_error or on_response) of every metrics hook. Errors in hooks are logged, not raised.
+        """
+        for hook in self.metrics.hooks:
             try:
-                self.log_activity(prompt, role='user')
-                response = self.generate(prompt, **kwargs)
-                self.log_activity(response, role='assistant')
-                return response
+                getattr(hook, event)(*args)
             except Exception as e:
                 self.log_activity(e, role='system')
+    
+    def get_model_name(self):
+        """
+        Returns the name the metrics of this model are recorded under.
+        """
+        return getattr(self, 'model', None) or type(self).__name__
+    
+    def record_model(self, response):
+        """
+        Records the model name a response reports (providers may resolve an alias to a dated model) on the current call, so
+        the ledger and the price use it. The model object itself is never changed by a call, so it can be shared by threads.
+        """
+        model = getattr(response, 'model', None)
+        if model and (call := current_call.get()) is not None:
+            call.model = model
+    
+    def get_generate(self, is_async: bool = False):
+        """
+        Returns the method prompt and aprompt use to generate a response: generate_json (streamed and validated while it arrives)
+        when stream_validation is on in JSON mode, otherwise generate.
+        """
+        if self.stream_validation and self.response_type == 'JSON':
+            return self.agenerate_json if is_async else self.generate_json
+        return self.agenerate if is_async else self.generate
+    
+    def get_retry_policy(self, retries: int | RetryPolicy | None = None):
+        """
+        Returns the retry policy for a call. A RetryPolicy is used as is, an int overrides the number of attempts of the model's policy,
+        and None uses the model's policy.
+        """
+        if isinstance(retries, RetryPolicy):
+            return retries
+        policy = self.retry_policy or RetryPolicy()
+        if retries is None:
+            return policy
         
-        return None
+        return policy.with_attempts(retries)
+    
+    def log_retry(self, error: Exception, attempt: int, delay: float):
+        """
+        Records a retry, the kind of error that caused it and the time slept before it in the activity log.
+        """
+        self.log_activity(f'Retrying after {classify_error(error)} error (attempt {attempt + 1}), slept {delay:.3f}s', role='system')
+    
+    def prompt_many(self, inputs, max_concurrency: int = 8, retries: int | RetryPolicy | None = None, progress=None, **kwargs):
+        """Prompts the model with every input as an independent single-turn request (initial messages plus the input) on a thread pool.
+
+        Args:
+            inputs (iterable): The prompts to send to the model.
+            max_concurrency (int, optional): Maximum number of requests in flight at once. Defaults to 8.
+            retries (int | RetryPolicy | None, optional): Maximum number of attempts or retry policy per input. Defaults to None (model policy).
+            progress (callable, optional): Called as progress(completed, total) each time an input finishes. total is None if inputs has no length.
+
+        Returns:
+            list: One result per input in input order. An input whose last attempt failed has that attempt's exception in its
+            place, so one failure does not abort the batch and the cause of every failure is kept.
+        """
+        return list(self.prompt_many_iter(inputs, max_concurrency, retries, progress, **kwargs))
+    
+    def prompt_many_iter(self, inputs, max_concurrency: int = 8, retries: int | RetryPolicy | None = None, progress=None, **kwargs):
+        """
+        Generator version of prompt_many. It yields results in input order as soon as they are ready and only keeps a bounded number
+        of inputs queued, so inputs can be a lazy iterable of any size.
+        """
+        total = len(inputs) if hasattr(inputs, '__len__') else None
+        counter = self.progress_counter(total, progress)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = deque()
+            for item in inputs:
+                pending.append(executor.submit(self.prompt_independent, item, retries, counter, kwargs))
+                if len(pending) >= 2 * max_concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    async def aprompt_many(self, inputs, max_concurrency: int = 8, retries: int | RetryPolicy | None = None, progress=None, **kwargs):
+        """
+        Async version of prompt_many. Every input is sent with aprompt on the running event loop, with at most max_concurrency
+        requests in flight. Returns one result (or exception) per input in input order.
+        """
+        inputs = list(inputs)
+        counter = self.progress_counter(len(inputs), progress)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(item):
+            async with semaphore:
+                try:
+                    return await self.aprompt(item, retries=retries, history=self.new_history(), raise_errors=True, **kwargs)
+                except Exception as e:
+                    return e
+                finally:
+                    counter()
+        
+        return await asyncio.gather(*[run(item) for item in inputs])
+    
+    def extract(self, document: str, window_tokens: int | None = None, overlap: float = EXTRACT_OVERLAP, conflict='most_common', max_concurrency: int = 8, retries: int | RetryPolicy | None = None, strict: bool = True, **kwargs):
+        """Extracts the schema from a document of any length. The document is split into overlapping windows that fit the model's
+        context (see extract_windows), every window is prompted as an independent request with prompt_many, and the JSON results
+        are merged: lists are concatenated and deduplicated, and scalar fields the windows disagree on are resolved by the conflict
+        policy (see swiftllm.extract). With enough concurrency a long document takes about as long as one window.
+
+        Args:
+            document (str): The text to extract from.
+            window_tokens (int | None, optional): Estimated input tokens per window. Defaults to None (see get_window_tokens).
+            overlap (float, optional): Share of a window repeated at the start of the next one. Defaults to EXTRACT_OVERLAP.
+            conflict (str | callable, optional): Key of CONFLICT_POLICIES ('first', 'last', 'most_common', 'longest', 'collect')
+                or a function of the list of values. Defaults to 'most_common'.
+            max_concurrency (int, optional): Maximum number of windows in flight at once. Defaults to 8.
+            retries (int | RetryPolicy | None, optional): Maximum number of attempts or retry policy per window. Defaults to None (model policy).
+            strict (bool, optional): Raise if a window fails instead of merging the windows that succeeded. Defaults to True.
+
+        Returns:
+            The merged JSON result, or None if no window found anything.
+        """
+        windows = self.extract_windows(document, window_tokens, overlap, kwargs.get('max_tokens'))
+        results = self.prompt_many(windows, max_concurrency, retries, **kwargs)
+        
+        return self.merge_extractions(results, conflict, strict)
+    
+    async def aextract(self, document: str, window_tokens: int | None = None, overlap: float = EXTRACT_OVERLAP, conflict='most_common', max_concurrency: int = 8, retries: int | RetryPolicy | None = None, strict: bool = True, **kwargs):
+        """
+        Async version of the extract method. The windows are prompted with aprompt_many on the running event loop.
+        """
+        windows = self.extract_windows(document, window_tokens, overlap, kwargs.get('max_tokens'))
+        results = await self.aprompt_many(windows, max_concurrency, retries, **kwargs)
+        
+        return self.merge_extractions(results, conflict, strict)
+    
+    def extract_windows(self, document: str, window_tokens: int | None = None, overlap: float = EXTRACT_OVERLAP, output_tokens: int | None = None):
+        """
+        Returns the windows extract sends for a document. Only models with JSON responses can extract.
+        """
+        if self.response_type != 'JSON':
+            raise ValueError(f'extract requires a model with JSON responses (give it a schema). Response type is {self.response_type}.')
+        window_tokens = window_tokens or self.get_window_tokens(output_tokens)
+        
+        return split_windows(document, window_tokens, int(window_tokens * overlap))
+    
+    def get_window_tokens(self, output_tokens: int | None = None):
+        """
+        Returns the default estimated input tokens of an extract window: what is left of the context window after the initial
+        messages (which hold the schema and sample outputs), the attached RAG context and the output, but at most
+        EXTRACT_WINDOW_TOKENS, so long documents are split into windows that run in parallel.
+        """
+        context_window = self.get_context_window()
+        if context_window is None:
+            return EXTRACT_WINDOW_TOKENS
+        output_tokens = output_tokens or getattr(self, 'max_tokens', None) or EXTRACT_OUTPUT_TOKENS
+        used = estimate_message_tokens(self.initial_messages) + MESSAGE_OVERHEAD_TOKENS
+        if self.rag is not None:
+            used += self.rag_options['max_tokens'] + MESSAGE_OVERHEAD_TOKENS
+        window_tokens = min(context_window - used - output_tokens, EXTRACT_WINDOW_TOKENS)
+        if window_tokens < 1:
+            raise ValueError(f'The context window of {self.get_model_name()} ({context_window} tokens) has no room for a document after the instructions and {output_tokens} output tokens.')
+        
+        return window_tokens
+    
+    def merge_extractions(self, results: list, conflict='most_common', strict: bool = True):
+        """
+        Merges the results prompt_many returned for the windows of a document. A failed window is an exception (or None) in results;
+        with strict, the first failure is raised, otherwise failed windows are skipped.
+        """
+        failed = [i for i, result in enumerate(results) if result is None or isinstance(result, Exception)]
+        if failed and strict:
+            error = results[failed[0]]
+            if isinstance(error, Exception):
+                raise error
+            raise ValueError(f'Extraction failed for window {failed[0] + 1} of {len(results)} ({len(failed)} windows failed).')
+        
+        return merge_results([result for result in results if result is not None and not isinstance(result, Exception)], conflict)
+    
+    def prompt_independent(self, prompt: str, retries: int | RetryPolicy | None, counter, kwargs: dict):
+        """
+        Prompts the model with a fresh history for prompt_many. The exception of the last failed attempt is returned instead of raised.
+        """
+        try:
+            return self.prompt(prompt, retries=retries, history=self.new_history(), raise_errors=True, **kwargs)
+        except Exception as e:
+            return e
+        finally:
+            counter()
+    
+    def progress_counter(self, total: int | None, progress=None):
+        """
+        Returns a thread-safe function that counts completed inputs and reports them to the progress callback.
+        """
+        lock = threading.Lock()
+        completed = [0]
+        
+        def counter():
+            with lock:
+                completed[0] += 1
+                done = completed[0]
+            if progress is not None:
+                progress(done, total)
+        
+        return counter
 
     def log_activity(self, message: any, role: str):
         """
         This method logs the message to the activity log. It includes the message, the timestamp, and the total inference cost.
+        The message is stored as it is and only formatted when the log is displayed or written to its sink.
         """
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        if isinstance(message, (dict, list)):
-            message = json.dumps(message)
-        if isinstance(message, Response):
-            try:
-                message = message.text
-            except:
-                message = 'model generated Response object with status code: ' + message.status_code
-        if not isinstance(message, str):
-            message = str(message)
-        self.activity_log.append({'timestamp': timestamp, 'role': role, 'message': message, 'total_inference_cost': self.last_inference_cost})
+        self.activity_log.record(role, message, self.last_inference_cost)
     
     def parse_json(self, text: str):
-        """This function finds a JSON string within the provided text. If there is no JSON found in the text, it raises an Exception.
+        """This function finds the first JSON object or array within the provided text and returns it as python objects. If there is no JSON found in the text, it raises an Exception.
 
         Args:
             text (str): the body of text to look for JSON substrings in.
+            
+        Raises:
+            ValueError: If the text has no valid JSON object or array.
         """
-        pass
+        return find_json(text)
     
     def generate(self, prompt, max_tokens):
         """
@@ -139,6 +631,557 @@ class LanguageModel:
         """
         raise NotImplementedError(error_message)
     
+    def send_request(self, kwargs: dict, response_type: str | None = None):
+        """
+        Sends the completion request with get_response and returns the provider response. If a cache is configured, identical
+        requests are served from it without calling the provider and without adding to the inference cost. A new response is
+        only stored once it has parsed and validated (see stage_cache).
+        
+        Args:
+            kwargs (dict): kwargs for the provider's chat completion method, including model and messages.
+            response_type (str | None, optional): response type of this call, part of the cache key. Defaults to self.response_type.
+        """
+        key = self.get_cache_key(kwargs, response_type)
+        if key is not None and (cached := self.get_cached(key)) is not None:
+            self.stage_cache(key)
+            return self.load_response(cached)
+        
+        def fetch():
+            response = self.call_provider(kwargs)
+            if key is not None:
+                self.stage_cache(key, self.dump_response(response))
+            return response
+        
+        flight_key = self.get_flight_key(kwargs, response_type)
+        if flight_key is None:
+            return fetch()
+        response, shared = self.single_flight.do(flight_key, fetch)
+        if shared:
+            self.record_coalesced(response)
+        
+        return response
+    
+    async def asend_request(self, kwargs: dict, response_type: str | None = None):
+        """
+        Async version of the send_request method. It awaits aget_response on a cache miss.
+        """
+        key = self.get_cache_key(kwargs, response_type)
+        if key is not None and (cached := self.get_cached(key)) is not None:
+            self.stage_cache(key)
+            return self.load_response(cached)
+        
+        async def fetch():
+            response = await self.acall_provider(kwargs)
+            if key is not None:
+                self.stage_cache(key, self.dump_response(response))
+            return response
+        
+        flight_key = self.get_flight_key(kwargs, response_type)
+        if flight_key is None:
+            return await fetch()
+        response, shared = await self.single_flight.ado(flight_key, fetch)
+        if shared:
+            self.record_coalesced(response)
+        
+        return response
+    
+    def get_cached(self, key: str):
+        """
+        Returns the cached response for key, or None, and records the hit or miss on the current call.
+        """
+        cached = self.cache.get(key)
+        if (call := current_call.get()) is not None:
+            call.cache = 'miss' if cached is None else 'hit'
+        
+        return cached
+    
+    def stage_cache(self, key: str, value: str | None = None):
+        """
+        Remembers the cache entry of the current attempt on the current call: the serialized response of a miss, which is only
+        stored once the attempt succeeds, or None for a hit, which is evicted if the attempt fails (see settle_cache). Without a
+        current call (generate called directly) a new response is stored at once.
+        """
+        call = current_call.get()
+        if call is not None:
+            call.cache_entry = (key, value)
+        elif value is not None:
+            self.cache.set(key, value)
+    
+    def settle_cache(self, record: CallRecord, ok: bool):
+        """
+        Stores the response of a successful attempt in the cache. If the attempt failed (e.g. its response was not valid JSON or
+        did not match the schema), the response is not stored and a cached one is evicted, so the retry, and the next run with a
+        persistent cache, asks the provider again instead of replaying the bad response.
+        """
+        entry, record.cache_entry = record.cache_entry, None
+        if entry is None:
+            return
+        key, value = entry
+        if ok and value is not None:
+            self.cache.set(key, value)
+        elif not ok and value is None:
+            self.cache.delete(key)
+    
+    def call_provider(self, kwargs: dict):
+        """
+        Calls get_response once the rate limiter (if any) allows it, then reconciles the limiter with the real token usage
+        and adds the cost of the response to the inference cost. A stream's usage is only known once it has been read, so
+        streams are accounted by record_stream instead.
+        """
+        limiter = self.get_rate_limiter()
+        if limiter is not None:
+            estimated = self.estimate_request_tokens(kwargs)
+            limiter.acquire(estimated)
+        response = self.get_response(kwargs)
+        if not kwargs.get('stream'):
+            if limiter is not None:
+                limiter.reconcile(estimated, self.get_total_tokens(response, estimated))
+            self.calculate_inference_cost(response)
+        
+        return response
+    
+    async def acall_provider(self, kwargs: dict):
+        """
+        Async version of the call_provider method. Waiting on the rate limiter doesn't block the event loop.
+        """
+        limiter = self.get_rate_limiter()
+        if limiter is not None:
+            estimated = self.estimate_request_tokens(kwargs)
+            await limiter.aacquire(estimated)
+        response = await self.aget_response(kwargs)
+        if not kwargs.get('stream'):
+            if limiter is not None:
+                limiter.reconcile(estimated, self.get_total_tokens(response, estimated))
+            self.calculate_inference_cost(response)
+        
+        return response
+    
+    def get_rate_limiter(self):
+        """
+        Returns the RateLimiter requests should wait on, or None. Child classes resolve rate_limit=True to the process-wide limiter of their provider and model.
+        """
+        if isinstance(self.rate_limit, RateLimiter):
+            return self.rate_limit
+        return None
+    
+    def estimate_request_tokens(self, kwargs: dict):
+        """
+        Estimates the tokens a request will be charged for by the provider's rate limits: the prompt tokens plus the max_tokens of the completion.
+        """
+        return estimate_message_tokens(kwargs.get('messages', [])) + (kwargs.get('max_tokens') or 0)
+    
+    def get_total_tokens(self, response, default: int = 0):
+        """
+        Returns the total tokens reported in the usage of a provider response, or default if the response has no usage.
+        """
+        usage = getattr(response, 'usage', None)
+        return getattr(usage, 'total_tokens', None) or default
+    
+    def get_cache_key(self, kwargs: dict, response_type: str | None = None):
+        """
+        Returns the cache key for the request, or None if there is no cache or the request is streamed.
+        """
+        if self.cache is None or kwargs.get('stream'):
+            return None
+        
+        return self.cache.make_key(kwargs, response_type or self.response_type)
+    
+    def get_flight_key(self, kwargs: dict, response_type: str | None = None):
+        """
+        Returns the single-flight key for the request, or None if requests are not coalesced or the request is streamed.
+        """
+        if self.single_flight is None or kwargs.get('stream'):
+            return None
+        
+        return self.single_flight.make_key(kwargs, response_type or self.response_type)
+    
+    def record_coalesced(self, response):
+        """
+        Marks the current call as coalesced: it was answered by an identical call in flight, which added the usage and cost.
+        """
+        self.record_model(response)
+        if (call := current_call.get()) is not None:
+            call.cache = 'coalesced'
+    
+    def get_response(self, kwargs: dict):
+        """
+        This method should be implemented in the child class. It sends the kwargs to the provider's chat completion endpoint and returns the response.
+        """
+        raise NotImplementedError('The get_response method must be implemented in child class to use send_request.')
+    
+    async def aget_response(self, kwargs: dict):
+        """
+        Async version of the get_response method. By default it runs get_response in a worker thread.
+        """
+        return await asyncio.to_thread(self.get_response, kwargs)
+    
+    def calculate_inference_cost(self, response):
+        """
+        Adds the cost of a provider response, priced per token with get_token_prices, to the inference cost and adds its usage
+        and cost to the current call. Returns the cost.
+        """
+        usage = getattr(response, 'usage', None)
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+        prices = self.get_token_prices(getattr(response, 'model', None))
+        cost = prompt_tokens * prices[0] + completion_tokens * prices[1] if prices else 0.0
+        with self.cost_lock:
+            self.last_inference_cost += cost
+        if (call := current_call.get()) is not None:
+            call.add_usage(prompt_tokens, completion_tokens, cost)
+        
+        return cost
+    
+    def get_token_prices(self, model: str | None = None):
+        """
+        This method can be implemented in the child class. It returns the (prompt, completion) price per token in USD of the model
+        (the model a response reports, or this model if None), or None if it is unknown.
+        """
+        return None
+    
+    def dump_response(self, response):
+        """
+        Serializes a provider response to a string so it can be stored in the cache.
+        """
+        return response.model_dump_json()
+    
+    def load_response(self, data: str):
+        """
+        This method should be implemented in the child class. It rebuilds a provider response object from the string created by dump_response.
+        """
+        raise NotImplementedError('The load_response method must be implemented in child class to use a response cache.')
+    
+    def stream(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Prompts the model with a streamed request and yields the generated text deltas as they arrive. When the stream ends, the
+        full text is added to the message history, its cost to the inference cost, and the time to first token and tokens per
+        second to last_stream_stats and the activity log. Streams are not retried; if one fails, its messages are removed from
+        the history and the exception is raised.
+        
+        Args:
+            prompt (str): The prompt to pass to the model.
+            history (list | None, optional): Message history to use instead of prev_messages. Defaults to None.
+            **kwargs: Completion kwargs for this call.
+        """
+        record, previous = self.begin_call(streamed=True)
+        record.attempts = 1
+        self.log_activity(prompt, role='user')
+        parts = []
+        try:
+            for text in self.generate_stream(prompt, history, **kwargs):
+                parts.append(text)
+                yield text
+        except BaseException as e: # includes the caller closing the stream early
+            record.error = type(e).__name__
+            if isinstance(e, Exception):
+                self.log_activity(e, role='system')
+                self.run_hooks('on_error', record, e)
+            raise
+        finally:
+            self.end_call(record, previous)
+        self.log_activity(''.join(parts), role='assistant')
+    
+    async def astream(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Async version of the stream method. It is an async generator of text deltas.
+        """
+        record, previous = self.begin_call(streamed=True)
+        record.attempts = 1
+        self.log_activity(prompt, role='user')
+        parts = []
+        try:
+            async for text in self.agenerate_stream(prompt, history, **kwargs):
+                parts.append(text)
+                yield text
+        except BaseException as e: # includes the caller closing the stream early
+            record.error = type(e).__name__
+            if isinstance(e, Exception):
+                self.log_activity(e, role='system')
+                self.run_hooks('on_error', record, e)
+            raise
+        finally:
+            self.end_call(record, previous)
+        self.log_activity(''.join(parts), role='assistant')
+    
+    def stream_json(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Prompts the model with a streamed request in JSON mode and yields (key, value) pairs for the top-level fields of the
+        generated object as soon as each one is complete. Keys are checked against the schema as they appear, and the stream is
+        cancelled as soon as the object can no longer match it.
+        
+        Raises:
+            SchemaViolation: If the generated object does not match the schema.
+            ValueError: If the stream ends without a complete JSON object.
+        """
+        record, previous = self.begin_call(streamed=True)
+        record.attempts = 1
+        self.log_activity(prompt, role='user')
+        try:
+            parser = IncrementalJSONParser(self.validator)
+            for field in self.generate_json_stream(prompt, history, parser, **kwargs):
+                yield field
+        except BaseException as e: # includes the caller closing the stream early
+            record.error = type(e).__name__
+            if isinstance(e, Exception):
+                self.log_activity(e, role='system')
+                self.run_hooks('on_error', record, e)
+            raise
+        finally:
+            self.end_call(record, previous)
+        self.log_activity(parser.partial, role='assistant')
+    
+    async def astream_json(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Async version of the stream_json method. It is an async generator of (key, value) pairs.
+        """
+        record, previous = self.begin_call(streamed=True)
+        record.attempts = 1
+        self.log_activity(prompt, role='user')
+        try:
+            parser = IncrementalJSONParser(self.validator)
+            async for field in self.agenerate_json_stream(prompt, history, parser, **kwargs):
+                yield field
+        except BaseException as e: # includes the caller closing the stream early
+            record.error = type(e).__name__
+            if isinstance(e, Exception):
+                self.log_activity(e, role='system')
+                self.run_hooks('on_error', record, e)
+            raise
+        finally:
+            self.end_call(record, previous)
+        self.log_activity(parser.partial, role='assistant')
+    
+    def generate_stream(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Sends a streamed request and yields its text deltas. This is the part of stream that does not write the prompt and reply to
+        the activity log. A failed or abandoned stream is closed and its messages are removed from the history.
+        """
+        messages = self.prev_messages if history is None else history
+        mark = len(messages)
+        start = time.perf_counter()
+        response = None
+        try:
+            request = self.prepare_request(prompt, {**kwargs, **self.stream_kwargs()}, history)
+            response = self.send_request(request)
+            stats = {'first_token': None, 'usage': None, 'chunks': 0}
+            parts = []
+            for chunk in response:
+                text = self.record_chunk(chunk, stats, start)
+                if text:
+                    parts.append(text)
+                    yield text
+        except BaseException: # includes GeneratorExit when the caller stops reading early
+            del messages[mark:] # roll back the failed stream
+            if response is not None:
+                response.close()
+            raise
+        self.finish_stream(''.join(parts), stats, start, history, request)
+    
+    async def agenerate_stream(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Async version of the generate_stream method.
+        """
+        messages = self.prev_messages if history is None else history
+        mark = len(messages)
+        start = time.perf_counter()
+        response = None
+        try:
+            request = self.prepare_request(prompt, {**kwargs, **self.stream_kwargs()}, history)
+            response = await self.asend_request(request)
+            stats = {'first_token': None, 'usage': None, 'chunks': 0}
+            parts = []
+            async for chunk in response:
+                text = self.record_chunk(chunk, stats, start)
+                if text:
+                    parts.append(text)
+                    yield text
+        except BaseException: # includes GeneratorExit/CancelledError when the caller stops early
+            del messages[mark:] # roll back the failed stream
+            if response is not None:
+                await response.close()
+            raise
+        self.finish_stream(''.join(parts), stats, start, history, request)
+    
+    def generate_json_stream(self, prompt: str, history: list | None = None, parser: IncrementalJSONParser | None = None, **kwargs):
+        """
+        Feeds the deltas of a streamed request to an incremental JSON parser and yields the completed top-level fields. On a schema
+        violation the stream is closed immediately, so no more tokens are generated or waited on.
+        """
+        if parser is None:
+            parser = IncrementalJSONParser(self.validator)
+        deltas = self.generate_stream(prompt, history, **kwargs)
+        try:
+            for text in deltas:
+                yield from parser.feed(text)
+        finally:
+            deltas.close() # cancels the request if the parser raised before the stream ended
+        parser.result()
+    
+    async def agenerate_json_stream(self, prompt: str, history: list | None = None, parser: IncrementalJSONParser | None = None, **kwargs):
+        """
+        Async version of the generate_json_stream method.
+        """
+        if parser is None:
+            parser = IncrementalJSONParser(self.validator)
+        deltas = self.agenerate_stream(prompt, history, **kwargs)
+        try:
+            async for text in deltas:
+                for field in parser.feed(text):
+                    yield field
+        finally:
+            await deltas.aclose() # cancels the request if the parser raised before the stream ended
+        parser.result()
+    
+    def generate_json(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Generates a JSON response over a stream so schema violations abort the request early. Used by prompt instead of
+        generate when stream_validation is on. A violation is marked as aborted, so the retry policy retries it without
+        validation_retries (see RetryPolicy.next_delay).
+        """
+        parser = IncrementalJSONParser(self.validator)
+        try:
+            for _ in self.generate_json_stream(prompt, history, parser, **kwargs):
+                pass
+            return parser.result()
+        except SchemaViolation as e:
+            e.aborted = True
+            raise
+    
+    async def agenerate_json(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Async version of the generate_json method.
+        """
+        parser = IncrementalJSONParser(self.validator)
+        try:
+            async for _ in self.agenerate_json_stream(prompt, history, parser, **kwargs):
+                pass
+            return parser.result()
+        except SchemaViolation as e:
+            e.aborted = True
+            raise
+    
+    def prepare_request(self, prompt: str, kwargs: dict, history: list | None = None):
+        """
+        This method should be implemented in the child class. It adds the prompt to the message history and returns the kwargs for the
+        provider's chat completion method.
+        """
+        raise NotImplementedError('The prepare_request method must be implemented in child class to use stream.')
+    
+    def stream_kwargs(self):
+        """
+        Returns the completion kwargs that turn on streaming. Child classes can add options, e.g. to receive the token usage.
+        """
+        return {'stream': True}
+    
+    def get_chunk_text(self, chunk):
+        """
+        Returns the text delta of a stream chunk, or None if the chunk has no text.
+        """
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+    
+    def get_chunk_usage(self, chunk):
+        """
+        Returns the token usage sent with a stream chunk, or None.
+        """
+        return getattr(chunk, 'usage', None)
+    
+    def iter_stream_text(self, response):
+        """
+        Yields the text deltas of a stream response.
+        """
+        for chunk in response:
+            if text := self.get_chunk_text(chunk):
+                yield text
+    
+    def read_stream(self, response, kwargs: dict | None = None, start: float | None = None):
+        """
+        Reads a whole stream response (e.g. of a prompt sent with stream=True) and returns its text. Its usage, cost and time
+        to first token are recorded the same way as those of the stream method (see record_stream).
+        
+        Args:
+            response: The stream response.
+            kwargs (dict | None, optional): The request kwargs, to reconcile the rate limiter. Defaults to None.
+            start (float | None, optional): time.perf_counter() when the request was sent. Defaults to None (now).
+        """
+        start = time.perf_counter() if start is None else start
+        stats = {'first_token': None, 'usage': None, 'chunks': 0}
+        parts = [text for chunk in response if (text := self.record_chunk(chunk, stats, start))]
+        self.record_stream(stats, start, kwargs)
+        
+        return ''.join(parts)
+    
+    async def aread_stream(self, response, kwargs: dict | None = None, start: float | None = None):
+        """
+        Async version of the read_stream method.
+        """
+        start = time.perf_counter() if start is None else start
+        stats = {'first_token': None, 'usage': None, 'chunks': 0}
+        parts = [text async for chunk in response if (text := self.record_chunk(chunk, stats, start))]
+        self.record_stream(stats, start, kwargs)
+        
+        return ''.join(parts)
+    
+    def record_chunk(self, chunk, stats: dict, start: float):
+        """
+        Updates the stream stats with a chunk (time to first token, usage, number of text chunks) and returns its text delta.
+        """
+        text = self.get_chunk_text(chunk)
+        if text:
+            stats['chunks'] += 1
+            if stats['first_token'] is None:
+                stats['first_token'] = time.perf_counter() - start
+        if (usage := self.get_chunk_usage(chunk)) is not None:
+            stats['usage'] = usage
+        
+        return text
+    
+    def finish_stream(self, content: str, stats: dict, start: float, history: list | None = None, kwargs: dict | None = None):
+        """
+        Adds the text of a finished stream to the message history and records its usage, cost and timings (see record_stream).
+        """
+        self.format_messages(role='assistant', content=content, history=history)
+        self.compact_history(history)
+        self.record_stream(stats, start, kwargs)
+    
+    def record_stream(self, stats: dict, start: float, kwargs: dict | None = None):
+        """
+        Adds the cost of a finished stream to the inference cost and the current call, reconciles the rate limiter with its
+        usage (if the request kwargs are given), and records the time to first token and tokens per second in
+        last_stream_stats and the activity log. call_provider leaves all of this to the end of a stream, when the usage is known.
+        """
+        elapsed = time.perf_counter() - start
+        usage = stats['usage']
+        if usage is not None:
+            self.calculate_inference_cost(SimpleNamespace(usage=usage))
+        if kwargs is not None and (limiter := self.get_rate_limiter()) is not None:
+            estimated = self.estimate_request_tokens(kwargs) # the estimate call_provider acquired
+            limiter.reconcile(estimated, self.get_total_tokens(SimpleNamespace(usage=usage), estimated))
+        tokens = getattr(usage, 'completion_tokens', None) or stats['chunks']
+        ttft = stats['first_token']
+        if (call := current_call.get()) is not None:
+            call.time_to_first_token = ttft
+            call.streamed = True
+        generation_time = elapsed - (ttft or 0.0)
+        self.last_stream_stats = {
+            'time_to_first_token': ttft,
+            'elapsed': elapsed,
+            'completion_tokens': tokens,
+            'tokens_per_second': tokens / generation_time if generation_time > 0 else None,
+        }
+        self.log_activity(f'Stream finished: time to first token {ttft or 0.0:.3f}s, {tokens} tokens in {elapsed:.3f}s', role='system')
+    
+    async def agenerate(self, prompt, **kwargs):
+        """
+        Async version of the generate method. Child classes with an async API client should override this method. By default it runs the
+        blocking generate method in a worker thread so it does not block the event loop.
+        
+        Args:
+            prompt (str): The prompt to pass to the model.
+        """
+        return await asyncio.to_thread(self.generate, prompt, **kwargs)
+    
     def display_activity_log(self):
         """
         This method pretty prints the activity log to the console for troubleshooting purposes.
@@ -147,35 +1190,22 @@ class LanguageModel:
         print('-------------')
         print(f'{"Timestamp":<25}{"Role":<15}{"Cost":<6}{"Message":<60}')
         for entry in self.activity_log:
-            print(f"{entry['timestamp']:<25}{entry['role']:<15}{entry['total_inference_cost']:<6}{entry['message']:<60}")
+            print(f"{entry['timestamp']:<25}{entry['role']:<15}{entry['total_inference_cost']:<6}{entry['message'] or '':<60}")
     
     def validate_response_schema(self, response: dict, schema: dict = None):
-        """This method validates the response against the schema provided in the constructor. If the response is not valid, it raises an exception.
+        """This method validates the response against the schema provided in the constructor (compiled once into self.validator). If the response is not valid, it raises an exception.
 
         Args:
             response (dict): AI generated JSON response
+            schema (dict, optional): Schema to validate against instead of the constructor schema. It is compiled on every call. Defaults to None.
             
         Raises:
             KeyError: If the response does not match the schema provided in the constructor.
+            SchemaViolation: If a value in the response has the wrong type (e.g. a string where the schema says 'int').
         """
-        if schema is None:
-            schema = self.schema
-            
-        if schema.keys() != response.keys():
-            raise KeyError(f'Generated response does not match the schema. Expected keys: {schema.keys()}. Response keys: {response.keys()}. If problem persists, try setting a simpler schema or revising system instructions.')
-        
-        for k in schema.keys():
-            if isinstance(schema[k], dict):
-                self.validate_response_schema(response=response[k], schema=schema[k])
-            if isinstance(schema[k], list) and not isinstance(response[k], list):
-                raise ValueError(f'Expected a list for key "{k}" in response. Received {type(response[k])} instead.')
-            if not schema[k] or not response[k] or not isinstance(schema[k], list):
-                continue
-            if isinstance(schema[k][0], dict):
-                for obj in response[k]:
-                    self.validate_response_schema(response=obj, schema=schema[k][0])
-        
-        return True
+        validator = self.validator if schema is None else SchemaValidator(schema)
+        
+        return validator.validate(response)
     
     def parse_json_content(self, content: str):
         """
@@ -184,11 +1214,4 @@ class LanguageModel:
         Args:
             content (str): The content string to parse.
         """
-        match = re.search(r'\{.*\}', content, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                raise ValueError('Model failed to generate a valid JSON string.')
-        else:
-            raise ValueError('Model failed to generate a valid JSON string.')
\ No newline at end of file
+        return find_json(content, '{')
\ No newline at end of file
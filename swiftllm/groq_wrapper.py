@@ -1,10 +1,17 @@
 from .genai_wrapper import LanguageModel
+from .cache import ResponseCache
+from .history import HistoryPolicy
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter, get_rate_limiter
+from .clients import PoolConfig, DEFAULT_POOL, get_loop_id
+from .activity import ActivityLog
+from .metrics import Metrics
+from .singleflight import SingleFlight
+from groq.types.chat import ChatCompletion
 import groq
-import requests
-import traceback
-import sys
 import os
 import json
+import time
 
 SUPPORTED_GROQ_MODELS: list[str] = [
     'mixtral-8x7b-32768',
@@ -15,6 +22,32 @@ SUPPORTED_GROQ_MODELS: list[str] = [
     
 ]
 
+GROQ_CONTEXT_WINDOWS: dict = {
+    'mixtral-8x7b-32768': 32768,
+    'llama3-70b-8192': 8192,
+    'llama3-8b-8192': 8192,
+    'gemma2-9b-it': 8192,
+    'gemma-7b-it': 8192,
+}
+
+# USD per (prompt, completion) token.
+GROQ_TOKEN_PRICES: dict = {
+    'mixtral-8x7b-32768': [0.00000024, 0.00000024],
+    'llama3-70b-8192': [0.00000059, 0.00000079],
+    'llama3-8b-8192': [0.00000005, 0.00000008],
+    'gemma2-9b-it': [0.0000002, 0.0000002],
+    'gemma-7b-it': [0.00000007, 0.00000007],
+}
+
+# Default client-side limits (free tier). Update the entries to match the limits of your organization.
+GROQ_RATE_LIMITS: dict = {
+    'mixtral-8x7b-32768': {'rpm': 30, 'tpm': 5000},
+    'llama3-70b-8192': {'rpm': 30, 'tpm': 6000},
+    'llama3-8b-8192': {'rpm': 30, 'tpm': 30000},
+    'gemma2-9b-it': {'rpm': 30, 'tpm': 15000},
+    'gemma-7b-it': {'rpm': 30, 'tpm': 15000},
+}
+
 def find_model(model: str):
     """
     This function finds a supported model that matches the input model and raises an error if there is no matching model.
@@ -37,19 +70,21 @@ def match_model(model: str, supported_model: str):
     
 class Groq(LanguageModel):
     
-    def __init__(self, instructions: str = None, sample_outputs: list = None, schema: dict = None, prev_messages: list = None, response_type: str = None, model: str = 'mixtral-8x7b', api_key: str = None, temperature: float = 0.5, max_tokens: int = 1024, top_p: float = 1.0, stop: str = None, stream: bool = False):
-        super().__init__(instructions, sample_outputs, schema, prev_messages, response_type)
+    def __init__(self, instructions: str = None, sample_outputs: list = None, schema: dict = None, prev_messages: list = None, response_type: str = None, model: str = 'mixtral-8x7b', api_key: str = None, temperature: float = 0.5, max_tokens: int = 1024, top_p: float = 1.0, stop: str = None, stream: bool = False, cache: ResponseCache = None, history_policy: HistoryPolicy = None, retry_policy: RetryPolicy = None, rate_limit: RateLimiter | bool = None, base_url: str = None, pool: PoolConfig = None, stream_validation: bool = False, activity_log: ActivityLog = None, metrics: Metrics = None, single_flight: SingleFlight | bool = None):
+        super().__init__(instructions, sample_outputs, schema, prev_messages, response_type, cache, history_policy, retry_policy, rate_limit, stream_validation, activity_log, metrics, single_flight)
         if api_key is None:
             api_key = os.environ.get('GROQ_API_KEY')
         self.model = find_model(model)
-        self.client = groq.Groq(api_key=api_key)
-        self.format_instructions()
-        self.initialize_messages()
+        self.pool = pool or DEFAULT_POOL
+        self.client_kwargs = {'api_key': api_key, 'max_retries': 0, 'timeout': self.pool.timeout} # retries are handled by the retry policy
+        if base_url:
+            self.client_kwargs['base_url'] = base_url
+        self.client = self.acquire_client(self.get_client_key(), lambda: groq.Groq(**self.client_kwargs, http_client=self.pool.http_client(groq)))
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.top_p = top_p
         self.stop = stop
-        self.stream = stream
+        self.stream_default = stream # not self.stream, which would hide the stream method
     
     def find_model(self, model: str):
         """
@@ -59,14 +94,41 @@ class Groq(LanguageModel):
             if model.lower() in supported_model.lower():
                 return supported_model
     
-    def initialize_messages(self):
+    def get_client_key(self, is_async: bool = False):
         """
-        This method initializes the messages in the prev_messages list.
+        Returns the key of the shared client for this model's api key, base URL and pool settings. The key of an async client
+        also contains the id of the running event loop.
         """
-        self.format_messages(role='system', content=self.instructions)
-        self.format_messages(role='assistant', content='OK. I will follow the system instructions to the best of my ability.')
-        
-    def get_completion_kwargs(self, max_tokens: int, temperature: float, top_p: float, stop: str, stream: bool):
+        loop_id = get_loop_id() if is_async else None
+        return ('groq', is_async, loop_id, tuple(sorted(self.client_kwargs.items())), self.pool.key())
+    
+    def get_async_client(self):
+        """
+        This method returns the shared AsyncGroq client of the running event loop, acquiring it with the same settings as the sync client the first time it is needed on that loop.
+        """
+        return self.acquire_async_client(self.get_client_key(True), lambda: groq.AsyncGroq(**self.client_kwargs, http_client=self.pool.http_client(groq, True)))
+    
+    def get_context_window(self):
+        """
+        Returns the context window of self.model in tokens.
+        """
+        return GROQ_CONTEXT_WINDOWS.get(self.model)
+    
+    def get_token_prices(self, model: str | None = None):
+        """
+        Returns the (prompt, completion) price per token of the model (self.model if None) from GROQ_TOKEN_PRICES.
+        """
+        return GROQ_TOKEN_PRICES.get(model or self.model)
+    
+    def get_rate_limiter(self):
+        """
+        Returns the rate limiter for this model. rate_limit=True shares one limiter per model across the process, using GROQ_RATE_LIMITS.
+        """
+        if self.rate_limit is True:
+            return get_rate_limiter('groq', self.model, GROQ_RATE_LIMITS)
+        return super().get_rate_limiter()
+    
+    def get_completion_kwargs(self, max_tokens: int, temperature: float, top_p: float, stop: str, stream: bool, history: list = None):
         """This function gets all the kwargs for the chat.completion.create method in the Groq API client.
 
         Args:
@@ -75,25 +137,24 @@ class Groq(LanguageModel):
             top_p (float): controls diversity via nucleus sampling
             stop (str): stop sequence so model knows to stop generating.
             stream (bool): return stream of chat completion deltas as response generates or not
+            history (list, optional): message history to send instead of prev_messages
 
         Returns:
             dict: kwargs for the chat.completion.create method in the Groq API client
         """
         args = [max_tokens, temperature, top_p, stop, stream]
-        attributes = [self.max_tokens, self.temperature, self.top_p, self.stop, self.stream]
-        for arg, attribute in zip(args, attributes):
-            if arg is None:
-                arg = attribute
+        attributes = [self.max_tokens, self.temperature, self.top_p, self.stop, self.stream_default]
+        args = [attribute if arg is None else arg for arg, attribute in zip(args, attributes)]
                 
         keys = ['max_tokens', 'temperature', 'top_p', 'stop', 'stream']
-        kwargs = {key: arg for key, arg in zip(keys, args) if arg}
+        kwargs = {key: arg for key, arg in zip(keys, args) if arg is not None and arg is not False}
         
         kwargs['model'] = self.model
-        kwargs['messages'] = self.prev_messages
+        kwargs['messages'] = self.select_messages(history)
         
         return kwargs
         
-    def generate(self, prompt: str, response_type: str = None, max_tokens: int = None, temperature: float = None, top_p: float = None, stop: str = None, stream: bool = None):
+    def generate(self, prompt: str, response_type: str = None, max_tokens: int = None, temperature: float = None, top_p: float = None, stop: str = None, stream: bool = None, history: list = None):
         """This prompts the model to generates a response from the Groq API.
         
         Args:
@@ -104,34 +165,127 @@ class Groq(LanguageModel):
             top_p: float [opt] - controls diversity via nucleus sampling
             stop: str [opt] - stop sequence so model knows to stop generating
             stream: bool [opt] - return stream of chat completion deltas as response generates or not
+            history: list [opt] - message history to use instead of prev_messages
+            
+        Returns:
+            str | response | dict: the response from the Groq API (type depends on response_type provided)
+        """
+        kwargs: dict = self.prepare_request(prompt, {'max_tokens': max_tokens, 'temperature': temperature, 'top_p': top_p, 'stop': stop, 'stream': stream}, history) # add prompt and get kwargs for chat completion create method
+        start = time.perf_counter()
+        response = self.send_request(kwargs, response_type) # generate response from Groq API (or the cache)
+        if isinstance(response, groq.Stream):
+            content = self.read_stream(response, kwargs, start) # records the usage and cost sent with the last chunk
+            self.format_messages(role='assistant', content=content, history=history)
+        else:
+            content = self.parse_content(response, history) # adds response as assistant message
+        
+        return self.process_response(response, response_type, content) # return appropriate value based on response_type
+    
+    async def agenerate(self, prompt: str, response_type: str = None, max_tokens: int = None, temperature: float = None, top_p: float = None, stop: str = None, stream: bool = None, history: list = None):
+        """Async version of the generate method. It prompts the model through the AsyncGroq client so the event loop is not blocked while waiting on the Groq API.
+        
+        Args:
+            prompt: str - the prompt to generate a response from
+            response_type: str [opt] - the type of response to return (RAW, CONTENT, JSON)
+            max_tokens: int [opt] - the maximum number of tokens the model should generate
+            temperature: float [opt] - the randomness of the model, 0 = deterministic, 1 = very random
+            top_p: float [opt] - controls diversity via nucleus sampling
+            stop: str [opt] - stop sequence so model knows to stop generating
+            stream: bool [opt] - return stream of chat completion deltas as response generates or not
+            history: list [opt] - message history to use instead of prev_messages
             
         Returns:
             str | response | dict: the response from the Groq API (type depends on response_type provided)
         """
-        self.format_messages(role='user', content=prompt) # adds prompt as user message
-        kwargs: dict = self.get_completion_kwargs(max_tokens, temperature, top_p, stop, stream) # get kwargs for chat completion create method
-        response = self.client.chat.completions.create(**kwargs) # generate response from Groq API
-        content = self.process_response(response, response_type) # return appropriate value based on response_type
+        kwargs: dict = self.prepare_request(prompt, {'max_tokens': max_tokens, 'temperature': temperature, 'top_p': top_p, 'stop': stop, 'stream': stream}, history) # add prompt and get kwargs for chat completion create method
+        start = time.perf_counter()
+        response = await self.asend_request(kwargs, response_type) # generate response from Groq API (or the cache) without blocking
+        if isinstance(response, groq.AsyncStream):
+            content = await self.aread_stream(response, kwargs, start)
+            self.format_messages(role='assistant', content=content, history=history)
+        else:
+            content = self.parse_content(response, history) # adds response as assistant message
+        
+        return self.process_response(response, response_type, content) # return appropriate value based on response_type
+    
+    def prepare_request(self, prompt: str, kwargs: dict, history: list = None):
+        """
+        Adds the prompt to the message history and returns the kwargs for the chat.completions.create method. kwargs may contain
+        max_tokens, temperature, top_p, stop and stream; missing or None values fall back to the model's defaults.
+        """
+        self.format_messages(role='user', content=prompt, history=history) # adds prompt as user message
+        keys = ['max_tokens', 'temperature', 'top_p', 'stop', 'stream']
+        kwargs = self.get_completion_kwargs(*[kwargs.get(key) for key in keys], history)
+        kwargs['messages'] = self.add_context(prompt, kwargs['messages'])
+        
+        return kwargs
+    
+    def parse_content(self, response, history: list = None):
+        """
+        Returns the generated text of the response (reading the whole stream if it is one) and adds it to the message history
+        so the conversation continues from it.
+        """
+        if isinstance(response, groq.Stream):
+            content = self.handle_stream(response)
+        else:
+            content = response.choices[0].message.content
+        self.format_messages(role='assistant', content=content, history=history)
         
         return content
     
-    def process_response(self, response, response_type: str):
+    def handle_stream(self, response):
+        """
+        Reads a stream response from the Groq API, records its usage and cost, and returns the generated text.
+        """
+        return self.read_stream(response)
+    
+    async def ahandle_stream(self, response):
+        """
+        Reads an async stream response from the Groq API, records its usage and cost, and returns the generated text.
+        """
+        return await self.aread_stream(response)
+    
+    def get_chunk_usage(self, chunk):
+        """
+        Returns the token usage Groq sends with the last chunk of a stream (in chunk.x_groq.usage), or None.
+        """
+        x_groq = getattr(chunk, 'x_groq', None)
+        return getattr(x_groq, 'usage', None)
+    
+    def get_response(self, kwargs: dict):
+        """
+        Generate a response to the prompt using the Groq API client.
+        """
+        return self.client.chat.completions.create(**kwargs)
+    
+    async def aget_response(self, kwargs: dict):
+        """
+        Generate a response to the prompt using the AsyncGroq API client.
+        """
+        return await self.get_async_client().chat.completions.create(**kwargs)
+    
+    def load_response(self, data: str):
+        """
+        Rebuilds a cached Groq ChatCompletion from its JSON string.
+        """
+        return ChatCompletion.model_validate_json(data)
+    
+    def process_response(self, response, response_type: str, content: str = None):
         """
         Process the generated response from the Groq API and return the appropriate value corresponding with the response_type
         """
-        print(response_type)
         if response_type is None:
             response_type = self.response_type
-        print(response_type)
-        #print(response_type)
             
         if response_type == 'RAW':
             return response
         
-        content = response.choices[0].message.content
+        if content is None:
+            content = response.choices[0].message.content
         if response_type == 'CONTENT':
             return content
         
         json_obj = self.parse_json_content(content)
-        return json_obj
+        if self.schema == {} or self.validate_response_schema(json_obj):
+            return json_obj
     
\ No newline at end of file
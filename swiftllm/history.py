@@ -0,0 +1,131 @@
+MESSAGE_OVERHEAD_TOKENS: int = 4 # tokens the chat format adds around every message
+
+
+def estimate_tokens(text: str):
+    """
+    Fast offline token estimate (about 4 characters per token for English text). Good enough to budget a context window
+    without loading a tokenizer.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def estimate_message_tokens(messages: list, estimator=estimate_tokens):
+    """
+    Estimates the number of prompt tokens a list of chat messages will use.
+    """
+    return sum(estimator(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def split_turns(messages: list):
+    """
+    Splits a list of messages into turns. Each turn starts with a user message and includes the messages that follow it.
+    Messages before the first user message form their own turn.
+    """
+    turns = []
+    for message in messages:
+        if message.get('role') == 'user' or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    return turns
+
+
+class HistoryPolicy:
+
+    """
+    This is the base class for conversation history policies. A policy decides which messages of a conversation are sent to
+    the provider. The first pinned messages (previous messages and system instructions) are always kept, as is the current turn.
+    """
+
+    def select(self, messages: list, pinned: int = 0, context_window: int | None = None):
+        """
+        Returns the messages that should be sent to the provider. The messages list is not modified.
+
+        Args:
+            messages (list): The full message history, ending with the current turn.
+            pinned (int, optional): Number of leading messages that are always kept. Defaults to 0.
+            context_window (int | None, optional): Context window of the model in tokens, if known. Defaults to None.
+        """
+        raise NotImplementedError('The select method must be implemented in child class.')
+
+
+class StatelessHistory(HistoryPolicy):
+
+    """
+    Sends only the pinned messages and the current turn, so every prompt is independent of the ones before it.
+    """
+
+    def select(self, messages: list, pinned: int = 0, context_window: int | None = None):
+        turns = split_turns(messages[pinned:])
+        return messages[:pinned] + (turns[-1] if turns else [])
+
+
+class LastNTurns(HistoryPolicy):
+
+    """
+    Sends the pinned messages and the last n turns, counting the current turn.
+    """
+
+    def __init__(self, n: int = 5):
+        """
+        Initialize the LastNTurns policy.
+
+        Args:
+            n (int, optional): Number of turns to keep, including the current one. Defaults to 5.
+        """
+        if n < 1:
+            raise ValueError(f'n must be at least 1. Received {n} instead.')
+        self.n = n
+
+    def select(self, messages: list, pinned: int = 0, context_window: int | None = None):
+        turns = split_turns(messages[pinned:])
+        return messages[:pinned] + [message for turn in turns[-self.n:] for message in turn]
+
+
+class TokenBudget(HistoryPolicy):
+
+    """
+    Sends the pinned messages and as many of the most recent turns as fit in a token budget. The oldest turns are dropped first.
+    """
+
+    def __init__(self, max_tokens: int | None = None, reserve: int = 1024, estimator=estimate_tokens):
+        """
+        Initialize the TokenBudget policy.
+
+        Args:
+            max_tokens (int | None, optional): Prompt token budget. Defaults to None (the model's context window minus reserve).
+            reserve (int, optional): Tokens kept free for the completion when the budget comes from the context window. Defaults to 1024.
+            estimator (callable, optional): Function that returns the number of tokens in a string. Defaults to estimate_tokens.
+        """
+        self.max_tokens = max_tokens
+        self.reserve = reserve
+        self.estimator = estimator
+
+    def get_budget(self, context_window: int | None):
+        """
+        Returns the prompt token budget, or None if there is no budget and no known context window.
+        """
+        if self.max_tokens is not None:
+            return self.max_tokens
+        if context_window is None:
+            return None
+        return max(context_window - self.reserve, 0)
+
+    def select(self, messages: list, pinned: int = 0, context_window: int | None = None):
+        budget = self.get_budget(context_window)
+        if budget is None:
+            return messages
+        turns = split_turns(messages[pinned:])
+        if not turns:
+            return messages[:pinned]
+        used = estimate_message_tokens(messages[:pinned], self.estimator) + estimate_message_tokens(turns[-1], self.estimator)
+        kept = [turns[-1]]
+        for turn in reversed(turns[:-1]):
+            used += estimate_message_tokens(turn, self.estimator)
+            if used > budget:
+                break
+            kept.append(turn)
+
+        return messages[:pinned] + [message for turn in reversed(kept) for message in turn]
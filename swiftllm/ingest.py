@@ -0,0 +1,182 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+
+INGEST_STAGES: tuple = ('discovered', 'unchanged', 'removed', 'parsed', 'chunks', 'embedded', 'upserted')
+
+
+def hash_file(path: str):
+    """
+    Returns the sha256 hex digest of a file, read in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_file(data_path: str, path: str, mtime: int, size: int, old_hash: str | None, loader_cls, splitter):
+    """
+    Hashes, loads and splits one file. Runs in a worker process, so it only takes and returns picklable plain data.
+    Returns (path, mtime, size, digest, texts, metadatas); texts and metadatas are None if the content hash is old_hash.
+    """
+    full_path = os.path.join(data_path, path)
+    digest = hash_file(full_path)
+    if digest == old_hash:
+        return path, mtime, size, digest, None, None
+    chunks = splitter.split_documents(loader_cls(full_path).load())
+    return path, mtime, size, digest, [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks]
+
+
+def print_progress(progress: dict):
+    """
+    Default progress callback: prints one line with the counters of every stage.
+    """
+    print(f"ingest: {progress['parsed']}/{progress['discovered']} files parsed ({progress['unchanged']} unchanged), "
+          f"{progress['chunks']} chunks, {progress['embedded']} embedded, {progress['upserted']} files upserted, "
+          f"{progress['removed']} removed, {progress['seconds']:.1f}s")
+
+
+class IngestConfig:
+
+    """
+    Settings of the RAG ingestion pipeline. Files are discovered and checked for changes, hashed, loaded and split in a
+    process pool, grouped into batches of chunks, and embedded and upserted on a writer thread. Each stage holds at most its
+    queue depth of work, so memory stays flat however large the corpus is.
+    """
+
+    def __init__(self, processes: int | None = None, parse_queue: int | None = None, embed_queue: int = 2, batch_size: int = 256, progress=print_progress, progress_interval: float = 1.0):
+        """
+        Initialize the IngestConfig object.
+
+        Args:
+            processes (int | None, optional): Worker processes that load and split files. 1 parses in this process.
+                Defaults to None (one per core).
+            parse_queue (int | None, optional): Files being parsed or waiting to be batched. Defaults to None (2 per process).
+            embed_queue (int, optional): Batches waiting to be embedded and upserted. Defaults to 2.
+            batch_size (int, optional): Chunks embedded and upserted together (a file is never split across batches).
+                Defaults to 256.
+            progress (optional): Called with a dict of the stage counters at most every progress_interval seconds and at the
+                end. Defaults to print_progress (None disables it).
+            progress_interval (float, optional): Seconds between progress reports. Defaults to 1.0.
+        """
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.parse_queue = max(1, parse_queue or 2 * self.processes)
+        self.embed_queue = max(1, embed_queue)
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+
+class IngestProgress:
+
+    """
+    Thread-safe counters of the ingestion stages (see INGEST_STAGES), reported to the config's progress callback.
+    """
+
+    def __init__(self, config: IngestConfig):
+        self.config = config
+        self.counts: dict = dict.fromkeys(INGEST_STAGES, 0)
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, count: int = 1):
+        with self.lock:
+            self.counts[stage] += count
+            due = time.monotonic() - self.last_report >= self.config.progress_interval
+            if due:
+                self.last_report = time.monotonic()
+        if due:
+            self.report()
+
+    def as_dict(self):
+        with self.lock:
+            return {**self.counts, 'seconds': time.monotonic() - self.start}
+
+    def report(self):
+        if self.config.progress is not None:
+            self.config.progress(self.as_dict())
+
+
+def parse_files(jobs, config: IngestConfig):
+    """
+    Runs parse_file over an iterable of argument tuples and yields the results in completion order. At most parse_queue
+    files are in flight, so jobs is consumed lazily. The process pool is only started if there is a job.
+    """
+    jobs = iter(jobs)
+    first = next(jobs, None)
+    if first is None:
+        return
+    if config.processes == 1:
+        yield parse_file(*first)
+        for job in jobs:
+            yield parse_file(*job)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    with ProcessPoolExecutor(config.processes) as executor:
+        pending = {executor.submit(parse_file, *first)}
+        for job in jobs:
+            if len(pending) >= config.parse_queue:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(parse_file, *job))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def batch_files(results, batch_size: int):
+    """
+    Groups parsed files into batches of at least batch_size chunks (the last batch may be smaller).
+    """
+    batch, chunks = [], 0
+    for result in results:
+        batch.append(result)
+        chunks += len(result[4] or ())
+        if chunks >= batch_size:
+            yield batch
+            batch, chunks = [], 0
+    if batch:
+        yield batch
+
+
+def run_in_background(consumer, items, depth: int):
+    """
+    Calls consumer(item) for every item on a background thread, fed through a queue of at most depth items, so producing
+    the next items overlaps consuming the previous ones. Re-raises the first exception of either side after both stopped.
+    """
+    work: queue.Queue = queue.Queue(depth)
+    errors = []
+
+    def run():
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            if errors:
+                continue # drain the queue so the producer is never blocked
+            try:
+                consumer(item)
+            except BaseException as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=run, name='swiftllm-ingest-writer', daemon=True)
+    thread.start()
+    try:
+        for item in items:
+            if errors:
+                break
+            work.put(item)
+    finally:
+        work.put(None)
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,143 @@
+import json
+from .schema import SchemaValidator, SchemaViolation
+
+
+class IncrementalJSONParser:
+
+    """
+    Parses a JSON object from text that arrives in pieces (stream deltas). It scans every character once, keeps track of
+    strings and nesting, and reports each top-level field as soon as its value is complete. Keys are checked against the schema
+    the moment they are closed, so a stream that went off-schema can be cancelled right away. Any text before the object
+    (e.g. "Here is the JSON:") is ignored, including braces that don't start a JSON object (e.g. "Fill in {name}:").
+    """
+
+    def __init__(self, schema: dict | SchemaValidator | None = None):
+        """
+        Initialize the IncrementalJSONParser object.
+
+        Args:
+            schema (dict | SchemaValidator | None, optional): Schema of the expected object, or a validator compiled from it. Defaults to None (no checks).
+        """
+        self.validator = schema if isinstance(schema, SchemaValidator) else SchemaValidator(schema)
+        self.schema_keys = self.validator.keys
+        self.partial: dict = {} # top-level fields whose values are complete
+        self.done = False # the root object has been closed
+        self.restart()
+
+    def restart(self):
+        """
+        Forgets the text fed since the last '{', which turned out not to start the JSON object, and waits for the next one.
+        """
+        self.chars: list = [] # every character of the JSON text fed so far
+        self.started = False # the root '{' has been seen
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.expect_key = True # at depth 1, the next string is a key
+        self.key_start = None # index of the first character of the key being read
+        self.key = None # the key whose value is being read
+        self.value_start = None # index of the first character of the value being read
+
+    def feed(self, text: str):
+        """
+        Adds a piece of text and returns a list of (key, value) pairs for the top-level fields completed by it.
+
+        Raises:
+            SchemaViolation: If a key is not in the schema, a value does not match its schema, or the object closed without every schema key.
+        """
+        fields = []
+        for char in text:
+            if self.done:
+                break
+            if not self.started:
+                if char == '{':
+                    self.started = True
+                    self.depth = 1
+                    self.chars.append(char)
+                continue
+            index = len(self.chars)
+            self.chars.append(char)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.key_start is not None:
+                        self.close_key(index)
+                continue
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expect_key:
+                    self.key_start = index + 1
+                elif self.depth == 1 and self.value_start is None:
+                    self.value_start = index
+            elif char in '{[':
+                if self.depth == 1 and self.value_start is None:
+                    self.value_start = index
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.close_value(index, fields)
+                    self.close_object()
+            elif self.depth == 1:
+                if self.expect_key and self.key is None and not char.isspace() and char != ',':
+                    if self.partial:
+                        raise ValueError('Model failed to generate a valid JSON string.')
+                    self.restart() # the brace was part of the text before the JSON, e.g. "{name}"
+                elif char == ',':
+                    self.close_value(index, fields)
+                    self.expect_key = True
+                elif char == ':':
+                    self.expect_key = False
+                elif not char.isspace() and self.value_start is None and not self.expect_key:
+                    self.value_start = index
+
+        return fields
+
+    def close_key(self, end: int):
+        """
+        Records the key that ends at index end and checks it against the schema.
+        """
+        self.key = json.loads('"' + ''.join(self.chars[self.key_start:end]) + '"')
+        self.key_start = None
+        if self.schema_keys and self.key not in self.schema_keys:
+            raise SchemaViolation(f'Generated response does not match the schema. Unexpected key "{self.key}". Expected keys: {sorted(self.schema_keys)}.')
+
+    def close_value(self, end: int, fields: list):
+        """
+        Parses the value of the current key that ends before index end, validates it and adds it to fields.
+        """
+        if self.key is None or self.value_start is None:
+            return
+        try:
+            value = json.loads(''.join(self.chars[self.value_start:end]))
+        except json.JSONDecodeError:
+            raise ValueError('Model failed to generate a valid JSON string.')
+        self.validator.validate_field(self.key, value)
+        self.partial[self.key] = value
+        fields.append((self.key, value))
+        self.key = None
+        self.value_start = None
+
+    def close_object(self):
+        """
+        Marks the root object as complete and checks that every schema key was present.
+        """
+        self.done = True
+        missing = self.schema_keys - set(self.partial)
+        if missing:
+            raise SchemaViolation(f'Generated response does not match the schema. Missing keys: {sorted(missing)}.')
+
+    def result(self):
+        """
+        Returns the complete parsed object.
+
+        Raises:
+            ValueError: If the text fed so far does not contain a complete JSON object.
+        """
+        if not self.done:
+            raise ValueError('Model failed to generate a valid JSON string.')
+        return json.loads(''.join(self.chars))
@@ -0,0 +1,199 @@
+import contextvars
+import threading
+import time
+from collections import deque
+
+# The CallRecord of the prompt running in the current thread or task. send_request and calculate_inference_cost add the
+# cache status, tokens and cost of each attempt to it without threading it through every method.
+current_call: contextvars.ContextVar = contextvars.ContextVar('swiftllm_current_call', default=None)
+
+
+class CallRecord:
+
+    """
+    Metrics of one prompt call, including its retries. Token counts and cost add up over all attempts, since failed attempts
+    that got a response (e.g. one that didn't match the schema) are billed too.
+    """
+
+    FIELDS: tuple = ('model', 'started', 'latency', 'retry_time', 'attempts', 'prompt_tokens', 'completion_tokens', 'cost', 'cache', 'time_to_first_token', 'streamed', 'error')
+
+    __slots__ = FIELDS + ('clock', 'cache_entry')
+
+    def __init__(self, model: str, streamed: bool = False):
+        self.model = model
+        self.started = time.time()
+        self.clock = time.monotonic() # start of the call for the latency
+        self.latency: float | None = None # wall time of the whole call in seconds
+        self.retry_time: float = 0.0 # seconds spent on failed attempts and backoff before the last attempt
+        self.attempts: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+        self.cost: float = 0.0
+        self.cache: str | None = None # 'hit', 'miss', 'coalesced' (answered by an identical call in flight), or None
+        self.time_to_first_token: float | None = None # streamed calls only
+        self.streamed = streamed
+        self.error: str | None = None # exception type of the last failed attempt if the call failed
+        self.cache_entry: tuple | None = None # (key, serialized response, or None for a hit) of the attempt, see settle_cache
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, cost: float):
+        """
+        Adds the usage and cost of one provider response.
+        """
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+
+    def as_dict(self):
+        """
+        Returns the record as a dict.
+        """
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        return f'CallRecord({self.as_dict()})'
+
+
+class ModelStats:
+
+    """
+    Cumulative metrics of every call to one model. Keeps the latencies of the last window calls for percentiles.
+    """
+
+    def __init__(self, window: int = 1000):
+        """
+        Initialize the ModelStats object.
+
+        Args:
+            window (int, optional): Number of recent latencies kept for percentiles. Defaults to 1000.
+        """
+        self.calls: int = 0
+        self.errors: int = 0
+        self.attempts: int = 0
+        self.cache_hits: int = 0
+        self.coalesced: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+        self.cost: float = 0.0
+        self.latency: float = 0.0
+        self.retry_time: float = 0.0
+        self.latencies: deque = deque(maxlen=window)
+
+    def add(self, record: CallRecord):
+        """
+        Adds a finished call.
+        """
+        self.calls += 1
+        self.errors += record.error is not None
+        self.attempts += record.attempts
+        self.cache_hits += record.cache == 'hit'
+        self.coalesced += record.cache == 'coalesced'
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += record.cost
+        self.latency += record.latency
+        self.retry_time += record.retry_time
+        self.latencies.append(record.latency)
+
+    def percentile(self, q: float):
+        """
+        Returns the q-th percentile (0-100) of the recent latencies, or None if there are none.
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q / 100))]
+
+    def summary(self):
+        """
+        Returns the totals, averages and latency percentiles as a dict.
+        """
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'attempts': self.attempts,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost': self.cost,
+            'mean_latency': self.latency / self.calls if self.calls else None,
+            'p50_latency': self.percentile(50),
+            'p95_latency': self.percentile(95),
+            'retry_time': self.retry_time,
+        }
+
+
+class MetricsHook:
+
+    """
+    Base class for exporting metrics (e.g. to Prometheus or StatsD). Override the methods you need; they are called on the
+    thread or task that runs the prompt, so they should be quick. Exceptions raised by a hook are logged, not propagated.
+    """
+
+    def on_request(self, record: CallRecord):
+        """
+        Called when a call starts, before the first attempt.
+        """
+
+    def on_error(self, record: CallRecord, error: Exception):
+        """
+        Called after every failed attempt. record.attempts is the number of the attempt that failed.
+        """
+
+    def on_response(self, record: CallRecord):
+        """
+        Called when a call finishes, after the ledger was updated. record.error is None if it succeeded, otherwise the type
+        of the exception that made it give up.
+        """
+
+
+class Metrics:
+
+    """
+    Collects the CallRecords of one or more models: a cumulative ledger per model name, the most recent calls, and the hooks
+    that export them. Share one Metrics object between models to see all spend in one place.
+    """
+
+    def __init__(self, hooks: list | None = None, max_calls: int = 1000):
+        """
+        Initialize the Metrics object.
+
+        Args:
+            hooks (list | None, optional): MetricsHook objects called for every call. Defaults to None.
+            max_calls (int, optional): Number of recent CallRecords kept. Defaults to 1000.
+        """
+        self.hooks: list = list(hooks or [])
+        self.ledger: dict = {} # model name -> ModelStats
+        self.calls: deque = deque(maxlen=max_calls)
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook: MetricsHook):
+        """
+        Registers a hook.
+        """
+        self.hooks.append(hook)
+
+    def record(self, record: CallRecord):
+        """
+        Adds a finished call to the ledger of its model and to the recent calls.
+        """
+        with self.lock:
+            stats = self.ledger.get(record.model)
+            if stats is None:
+                stats = self.ledger[record.model] = ModelStats()
+            stats.add(record)
+            self.calls.append(record)
+
+    def summary(self):
+        """
+        Returns the ledger summary of every model as a dict.
+        """
+        with self.lock:
+            return {model: stats.summary() for model, stats in self.ledger.items()}
+
+    def total_cost(self):
+        """
+        Returns the cost of every call recorded so far.
+        """
+        with self.lock:
+            return sum(stats.cost for stats in self.ledger.values())
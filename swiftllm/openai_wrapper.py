@@ -1,12 +1,24 @@
 from .genai_wrapper import LanguageModel
+from .cache import ResponseCache
+from .history import HistoryPolicy
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter, get_rate_limiter
+from .clients import PoolConfig, DEFAULT_POOL, get_loop_id
+from .activity import ActivityLog
+from .metrics import Metrics
+from .singleflight import SingleFlight
+from openai.types.chat import ChatCompletion
 import openai
-import requests
 import os
 import json
+import time
 
+# USD per (prompt, completion) token. Dated model names without an entry are priced like their longest listed prefix.
 OPENAI_TOKEN_PRICES = {
     'gpt-4o': [0.000005, 0.000015],
+    'gpt-4o-mini': [0.00000015, 0.0000006],
     'gpt-4o-2024-05-13': [0.000005, 0.000015],
+    'gpt-3.5-turbo': [0.0000005, 0.0000015],
     'gpt-3.5-turbo-0125': [0.0000005, 0.0000015],
     'gpt-3.5-turbo-instruct': [0.0000015, 0.000002],
     'gpt-4-turbo': [0.00001, 0.00003],
@@ -24,33 +36,109 @@ OPENAI_TOKEN_PRICES = {
     'babbage-002': [0.0000004, 0.0000004],
 }
 
+OPENAI_CONTEXT_WINDOWS = {
+    'gpt-4o': 128000,
+    'gpt-4-turbo': 128000,
+    'gpt-4-0125-preview': 128000,
+    'gpt-4-1106-preview': 128000,
+    'gpt-4-vision-preview': 128000,
+    'gpt-4-32k': 32768,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo-instruct': 4096,
+    'gpt-3.5-turbo-16k-0613': 16385,
+    'gpt-3.5-turbo-0613': 4096,
+    'gpt-3.5-turbo-0301': 4096,
+    'gpt-3.5-turbo': 16385,
+    'davinci-002': 16384,
+    'babbage-002': 16384,
+}
+
+# Default client-side limits (usage tier 1). Update the entries to match the limits of your organization.
+OPENAI_RATE_LIMITS = {
+    'gpt-4o': {'rpm': 500, 'tpm': 30000},
+    'gpt-4-turbo': {'rpm': 500, 'tpm': 30000},
+    'gpt-4': {'rpm': 500, 'tpm': 10000},
+    'gpt-3.5-turbo': {'rpm': 3500, 'tpm': 60000},
+    'gpt-3.5-turbo-instruct': {'rpm': 3500, 'tpm': 90000},
+    'davinci-002': {'rpm': 3000, 'tpm': 250000},
+    'babbage-002': {'rpm': 3000, 'tpm': 250000},
+}
+
+def find_context_window(model: str):
+    """
+    This function returns the context window of an OpenAI model, matching dated model names (e.g. gpt-4o-2024-05-13) by their longest known prefix.
+    """
+    matches = [name for name in OPENAI_CONTEXT_WINDOWS if model.lower().startswith(name)]
+    if not matches:
+        return None
+    return OPENAI_CONTEXT_WINDOWS[max(matches, key=len)]
+
+def find_token_prices(model: str):
+    """
+    This function returns the (prompt, completion) price per token of an OpenAI model, matching dated model names by their longest known prefix.
+    """
+    matches = [name for name in OPENAI_TOKEN_PRICES if model.lower().startswith(name)]
+    if not matches:
+        return None
+    return OPENAI_TOKEN_PRICES[max(matches, key=len)]
+
 class OpenAI(LanguageModel):
-    def __init__(self, instructions: str = None, sample_outputs: list = None, schema: dict = None, prev_messages: list = None, response_type: str = None, model: str = 'gpt-3.5-turbo', organization: str = '', project: str = '', api_key: str = None, **kwargs):
+    def __init__(self, instructions: str = None, sample_outputs: list = None, schema: dict = None, prev_messages: list = None, response_type: str = None, model: str = 'gpt-3.5-turbo', organization: str = '', project: str = '', api_key: str = None, cache: ResponseCache = None, history_policy: HistoryPolicy = None, retry_policy: RetryPolicy = None, rate_limit: RateLimiter | bool = None, base_url: str = None, pool: PoolConfig = None, stream_validation: bool = False, activity_log: ActivityLog = None, metrics: Metrics = None, single_flight: SingleFlight | bool = None, **kwargs):
         if os.getenv('OPENAI_API_KEY') is None and api_key is None:
             raise KeyError('OPENAI_API_KEY not found in environment variables. Please set the OPENAI_API_KEY environment variable to use the OpenAI models.')
         if api_key is None:
             api_key = os.environ.get('OPENAI_API_KEY')
         self.model = model
-        super().__init__(instructions, sample_outputs, schema, prev_messages, response_type)
+        super().__init__(instructions, sample_outputs, schema, prev_messages, response_type, cache, history_policy, retry_policy, rate_limit, stream_validation, activity_log, metrics, single_flight)
         if self.response_type == 'JSON' and self.no_json_capability():
             raise TypeError(f'The model {self.model} does not support JSON output. Please choose a model that supports JSON output. The following base models and their offshoots support JSON response: gpt-4o, gpt-4-turbo, gpt-3.5-turbo.')
-        client_kwargs = self.get_client_kwargs(api_key, project, organization)
-        self.client = openai.OpenAI(**client_kwargs)
-        self.format_instructions()
+        self.pool = pool or DEFAULT_POOL
+        self.client_kwargs = self.get_client_kwargs(api_key, project, organization, base_url)
+        self.client = self.acquire_client(self.get_client_key(), lambda: openai.OpenAI(**self.client_kwargs, http_client=self.pool.http_client(openai)))
         self.kwargs = kwargs
     
-    def get_client_kwargs(self, api_key, project, organization):
+    def get_client_kwargs(self, api_key, project, organization, base_url=None):
         """
-        This function gets a dict of kwargs to pass to the OpenAI client.
+        This function gets a dict of kwargs to pass to the OpenAI client. Retries are left to the model's retry policy.
         """
-        kwargs = {'api_key': api_key}
+        kwargs = {'api_key': api_key, 'max_retries': 0, 'timeout': self.pool.timeout}
         if organization:
-            kwargs['organization'] = self.organization
+            kwargs['organization'] = organization
         if project:
-            kwargs['project'] = self.project
+            kwargs['project'] = project
+        if base_url:
+            kwargs['base_url'] = base_url
         
         return kwargs
     
+    def get_client_key(self, is_async: bool = False):
+        """
+        Returns the key of the shared client for this model's credentials, base URL and pool settings. The key of an async
+        client also contains the id of the running event loop.
+        """
+        loop_id = get_loop_id() if is_async else None
+        return ('openai', is_async, loop_id, tuple(sorted(self.client_kwargs.items())), self.pool.key())
+    
+    def get_async_client(self):
+        """
+        This method returns the shared AsyncOpenAI client of the running event loop, acquiring it with the same settings as the sync client the first time it is needed on that loop.
+        """
+        return self.acquire_async_client(self.get_client_key(True), lambda: openai.AsyncOpenAI(**self.client_kwargs, http_client=self.pool.http_client(openai, True)))
+    
+    def get_context_window(self):
+        """
+        Returns the context window of self.model in tokens, or None if the model is unknown.
+        """
+        return find_context_window(self.model)
+    
+    def get_rate_limiter(self):
+        """
+        Returns the rate limiter for this model. rate_limit=True shares one limiter per model across the process, using OPENAI_RATE_LIMITS.
+        """
+        if self.rate_limit is True:
+            return get_rate_limiter('openai', self.model, OPENAI_RATE_LIMITS)
+        return super().get_rate_limiter()
+    
     def no_json_capability(self):
         """
         Returns false if self.model is capable of generating JSON strings and True if it is not.
@@ -61,30 +149,22 @@ class OpenAI(LanguageModel):
                 return False 
         return True # the model chosen is not capable of returning JSON strings
         
-    def format_instructions(self):
+    def get_token_prices(self, model: str | None = None):
         """
-        This method formats the instructions as the first message in prev_messages.
+        Returns the (prompt, completion) price per token of the model (self.model if None) from OPENAI_TOKEN_PRICES.
         """
-        self.format_messages(role='system', content=self.instructions)
-        self.format_messages(role='assistant', content='OK. I will follow the system instructions to the best of my ability.')
+        return find_token_prices(model or self.model)
     
-    def calculate_inference_cost(self, response: str):
-        """
-        This method calculates the cost of the inference call and stores it in the activity log.
+    def parse_content(self, response: str, history: list = None):
         """
-        self.activity_log[-1]['total_inference_cost'] = OPENAI_TOKEN_PRICES[self.model][0] * response.usage.prompt_tokens
-        self.last_inference_cost = OPENAI_TOKEN_PRICES[self.model][1] * response.usage.completion_tokens
-    
-    def parse_content(self, response: str):
-        """
-        This method parses the content from the response and stores it in the activity log.
+        This method parses the content from the response and stores it in the message history.
         """
         if isinstance(response, openai.Stream):
             content = self.handle_stream(response)
         else:
             content = response.choices[0].message.content
         
-        self.format_messages(role='assistant', content=content)
+        self.format_messages(role='assistant', content=content, history=history)
         
         return content
     
@@ -101,32 +181,62 @@ class OpenAI(LanguageModel):
         if self.schema == {} or self.validate_response_schema(response):
             return response
     
-    def generate(self, prompt: str, **kwargs):
+    def generate(self, prompt: str, history: list = None, **kwargs):
         """
-        This method generates a response from the OpenAI model given a prompt.
+        This method generates a response from the OpenAI model given a prompt. The prompt and response are added to history if
+        it is provided, otherwise to prev_messages.
         """
-        if self.response_type == 'JSON':
-            prompt = f'Input: {prompt}\n\nOutput JSON Schema:\n{json.dumps(self.schema)}\n\nList of Sample Outputs:\n{json.dumps(self.sample_outputs)}'
-        self.format_messages(role='user', content=prompt)
-        kwargs = self.combine_kwargs(kwargs)
-        response = self.get_response(kwargs)
-        self.calculate_inference_cost(response)
-        content = self.parse_content(response)
+        kwargs = self.prepare_request(prompt, kwargs, history)
+        start = time.perf_counter()
+        response = self.send_request(kwargs)
+        if isinstance(response, openai.Stream):
+            content = self.read_stream(response, kwargs, start)
+            self.format_messages(role='assistant', content=content, history=history)
+        else:
+            content = self.parse_content(response, history)
                 
         return self.process_response(response, content)
     
-    def combine_kwargs(self, kwargs: dict):
+    async def agenerate(self, prompt: str, history: list = None, **kwargs):
+        """
+        This method generates a response from the OpenAI model given a prompt without blocking the event loop.
+        """
+        kwargs = self.prepare_request(prompt, kwargs, history)
+        start = time.perf_counter()
+        response = await self.asend_request(kwargs)
+        if isinstance(response, openai.AsyncStream):
+            content = await self.aread_stream(response, kwargs, start)
+            self.format_messages(role='assistant', content=content, history=history)
+        else:
+            content = self.parse_content(response, history)
+        
+        return self.process_response(response, content)
+    
+    def prepare_request(self, prompt: str, kwargs: dict, history: list = None):
+        """
+        This method adds the prompt to the message history and returns the kwargs for the chat.completions.create method.
+        """
+        self.format_messages(role='user', content=prompt, history=history) # the schema is already in the system message
+        kwargs = self.combine_kwargs(kwargs, history)
+        kwargs['messages'] = self.add_context(prompt, kwargs['messages'])
+        if kwargs.get('stream'):
+            kwargs.setdefault('stream_options', {'include_usage': True}) # so a streamed prompt is priced too
+        
+        return kwargs
+    
+    def combine_kwargs(self, kwargs: dict, history: list = None):
         """overrides stored kwargs with kwargs passed in prompt method and combines them with messages and model.
 
         Args:
             kwargs (dict): all keyword arguments passed into the prompt method
+            history (list, optional): message history to send instead of prev_messages
 
         Returns:
             dict: all keyword arguments combined with stored kwargs, messages, and model
         """
         kwargs = {**self.kwargs, **kwargs}
         kwargs['model'] = self.model
-        kwargs['messages'] = self.prev_messages
+        kwargs['messages'] = self.select_messages(history)
         
         return kwargs
     
@@ -135,21 +245,42 @@ class OpenAI(LanguageModel):
         Generate a response to the prompt using the OpenAI API. Return the suitable response based on the response_type.
         """
         response = self.client.chat.completions.create(**kwargs)
-        if response.model:
-            self.model = response.model
+        self.record_model(response) # streams don't have a model attribute
         
         return response
     
-    def handle_stream(self, response):
+    async def aget_response(self, kwargs: dict):
         """
-        This method handles the stream response from the OpenAI API.
+        Generate a response to the prompt using the async OpenAI API client.
         """
-        content = ''
-        for chunk in response:
-            if (new_tokens := chunk.choices[0].delta.content) is not None:
-                content = content + new_tokens
-                print(new_tokens, end='')
+        response = await self.get_async_client().chat.completions.create(**kwargs)
+        self.record_model(response)
         
-        return content
+        return response
     
-    
\ No newline at end of file
+    def load_response(self, data: str):
+        """
+        Rebuilds a cached ChatCompletion and records its model on the current call, the same way get_response does.
+        """
+        response = ChatCompletion.model_validate_json(data)
+        self.record_model(response)
+        
+        return response
+    
+    def stream_kwargs(self):
+        """
+        Returns the completion kwargs that turn on streaming and ask OpenAI to send the token usage with the last chunk.
+        """
+        return {'stream': True, 'stream_options': {'include_usage': True}}
+    
+    def handle_stream(self, response):
+        """
+        This method reads the stream response from the OpenAI API, records its usage and cost, and returns the generated text.
+        """
+        return self.read_stream(response)
+    
+    async def ahandle_stream(self, response):
+        """
+        This method reads the async stream response from the OpenAI API, records its usage and cost, and returns the generated text.
+        """
+        return await self.aread_stream(response)
@@ -0,0 +1,43 @@
+import json
+from .history import estimate_message_tokens, estimate_tokens
+
+SYSTEM_PREFIX: str = 'SYSTEM INSTRUCTIONS:\n'
+JSON_INSTRUCTIONS: str = '\n\nReturn your output as a correct JSON string. It should be loadable with the python command json.loads(output).\n\nOutput Schema:\n'
+ACKNOWLEDGEMENT: str = 'OK. I will follow the system instructions to the best of my ability.'
+
+
+def minify(value):
+    """
+    Returns the most compact JSON encoding of a value: no whitespace after separators and non-ASCII characters kept as they
+    are instead of escaped, so the schema costs as few tokens as possible.
+    """
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class PromptTemplate:
+
+    """
+    The part of every request that is the same for every call of a model: the system message with the instructions, the
+    schema and the sample outputs, and the assistant's acknowledgement. It is serialized once, with a minified schema, and the
+    message dicts are shared by reference by every history, so a call only adds the prompt itself.
+    """
+
+    def __init__(self, instructions: str, schema: dict | None = None, sample_outputs: list | None = None):
+        """
+        Initialize the PromptTemplate object.
+
+        Args:
+            instructions (str): System instructions for the model.
+            schema (dict | None, optional): Schema of the JSON output. Defaults to None.
+            sample_outputs (list | None, optional): Examples of good outputs. Defaults to None.
+        """
+        self.schema_block: str = JSON_INSTRUCTIONS + minify(schema) if schema else ''
+        self.samples_block: str = ''.join(f'\n\nSample Output {i + 1}:\n{minify(sample)}' for i, sample in enumerate(sample_outputs or []))
+        self.system: str = SYSTEM_PREFIX + instructions.strip() + self.schema_block + self.samples_block
+        self.messages: tuple = ({'role': 'system', 'content': self.system}, {'role': 'assistant', 'content': ACKNOWLEDGEMENT})
+
+    def overhead_tokens(self, estimator=estimate_tokens):
+        """
+        Returns the estimated prompt tokens the template adds to every request.
+        """
+        return estimate_message_tokens(list(self.messages), estimator)
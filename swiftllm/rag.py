@@ -1,51 +1,266 @@
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.document_loaders import DirectoryLoader
+from langchain_community.document_loaders import DirectoryLoader, UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-#from langchain_huggingface import HuggingFaceEmbeddings
-#from sentence_transformers import SentenceTransformer
-#from langchain_community.embeddings import SentenceTransformerEmbeddings
 from dotenv import load_dotenv
+from pathlib import Path
 from re import Pattern
 from shutil import rmtree
+import json
 import os
 
+from .cache import LRUCache
+from .history import estimate_tokens
+from .ingest import IngestConfig, IngestProgress, parse_files, batch_files, run_in_background
+from .embeddings import Embeddings, HashingEmbeddings, SentenceTransformerEmbeddings, LangChainEmbeddings, CachedEmbeddings
+
+VECTOR_STORES: tuple = ('chroma', 'numpy')
+
+MANIFEST_NAME: str = 'swiftllm_manifest.json'
+EMBEDDING_CACHE_SUFFIX: str = '_embeddings.sqlite' # default embedding cache: a file next to db_path, so it outlives rebuilds
+MANIFEST_VERSION: int = 1
+CHUNK_SIZE: int = 1000
+CHUNK_OVERLAP: int = 250
+CONTEXT_HEADER: str = 'CONTEXT:\nUse the following retrieved documents to answer the prompt if they are relevant.\n\n'
+
 
 class RAG:
 
-    def __init__(self, data_path: str = 'data', file_exts: Pattern | str = None, db_path: str = 'chroma', embeddings: str = 'OpenAIEmbeddings'):
+    def __init__(self, data_path: str = 'data', file_exts: Pattern | str = None, db_path: str = 'chroma', embeddings: str | Embeddings = 'OpenAIEmbeddings', rebuild: bool = False, embedding_cache: str | bool | None = True, embedding_batch_size: int | None = None, embedding_processes: int = 1, vector_store: str = 'chroma', vector_dtype: str = 'float32', ingest: IngestConfig | None = None, query_cache_size: int = 1024):
+        """
+        Initialize the RAG object and sync the vector database with the files in data_path.
+
+        The database is kept between runs. A manifest in db_path records the mtime, size, content hash and chunk IDs of every
+        indexed file, so only new or changed files are embedded and the chunks of removed files are deleted. The database is
+        rebuilt from scratch if rebuild is True or the embeddings or chunking settings changed since it was built.
+
+        Args:
+            data_path (str, optional): Directory (or single file) to index. Defaults to 'data'.
+            file_exts (Pattern | str, optional): Glob of the files to index, relative to data_path. Defaults to None ('*').
+            db_path (str, optional): Directory of the vector database and the manifest. Defaults to 'chroma'.
+            embeddings (str | Embeddings, optional): 'OpenAIEmbeddings', 'HashingEmbeddings' (local, no dependencies),
+                'SentenceTransformerEmbeddings' (local, needs sentence-transformers), an Embeddings object or a LangChain
+                embeddings object. Defaults to 'OpenAIEmbeddings'.
+            rebuild (bool, optional): Wipe the database and index every file again. Defaults to False.
+            embedding_cache (str | bool | None, optional): SQLite file caching vectors by text and model, kept across rebuilds.
+                True puts it next to the database, e.g. 'chroma_embeddings.sqlite' for db_path 'chroma'. Defaults to True
+                (None or False disables the cache).
+            embedding_batch_size (int | None, optional): Texts embedded per batch. Defaults to None (the backend's default).
+            embedding_processes (int, optional): Worker processes of the local backends. Defaults to 1.
+            vector_store (str, optional): 'chroma', or 'numpy' for the built-in memory-mapped NumpyVectorStore, which needs
+                only numpy and opens instantly. Defaults to 'chroma'.
+            vector_dtype (str, optional): 'float32' or 'float16' vectors of the numpy store. Defaults to 'float32'.
+            ingest (IngestConfig | None, optional): Process pool, queue depths, batch size and progress reporting of the
+                ingestion pipeline. Defaults to None (IngestConfig()).
+            query_cache_size (int, optional): Query embeddings and query results kept in memory. Defaults to 1024.
+        """
         load_dotenv()
         self.data_path = self.set_data_path(data_path)
         self.file_exts = self.set_file_exts(file_exts)
-        self.db_path = self.set_db_path(db_path)
+        self.db_path = self.set_db_path(db_path, rebuild)
+        if vector_store not in VECTOR_STORES:
+            raise ValueError(f'Vector store {vector_store} not supported.')
+        self.vector_store = vector_store
+        self.vector_dtype = vector_dtype
+        self.ingest = ingest or IngestConfig()
         print('Setting embeddings...')
-        self.embeddings = self.set_embeddings(embeddings)
-        print('loading documents...')
-        self.documents = self.load_documents()
-        print('splitting documents...')
-        self.chunks = self.split_documents()
-        print('creating database...')
+        if embedding_cache is True:
+            embedding_cache = os.path.normpath(self.db_path) + EMBEDDING_CACHE_SUFFIX
+        self.embeddings = self.set_embeddings(embeddings, embedding_cache, embedding_batch_size, embedding_processes)
+        self.embeddings_name = self.embeddings.model_id
+        self.manifest = self.load_manifest()
+        self.query_embeddings = LRUCache(query_cache_size) # query text -> vector
+        self.query_results = LRUCache(query_cache_size) # query and search settings -> results, cleared by refresh()
         self.db = self.create_db()
+        self.last_refresh = self.refresh()
 
     def create_db(self):
-        db = Chroma.from_documents(
-            documents=self.chunks,
-            embedding=self.embeddings,
+        if self.vector_store == 'numpy':
+            from .vectorstore import NumpyVectorStore
+            return NumpyVectorStore(self.db_path, self.embeddings, dtype=self.vector_dtype, document_class=Document)
+        from langchain_community.vectorstores import Chroma # imported here so the numpy store starts without it
+        db = Chroma(
+            embedding_function=self.embeddings,
             persist_directory=self.db_path,
         )
-        db.persist()
         return db
 
-    def split_documents(self):
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size = 1000,
-            chunk_overlap = 250,
+    def refresh(self):
+        """
+        Syncs the database with the files in data_path: embeds new and changed files, deletes the chunks of changed and
+        removed files, and leaves the rest alone. Files whose mtime and size are unchanged are not read; files that were
+        touched but have the same content hash are not re-embedded. Returns the number of files and chunks of each kind.
+
+        Changed files stream through the ingestion pipeline (see IngestConfig): they are hashed, loaded and split in a process
+        pool, and batches of chunks are embedded and upserted on a writer thread while the next files are parsed.
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'chunks_added': 0, 'chunks_removed': 0}
+        progress = IngestProgress(self.ingest)
+        files = self.manifest['files']
+        current = self.list_files()
+        try:
+            for path in [path for path in files if path not in current]:
+                stats['chunks_removed'] += self.delete_chunks(files.pop(path)['chunk_ids'])
+                stats['removed'] += 1
+                progress.add('removed')
+
+            def jobs():
+                splitter = self.make_splitter()
+                for path, stat in current.items():
+                    progress.add('discovered')
+                    entry = files.get(path)
+                    if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                        progress.add('unchanged')
+                        continue
+                    yield self.data_path, path, stat.st_mtime_ns, stat.st_size, entry and entry['hash'], UnstructuredFileLoader, splitter
+
+            def parsed(results):
+                for result in results:
+                    progress.add('parsed')
+                    progress.add('chunks', len(result[4] or ()))
+                    yield result
+
+            def upsert(batch: list):
+                texts, metadatas, ids, entries = [], [], [], []
+                for path, mtime, size, digest, file_texts, file_metadatas in batch:
+                    entry = files.get(path)
+                    if file_texts is None: # touched but the same content
+                        entry.update(mtime=mtime, size=size)
+                        progress.add('unchanged')
+                        continue
+                    if entry:
+                        stats['chunks_removed'] += self.delete_chunks(entry['chunk_ids'])
+                        del files[path] # if the upsert fails below, the file is retried on the next refresh
+                    chunk_ids = [f'{path}#{index}@{digest[:12]}' for index in range(len(file_texts))]
+                    texts.extend(file_texts)
+                    metadatas.extend(file_metadatas)
+                    ids.extend(chunk_ids)
+                    entries.append((path, {'mtime': mtime, 'size': size, 'hash': digest, 'chunk_ids': chunk_ids}, entry is not None))
+                if texts:
+                    self.db.add_texts(texts, metadatas, ids=ids)
+                    progress.add('embedded', len(texts))
+                for path, entry, updated in entries:
+                    files[path] = entry
+                    stats['updated' if updated else 'added'] += 1
+                    stats['chunks_added'] += len(entry['chunk_ids'])
+                progress.add('upserted', len(entries))
+
+            run_in_background(upsert, batch_files(parsed(parse_files(jobs(), self.ingest)), self.ingest.batch_size), self.ingest.embed_queue)
+        finally:
+            if stats['added'] or stats['updated'] or stats['removed']:
+                self.db.persist()
+            self.save_manifest() # also records the files finished before an error
+            self.query_results.clear()
+            stats['unchanged'] = progress.counts['unchanged']
+            progress.report()
+        return stats
+
+    def query(self, text: str, k: int = 4, mmr: bool = False, fetch_k: int = 20, lambda_mult: float = 0.5):
+        """
+        Returns the k chunks most similar to the text as (Document, score) pairs, best first. The score is the cosine
+        similarity for the numpy store and Chroma's distance (lower is closer) for Chroma; it is None with mmr.
+
+        Args:
+            text (str): The query.
+            k (int, optional): Number of chunks returned. Defaults to 4.
+            mmr (bool, optional): Re-rank the fetch_k closest chunks by maximal marginal relevance, so the k returned chunks
+                are relevant but not near-duplicates of each other. Defaults to False.
+            fetch_k (int, optional): Candidates re-ranked with mmr. Defaults to 20.
+            lambda_mult (float, optional): Relevance vs. diversity of mmr, from 0 (most diverse) to 1. Defaults to 0.5.
+        """
+        return self.query_many([text], k, mmr, fetch_k, lambda_mult)[0]
+
+    def query_many(self, texts: list, k: int = 4, mmr: bool = False, fetch_k: int = 20, lambda_mult: float = 0.5):
+        """
+        Returns a list of (Document, score) pairs per text, like query. Texts whose results are cached are answered from the
+        cache; the rest are embedded in one call and searched together (one matrix-matrix product with the numpy store).
+        """
+        texts = list(texts)
+        settings = (k, fetch_k, lambda_mult) if mmr else (k,)
+        results = {text: self.query_results.get((text, *settings)) for text in dict.fromkeys(texts)}
+        missing = [text for text, result in results.items() if result is None]
+        if missing:
+            vectors = self.embed_queries(missing)
+            for text, result in zip(missing, self.search(vectors, k, mmr, fetch_k, lambda_mult)):
+                self.query_results.set((text, *settings), result)
+                results[text] = result
+        return [list(results[text]) for text in texts]
+
+    def embed_queries(self, texts: list):
+        """
+        Returns the query embeddings of the texts, embedding the ones that aren't cached in one call.
+        """
+        vectors = {text: self.query_embeddings.get(text) for text in texts}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.embeddings.embed_queries(missing)):
+                self.query_embeddings.set(text, vector)
+                vectors[text] = vector
+        return [vectors[text] for text in texts]
+
+    def search(self, vectors: list, k: int, mmr: bool = False, fetch_k: int = 20, lambda_mult: float = 0.5):
+        """
+        Searches the database for each query vector and returns a list of (Document, score) pairs per vector. Without mmr,
+        Chroma is searched with search_chroma.
+        """
+        if self.vector_store == 'numpy':
+            hits = self.db.search_vectors(vectors, max(k, fetch_k) if mmr else k)
+            if mmr:
+                hits = [[(row, None) for row, _ in self.db.max_marginal_relevance(vector, query_hits, k, lambda_mult)] for vector, query_hits in zip(vectors, hits)]
+            return [self.db.documents(query_hits) for query_hits in hits]
+        if mmr:
+            return [[(document, None) for document in self.db.max_marginal_relevance_search_by_vector(vector, k, fetch_k, lambda_mult)] for vector in vectors]
+        return self.search_chroma(vectors, k)
+
+    def search_chroma(self, vectors: list, k: int):
+        """
+        Returns a list of (Document, distance) pairs per query vector. The vectors are searched with one query of the
+        underlying Chroma collection when the LangChain wrapper exposes it (a private attribute), and one at a time otherwise.
+        """
+        if not vectors:
+            return []
+        collection = getattr(self.db, '_collection', None)
+        if collection is None or not hasattr(collection, 'query'):
+            return [self.db.similarity_search_by_vector_with_relevance_scores(vector, k) for vector in vectors]
+        results = collection.query(query_embeddings=vectors, n_results=k, include=['documents', 'metadatas', 'distances'])
+        return [
+            [(Document(page_content=text, metadata=metadata or {}), distance) for text, metadata, distance in zip(texts, metadatas, distances)]
+            for texts, metadatas, distances in zip(results['documents'], results['metadatas'], results['distances'])
+        ]
+
+    def context(self, text: str, k: int = 4, max_tokens: int = 1500, mmr: bool = False, estimator=estimate_tokens):
+        """
+        Returns the chunks retrieved for the text as one context string of at most max_tokens (estimated), or '' if nothing
+        fits. Chunks are added in order of relevance; ones that would exceed the budget are skipped.
+        """
+        parts = []
+        used = estimator(CONTEXT_HEADER)
+        for document, _ in self.query(text, k, mmr):
+            source = document.metadata.get('source')
+            part = f'[{len(parts) + 1}] {source}\n{document.page_content}' if source else f'[{len(parts) + 1}]\n{document.page_content}'
+            tokens = estimator(part)
+            if used + tokens > max_tokens:
+                continue
+            parts.append(part)
+            used += tokens
+        return CONTEXT_HEADER + '\n\n'.join(parts) if parts else ''
+
+    def delete_chunks(self, chunk_ids: list):
+        if chunk_ids:
+            self.db.delete(ids=chunk_ids)
+        return len(chunk_ids)
+
+    def make_splitter(self):
+        return RecursiveCharacterTextSplitter(
+            chunk_size = CHUNK_SIZE,
+            chunk_overlap = CHUNK_OVERLAP,
             length_function = len,
             add_start_index = True,
         )
-        chunks = splitter.split_documents(self.documents)
+
+    def split_documents(self, documents: list):
+        chunks = self.make_splitter().split_documents(documents)
         return chunks
 
     def load_documents(self):
@@ -53,6 +268,49 @@ class RAG:
         documents = loader.load()
         return documents
 
+    def list_files(self):
+        """
+        Returns {path relative to data_path: os.stat_result} of the files matching file_exts.
+        """
+        root = Path(self.data_path)
+        return {file.relative_to(root).as_posix(): file.stat() for file in sorted(root.glob(self.file_exts)) if file.is_file()}
+
+    def manifest_settings(self):
+        """
+        Returns the settings the indexed chunks depend on. The database is rebuilt if they change.
+        """
+        return {
+            'version': MANIFEST_VERSION,
+            'embeddings': self.embeddings_name,
+            'chunk_size': CHUNK_SIZE,
+            'chunk_overlap': CHUNK_OVERLAP,
+            'vector_store': self.vector_store if self.vector_store == 'chroma' else f'{self.vector_store}-{self.vector_dtype}',
+        }
+
+    def load_manifest(self):
+        """
+        Returns the manifest of the database in db_path. A missing, unreadable or outdated manifest wipes the database, since
+        its chunks can't be matched to files.
+        """
+        path = os.path.join(self.db_path, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest['settings'] == self.manifest_settings():
+                return manifest
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        if os.listdir(self.db_path):
+            print('rebuilding database...')
+            self.set_db_path(self.db_path, rebuild=True)
+        return {'settings': self.manifest_settings(), 'files': {}}
+
+    def save_manifest(self):
+        path = os.path.join(self.db_path, MANIFEST_NAME)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.manifest, file)
+        os.replace(path + '.tmp', path) # never leave a half-written manifest
+
     def set_data_path(self, data_path: str):
         if not data_path:
             data_path = 'data'
@@ -74,24 +332,49 @@ class RAG:
             raise ValueError(f'file_exts must be a string or a compiled regular expression.')
         return file_exts
     
-    def set_db_path(self, db_path: str):
-        if os.path.isdir(db_path):
+    def set_db_path(self, db_path: str, rebuild: bool = False):
+        if rebuild and os.path.isdir(db_path):
             rmtree(db_path)
-        os.mkdir(db_path)
+        os.makedirs(db_path, exist_ok=True)
 
         return db_path
 
-    def set_embeddings(self, embedding: str):
-        if embedding == 'SentenceTransformerEmbeddings':
-            pass # TODO: Troubleshoot SentenceTransformerEmbeddings import errors
-            #return SentenceTransformer()
-        if embedding == 'OpenAIEmbeddings':
-            return OpenAIEmbeddings()
-        raise ValueError(f'Embedding {embedding} not supported.')
+    def set_embeddings(self, embedding: str | Embeddings, cache_path: str | None = None, batch_size: int | None = None, processes: int = 1):
+        options = {'processes': processes}
+        if batch_size:
+            options['batch_size'] = batch_size
+        if embedding == 'HashingEmbeddings':
+            embedding = HashingEmbeddings(**options)
+        elif embedding == 'SentenceTransformerEmbeddings':
+            embedding = SentenceTransformerEmbeddings(**options)
+        elif embedding == 'OpenAIEmbeddings':
+            embedding = LangChainEmbeddings(OpenAIEmbeddings(), **({'batch_size': batch_size} if batch_size else {}))
+        elif isinstance(embedding, str):
+            raise ValueError(f'Embedding {embedding} not supported.')
+        elif not isinstance(embedding, Embeddings):
+            if not hasattr(embedding, 'embed_documents'):
+                raise ValueError(f'Embedding {embedding} not supported.')
+            embedding = LangChainEmbeddings(embedding)
+        if cache_path:
+            embedding = CachedEmbeddings(embedding, cache_path)
+        return embedding
+
+    def close(self):
+        """
+        Stops the worker processes of the embeddings and closes the embedding cache.
+        """
+        self.embeddings.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 if __name__ == '__main__':
     rag = RAG()
     print(rag.data_path)
     print(rag.file_exts)
     print(rag.db_path)
-    print(rag.embeddings)
\ No newline at end of file
+    print(rag.embeddings)
+    print(rag.last_refresh)
\ No newline at end of file
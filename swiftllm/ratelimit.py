@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+
+    """
+    A token bucket that holds up to capacity tokens and refills continuously at capacity tokens per period. It is not locked
+    on its own; the RateLimiter that owns it serializes access.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        """
+        Initialize the TokenBucket object.
+
+        Args:
+            capacity (float): Maximum number of tokens in the bucket (e.g. requests or tokens per minute).
+            period (float, optional): Seconds it takes to refill an empty bucket. Defaults to 60.0.
+        """
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        """
+        Adds the tokens that accumulated since the last update.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float):
+        """
+        Returns the number of seconds until the bucket holds amount tokens (0 if it already does). Amounts larger than the
+        capacity are treated as the capacity so they can't block forever.
+        """
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+
+    """
+    Client-side rate limiter with a requests-per-minute and a tokens-per-minute bucket. Before a request, acquire() waits until
+    both buckets can pay for one request and the estimated tokens, and after the response reconcile() corrects the token bucket
+    with the real usage. It is safe to share between threads and asyncio tasks.
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        """
+        Initialize the RateLimiter object.
+
+        Args:
+            rpm (float | None, optional): Requests per minute. Defaults to None (no request limit).
+            tpm (float | None, optional): Tokens per minute. Defaults to None (no token limit).
+        """
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.lock = threading.Lock()
+        self.waited: float = 0.0 # total seconds callers spent waiting on this limiter
+
+    def reserve(self, tokens: float = 0):
+        """
+        Takes one request and the given number of tokens from the buckets if both can pay for them. Returns 0 on success,
+        otherwise the number of seconds to wait before trying again (nothing is taken in that case).
+        """
+        with self.lock:
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens))
+            if wait > 0:
+                return wait
+            if self.requests is not None:
+                self.requests.tokens -= 1
+            if self.tokens is not None:
+                self.tokens.tokens -= min(tokens, self.tokens.capacity)
+            return 0.0
+
+    def acquire(self, tokens: float = 0):
+        """
+        Blocks until one request and the given number of tokens are available and takes them. Returns the seconds waited.
+        """
+        waited = 0.0
+        while (wait := self.reserve(tokens)) > 0:
+            time.sleep(wait)
+            waited += wait
+        self.waited += waited
+
+        return waited
+
+    async def aacquire(self, tokens: float = 0):
+        """
+        Async version of the acquire method. It sleeps on the event loop instead of blocking the thread.
+        """
+        waited = 0.0
+        while (wait := self.reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        self.waited += waited
+
+        return waited
+
+    def reconcile(self, estimated: float, actual: float):
+        """
+        Corrects the token bucket once the real token usage of a request is known. Overestimates are refunded and
+        underestimates are charged, so the bucket tracks what the provider counts.
+        """
+        if self.tokens is None:
+            return
+        with self.lock:
+            self.tokens.refill()
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + min(estimated, self.tokens.capacity) - actual)
+
+
+_rate_limiters: dict = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def find_limits(model: str, limits: dict):
+    """
+    Returns the name and limits of the entry in a rate limit table that matches the model, matching dated model names by their
+    longest known prefix. Returns (None, None) if the model has no entry.
+    """
+    matches = [name for name in limits if model.lower().startswith(name)]
+    if not matches:
+        return None, None
+    name = max(matches, key=len)
+    return name, limits[name]
+
+
+def get_rate_limiter(provider: str, model: str, limits: dict):
+    """Returns the process-wide RateLimiter for a provider and model, creating it from the limits table the first time.
+    Every model object for the same provider and model shares the same limiter. Limiters are keyed by the exact model name:
+    the longest matching prefix in the table only gives the default limits, so e.g. gpt-4o-mini gets gpt-4o's limits but
+    a bucket of its own.
+
+    Args:
+        provider (str): Name of the provider, e.g. 'openai' or 'groq'.
+        model (str): Name of the model.
+        limits (dict): Table of {model: {'rpm': ..., 'tpm': ...}} limits for the provider.
+
+    Returns:
+        RateLimiter | None: The shared limiter, or None if no entry of the limits table matches the model.
+    """
+    name, model_limits = find_limits(model, limits)
+    if name is None:
+        return None
+    key = (provider, model.lower())
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(model_limits.get('rpm'), model_limits.get('tpm'))
+        return _rate_limiters[key]
@@ -0,0 +1,150 @@
+import random
+import re
+import time
+
+TRANSPORT: str = 'transport' # connection problems, timeouts and 5xx responses
+RATE_LIMIT: str = 'rate_limit' # 429 responses
+VALIDATION: str = 'validation' # the model answered but the answer could not be parsed or did not match the schema
+FATAL: str = 'fatal' # errors that will fail the same way on every attempt (bad request, authentication, bugs)
+
+TRANSPORT_ERROR_NAMES: set = {'APIConnectionError', 'APITimeoutError', 'TransportError', 'ConnectionError', 'TimeoutError'}
+
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS: dict = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def classify_error(error: Exception):
+    """
+    Returns the kind of an exception raised while prompting a model: TRANSPORT, RATE_LIMIT, VALIDATION or FATAL.
+    Works with the exceptions of both the openai and groq SDKs without importing them.
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code == 429:
+        return RATE_LIMIT
+    if isinstance(status_code, int):
+        return TRANSPORT if status_code >= 500 or status_code in (408, 409) else FATAL
+    if any(cls.__name__ in TRANSPORT_ERROR_NAMES for cls in type(error).__mro__):
+        return TRANSPORT
+    if isinstance(error, (ValueError, KeyError)):
+        return VALIDATION
+
+    return FATAL
+
+
+def parse_duration(value: str):
+    """
+    Parses a rate limit reset duration such as '1s', '6m0s', '1.5s' or '20ms' into seconds. Returns None if the value can't be parsed.
+    """
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def get_retry_after(error: Exception):
+    """
+    Returns the number of seconds the provider asked us to wait before retrying, read from the Retry-After, retry-after-ms
+    or x-ratelimit-reset-* headers of the error response. Returns None if the response has no such header.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    if (value := headers.get('retry-after-ms')) is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    if (value := headers.get('retry-after')) is not None:
+        try:
+            return float(value)
+        except ValueError:
+            from email.utils import parsedate_to_datetime # rarely needed, so it is not loaded on import
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    resets = [parse_duration(headers.get(name) or '') for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')]
+    resets = [reset for reset in resets if reset is not None]
+
+    return max(resets) if resets else None
+
+
+class RetryPolicy:
+
+    """
+    Decides whether and how long to wait before retrying a failed prompt. Transport errors and rate limits are retried with
+    exponential backoff and jitter (rate limits wait at least as long as the provider's Retry-After), and fatal errors are not
+    retried. Validation failures are only retried if validation_retries allows it, and then immediately: a ValueError or
+    KeyError may just as well be a bug that fails the same way every time, and each retry is billed. A schema violation that
+    aborted a validated stream (stream_validation) is always retried: the model did answer off-schema, and the request was
+    cancelled after a few tokens.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0, multiplier: float = 2.0, jitter: bool = True, deadline: float | None = None, retry_on: tuple = (TRANSPORT, RATE_LIMIT, VALIDATION), validation_retries: int = 0):
+        """
+        Initialize the RetryPolicy object.
+
+        Args:
+            max_attempts (int, optional): Maximum number of attempts, including the first one. Defaults to 3.
+            base_delay (float, optional): Backoff before the first retry in seconds. Defaults to 0.5.
+            max_delay (float, optional): Maximum backoff in seconds. Defaults to 30.0.
+            multiplier (float, optional): Factor the backoff grows by after every attempt. Defaults to 2.0.
+            jitter (bool, optional): Randomize the backoff between 0 and its full value so clients don't retry in lockstep. Defaults to True.
+            deadline (float | None, optional): Maximum seconds a prompt may take including retries. Defaults to None (no deadline).
+            retry_on (tuple, optional): Kinds of errors that are retried. Defaults to (TRANSPORT, RATE_LIMIT, VALIDATION).
+            validation_retries (int, optional): Maximum number of retries after validation failures (an answer that could not be
+                parsed or did not match the schema). A validation failure of attempt n is retried if n <= validation_retries.
+                Defaults to 0 (not retried). Aborted streams are retried regardless.
+        """
+        if max_attempts < 1:
+            raise ValueError(f'max_attempts must be at least 1. Received {max_attempts} instead.')
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.validation_retries = validation_retries
+
+    def with_attempts(self, max_attempts: int):
+        """
+        Returns a copy of the policy with a different number of attempts.
+        """
+        return RetryPolicy(max_attempts, self.base_delay, self.max_delay, self.multiplier, self.jitter, self.deadline, self.retry_on, self.validation_retries)
+
+    def backoff(self, attempt: int):
+        """
+        Returns the exponential backoff in seconds after the given attempt number (starting at 1).
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def next_delay(self, error: Exception, attempt: int, elapsed: float, deadline: float | None = None):
+        """Returns the number of seconds to sleep before the next attempt, or None if the prompt should not be retried.
+
+        Args:
+            error (Exception): The exception raised by the failed attempt.
+            attempt (int): Number of attempts made so far.
+            elapsed (float): Seconds since the first attempt started.
+            deadline (float | None, optional): Deadline of this call in seconds. Defaults to the policy deadline.
+        """
+        kind = classify_error(error)
+        if kind not in self.retry_on or attempt >= self.max_attempts:
+            return None
+        if kind == VALIDATION and attempt > self.validation_retries and not getattr(error, 'aborted', False):
+            return None
+
+        delay = 0.0 if kind == VALIDATION else self.backoff(attempt)
+        if kind == RATE_LIMIT and (retry_after := get_retry_after(error)) is not None:
+            delay = max(delay, retry_after)
+
+        deadline = self.deadline if deadline is None else deadline
+        if deadline is not None and elapsed + delay >= deadline:
+            return None
+
+        return delay
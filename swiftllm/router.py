@@ -0,0 +1,328 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+UNTRIED_SCORE: float = 0.0 # backends with too few latency samples are tried first, so every backend gets measured
+MIN_SUCCESS_RATE: float = 0.05 # floor of the success rate in the score, so a failing backend still ranks (last)
+
+
+class BackendStats:
+
+    """
+    Rolling latency and error-rate estimate of one backend of a Router, over its last window calls. Thread-safe.
+    """
+
+    def __init__(self, window: int = 50, recovery: float = 30.0):
+        """
+        Initialize the BackendStats object.
+
+        Args:
+            window (int, optional): Number of recent calls the estimates are based on. Defaults to 50.
+            recovery (float, optional): Seconds after the last call of a backend whose last call failed before its errors are
+                forgotten, so a backend that went down is tried again once it may have recovered. Defaults to 30.0.
+        """
+        self.recovery = recovery
+        self.last_call: float = 0.0
+        self.latencies: deque = deque(maxlen=window) # seconds of recent successful calls
+        self.outcomes: deque = deque(maxlen=window) # True for recent successes, False for failures
+        self.calls: int = 0
+        self.errors: int = 0
+        self.hedges: int = 0 # calls sent as the hedge of a slower backend
+        self.wins: int = 0 # hedged races this backend answered first
+        self.lock = threading.Lock()
+
+    def add(self, latency: float, ok: bool, censored: bool = False):
+        """
+        Records a finished call, or a censored one (the loser of a hedged race) with the seconds it had run when it lost. A
+        censored latency is only a lower bound, so it is recorded as a success taking at least the current median: a call
+        that lost quickly says nothing about the backend's speed and must not make it look faster.
+        """
+        if censored:
+            latency = max(latency, self.percentile(50) or 0.0)
+        with self.lock:
+            self.calls += 1
+            self.last_call = time.monotonic()
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def count(self, counter: str):
+        """
+        Adds one to the counter ('hedges' or 'wins').
+        """
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def percentile(self, q: float):
+        """
+        Returns the q-th percentile (0-100) of the recent latencies, or None if there are none.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q / 100))]
+
+    def error_rate(self):
+        with self.lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self, min_samples: int = 1):
+        """
+        Returns the expected seconds until a successful answer: the median latency divided by the success rate. Lower is better.
+        A backend with fewer than min_samples latencies and no errors scores UNTRIED_SCORE, so it is measured before it is
+        judged by one slow first call.
+        """
+        with self.lock:
+            if self.outcomes and not self.outcomes[-1] and time.monotonic() - self.last_call > self.recovery:
+                self.outcomes.clear()
+        error_rate = self.error_rate()
+        if len(self.latencies) < min_samples and error_rate == 0:
+            return UNTRIED_SCORE
+        median = self.percentile(50)
+        if median is None:
+            return float('inf')
+        return median / max(1.0 - error_rate, MIN_SUCCESS_RATE)
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate(), 4),
+            'p50_latency': self.percentile(50),
+            'p95_latency': self.percentile(95),
+            'hedges': self.hedges,
+            'wins': self.wins,
+        }
+
+
+class Router:
+
+    """
+    Sends each prompt to the best of several models (e.g. an OpenAI and a Groq model) that share the same instructions and
+    schema. Every backend has a rolling latency and error-rate estimate (see BackendStats), and prompts go to the backend with
+    the lowest expected time to a successful answer. A failed call fails over to the next backend at once, without backoff.
+
+    With hedge=True, a prompt the chosen backend has not answered within its hedge_percentile latency is also sent to the next
+    backend. The first answer wins and the other call is cancelled (aprompt) or left to finish in the background and
+    discarded (prompt, since a blocking call cannot be interrupted). The loser is recorded with the seconds it had run when it
+    lost (a censored sample), so a backend that keeps losing races is ranked below the one that beats it. Hedging trades a few
+    percent of extra requests for a much lower tail latency.
+    """
+
+    def __init__(self, models: list, hedge: bool = False, hedge_percentile: float = 95, hedge_delay: float | None = None, max_hedges: int = 1, window: int = 50, recovery: float = 30.0, min_samples: int = 10, max_workers: int = 32):
+        """
+        Initialize the Router object.
+
+        Args:
+            models (list): The backends, LanguageModel objects created with the same instructions, schema, sample outputs and
+                response type.
+            hedge (bool, optional): Send a hedged request when the chosen backend is slow. Defaults to False.
+            hedge_percentile (float, optional): Latency percentile (0-100) of a backend after which its call is hedged. Defaults to 95.
+            hedge_delay (float | None, optional): Seconds before hedging while a backend has fewer than min_samples latencies.
+                Defaults to None (no hedging until then).
+            max_hedges (int, optional): Maximum number of extra requests per prompt. Defaults to 1.
+            window (int, optional): Number of recent calls the latency and error estimates are based on. Defaults to 50.
+            recovery (float, optional): Seconds before a backend whose last call failed is tried first again. Defaults to 30.0.
+            min_samples (int, optional): Latencies a backend needs before it is ranked and its percentile is trusted. Until
+                then it is preferred, so every backend is measured. Defaults to 10.
+            max_workers (int, optional): Threads running the calls of prompt. Defaults to 32.
+        """
+        if not models:
+            raise ValueError('Router requires at least one model.')
+        first = models[0]
+        for model in models[1:]:
+            if (model.instructions, model.schema, model.sample_outputs, model.response_type) != (first.instructions, first.schema, first.sample_outputs, first.response_type):
+                raise ValueError(f'Every model of a Router must have the same instructions, schema, sample outputs and response type. {model.get_model_name()} differs from {first.get_model_name()}.')
+        self.models = list(models)
+        self.stats = [BackendStats(window, recovery) for _ in self.models]
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.failovers: int = 0
+        self.executor = None # created on the first prompt
+        self.lock = threading.Lock()
+
+    def rank(self):
+        """
+        Returns the indexes of the backends, best first.
+        """
+        return sorted(range(len(self.models)), key=lambda index: self.stats[index].score(self.min_samples))
+
+    def get_hedge_delay(self, index: int):
+        """
+        Returns the seconds after which a call to backend index is hedged, or None if it should not be hedged.
+        """
+        stats = self.stats[index]
+        if len(stats.latencies) >= self.min_samples:
+            return stats.percentile(self.hedge_percentile)
+        return self.hedge_delay
+
+    def new_history(self):
+        """
+        Returns a fresh message history with the initial messages, for conversations that should continue on any backend.
+        """
+        return self.models[0].new_history()
+
+    def get_executor(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='swiftllm-router')
+        return self.executor
+
+    def call(self, index: int, prompt: str, history: list, kwargs: dict):
+        """
+        Prompts backend index once (failover replaces retries). Returns (response or None, seconds). The outcome is recorded
+        by prompt: a hedged call that lost the race keeps running in the background, and is recorded when it loses, with the
+        seconds it had run then. Its full running time would only be known later, after the next calls were ranked.
+        """
+        start = time.monotonic()
+        try:
+            response = self.models[index].prompt(prompt, retries=1, history=history, **kwargs)
+        except Exception:
+            response = None
+        return response, time.monotonic() - start
+
+    async def acall(self, index: int, prompt: str, history: list, kwargs: dict):
+        """
+        Async version of the call method. A cancelled call (the loser of a hedged race) is recorded as a success with the
+        seconds it had run when it was cancelled, a lower bound of its latency.
+        """
+        start = time.monotonic()
+        try:
+            response = await self.models[index].aprompt(prompt, retries=1, history=history, **kwargs)
+        except asyncio.CancelledError:
+            self.stats[index].add(time.monotonic() - start, True, censored=True)
+            raise
+        except Exception:
+            response = None
+        self.stats[index].add(time.monotonic() - start, response is not None)
+        return response
+
+    def prompt(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Prompts the best backend, failing over and hedging as configured. Every call gets its own copy of the history and only
+        the winning call's messages are kept. Returns None if every backend failed.
+
+        Args:
+            prompt (str): The prompt to pass to the model.
+            history (list | None, optional): Message history of the conversation (see new_history). Defaults to None (a
+                single-turn request with the initial messages of the chosen backend).
+        """
+        order = self.rank()
+        executor = self.get_executor()
+        pending = {}
+        hedges = 0
+
+        def launch():
+            index = order.pop(0)
+            copy = self.models[index].new_history() if history is None else list(history)
+            pending[executor.submit(self.call, index, prompt, copy, kwargs)] = (index, copy, time.monotonic())
+            return index
+
+        primary = launch()
+        while pending:
+            delay = self.get_hedge_delay(primary) if self.hedge and order and hedges < self.max_hedges else None
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done: # the primary is slower than usual: hedge it
+                hedges += 1
+                self.stats[launch()].count('hedges')
+                continue
+            for future in done:
+                index, copy, _ = pending.pop(future)
+                response, latency = future.result()
+                self.stats[index].add(latency, response is not None)
+                if response is not None:
+                    if pending:
+                        self.stats[index].count('wins')
+                    for loser, _, start in pending.values(): # they run to completion in the background, their results are discarded
+                        self.stats[loser].add(time.monotonic() - start, True, censored=True)
+                    if history is not None:
+                        history[:] = copy
+                    return response
+            if not pending and order: # every call so far failed: fail over at once
+                with self.lock:
+                    self.failovers += 1
+                primary = launch()
+        return None
+
+    async def aprompt(self, prompt: str, history: list | None = None, **kwargs):
+        """
+        Async version of the prompt method. A hedged call that loses the race is cancelled.
+        """
+        order = self.rank()
+        pending = {}
+        hedges = 0
+
+        def launch():
+            index = order.pop(0)
+            copy = self.models[index].new_history() if history is None else list(history)
+            pending[asyncio.ensure_future(self.acall(index, prompt, copy, kwargs))] = (index, copy)
+            return index
+
+        primary = launch()
+        try:
+            while pending:
+                delay = self.get_hedge_delay(primary) if self.hedge and order and hedges < self.max_hedges else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges += 1
+                    self.stats[launch()].count('hedges')
+                    continue
+                for task in done:
+                    index, copy = pending.pop(task)
+                    response = task.result()
+                    if response is not None:
+                        if pending:
+                            self.stats[index].count('wins')
+                        if history is not None:
+                            history[:] = copy
+                        return response
+                if not pending and order:
+                    with self.lock:
+                        self.failovers += 1
+                    primary = launch()
+            return None
+        finally:
+            for task in pending: # the losers of a hedged race, or every call if this prompt was cancelled
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def summary(self):
+        """
+        Returns the stats of every backend, keyed by model name, and the number of failovers.
+        """
+        return {
+            'backends': {f'{index}:{model.get_model_name()}': stats.summary() for index, (model, stats) in enumerate(zip(self.models, self.stats))},
+            'failovers': self.failovers,
+        }
+
+    def close(self):
+        """
+        Stops the router's threads and closes the clients of every backend. The discarded losers of hedged races are not
+        waited for.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        for model in self.models:
+            model.close()
+
+    async def aclose(self):
+        for model in self.models:
+            await model.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,238 @@
+import json
+import re
+
+LEAF_TYPES: dict = {
+    'str': (str,),
+    'string': (str,),
+    'int': (int,),
+    'integer': (int,),
+    'float': (int, float),
+    'number': (int, float),
+    'bool': (bool,),
+    'boolean': (bool,),
+    'list': (list,),
+    'array': (list,),
+    'dict': (dict,),
+    'object': (dict,),
+    'null': (type(None),),
+    'none': (type(None),),
+}
+
+JSON_CLOSERS: dict = {'{': '}', '[': ']'}
+
+JSON_TOKEN_PATTERN = re.compile(r'\\.|["{}\[\]]', re.DOTALL) # an escape pair, a quote or a bracket
+
+JSON_DECODER = json.JSONDecoder()
+
+JSON_TYPE_NAMES: dict = {str: 'string', int: 'integer', float: 'number', bool: 'boolean', list: 'array', dict: 'object', type(None): 'null'}
+
+
+class SchemaViolation(ValueError):
+
+    """
+    Raised when a generated response does not match the schema, e.g. a value has the wrong type or the model produced a key
+    the schema doesn't have. It is a ValueError, so the retry policy treats it as a validation failure (see RetryPolicy.validation_retries).
+    aborted is True for a violation found while the response streamed (stream_validation), whose request was cancelled early.
+    """
+
+    aborted: bool = False
+
+
+def leaf_types(spec):
+    """
+    Returns the python types a leaf of the schema names (e.g. 'int', 'str', 'float | None'), or None if the leaf is not a
+    type name (e.g. a description such as 'the name of the person'), in which case any value is accepted.
+    """
+    if not isinstance(spec, str):
+        return None
+    types = ()
+    for name in spec.split('|'):
+        name = name.strip().lower()
+        if name == 'any':
+            return None
+        if name not in LEAF_TYPES:
+            return None
+        types += LEAF_TYPES[name]
+
+    return types
+
+
+def type_name(value):
+    """
+    Returns the JSON name of the type of a value, for error messages.
+    """
+    return JSON_TYPE_NAMES.get(type(value), type(value).__name__)
+
+
+class SchemaValidator:
+
+    """
+    Validates responses against a schema. The schema is compiled once into a tree of small check functions, so validating a
+    response only walks the response: key sets are precomputed and leaf type names such as 'int' or 'str' are resolved to
+    python types up front. Nested objects must have exactly the keys of their schema, lists are checked item by item against
+    the first element of their schema, and leaves that are not type names accept any value.
+    """
+
+    def __init__(self, schema: dict | None = None):
+        """
+        Initialize the SchemaValidator object.
+
+        Args:
+            schema (dict | None, optional): Schema the responses should match. Defaults to None (any object is accepted).
+        """
+        self.schema = schema or {}
+        self.keys = frozenset(self.schema)
+        self.fields: dict = {key: self.compile(spec, key) for key, spec in self.schema.items()} # key -> check(value)
+        self.check = self.compile(self.schema, '')
+
+    def compile(self, spec, path: str):
+        """
+        Returns a function that raises if a value does not match the schema node spec. path names the node in error messages.
+        """
+        if isinstance(spec, dict):
+            return self.compile_object(spec, path)
+        if isinstance(spec, list):
+            return self.compile_array(spec, path)
+        types = leaf_types(spec)
+        if types is None:
+            return None
+        if int in types and bool not in types: # bool is a subclass of int, but true/false is not a number in JSON
+            def check(value):
+                if not isinstance(value, types) or isinstance(value, bool):
+                    raise SchemaViolation(f'Expected {spec} for key "{path}" in response. Received {type_name(value)} instead.')
+        else:
+            def check(value):
+                if not isinstance(value, types):
+                    raise SchemaViolation(f'Expected {spec} for key "{path}" in response. Received {type_name(value)} instead.')
+
+        return check
+
+    def compile_object(self, spec: dict, path: str):
+        """
+        Returns a function that checks an object has exactly the keys of spec and that every value matches its schema.
+        An empty spec accepts any object.
+        """
+        keys = spec.keys() if spec else None
+        fields = [(key, check) for key, sub in spec.items() if (check := self.compile(sub, f'{path}.{key}' if path else key))]
+
+        def check(value):
+            if not isinstance(value, dict):
+                raise SchemaViolation(f'Expected an object for key "{path}" in response. Received {type_name(value)} instead.')
+            if keys is None:
+                return
+            if keys != value.keys():
+                raise KeyError(f'Generated response does not match the schema. Expected keys: {list(keys)}. Response keys: {list(value)}. If problem persists, try setting a simpler schema or revising system instructions.')
+            for key, check_field in fields:
+                check_field(value[key])
+
+        return check
+
+    def compile_array(self, spec: list, path: str):
+        """
+        Returns a function that checks a value is a list whose items match the first element of spec (if there is one).
+        """
+        check_item = self.compile(spec[0], f'{path}[]') if spec else None
+
+        def check(value):
+            if not isinstance(value, list):
+                raise SchemaViolation(f'Expected a list for key "{path}" in response. Received {type_name(value)} instead.')
+            if check_item is not None:
+                for item in value:
+                    check_item(item)
+
+        return check
+
+    def validate(self, response):
+        """
+        Returns True if the response matches the schema.
+
+        Raises:
+            KeyError: If an object does not have exactly the keys of its schema.
+            SchemaViolation: If a value has the wrong type.
+        """
+        if self.schema:
+            self.check(response)
+        return True
+
+    def validate_field(self, key: str, value):
+        """
+        Checks a single top-level field, e.g. one that was just completed in a stream.
+
+        Raises:
+            SchemaViolation: If the key is not in the schema or the value has the wrong type.
+        """
+        if not self.schema:
+            return
+        if key not in self.keys:
+            raise SchemaViolation(f'Generated response does not match the schema. Unexpected key "{key}". Expected keys: {sorted(self.keys)}.')
+        if (check := self.fields[key]) is not None:
+            try:
+                check(value)
+            except KeyError as e:
+                raise SchemaViolation(e.args[0]) from e
+
+
+def scan_json(text: str, openers: str = '{['):
+    """
+    Yields the (start, end) spans of the balanced top-level JSON objects/arrays in text, in one pass over it. Brackets inside
+    JSON strings are ignored, and a span whose brackets don't match (e.g. '{ ]') is dropped.
+
+    Args:
+        text (str): The text to scan.
+        openers (str, optional): Characters that start a span. Defaults to '{[' (objects and arrays).
+    """
+    stack = []
+    start = None
+    in_string = False
+    for match in JSON_TOKEN_PATTERN.finditer(text): # jumps straight to the next quote, bracket or escape
+        token = match.group()
+        if in_string:
+            if token == '"':
+                in_string = False
+        elif start is None:
+            if token in openers:
+                start = match.start()
+                stack.append(JSON_CLOSERS[token])
+        elif token == '"':
+            in_string = True
+        elif token in JSON_CLOSERS:
+            stack.append(JSON_CLOSERS[token])
+        elif token == '}' or token == ']':
+            if stack.pop() == token:
+                if not stack:
+                    yield start, match.end()
+                    start = None
+            else:
+                stack.clear()
+                start = None
+
+
+def find_json(text: str, openers: str = '{['):
+    """
+    Returns the first complete JSON object or array in text (e.g. a reply with prose or a markdown fence around the JSON) as
+    python objects. The common case, valid JSON starting at the first bracket, is decoded directly; otherwise the text is
+    scanned once with scan_json and spans that are balanced but not valid JSON, like '{placeholder}', are skipped. Either way
+    it runs in linear time.
+
+    Args:
+        text (str): The text to look for JSON in.
+        openers (str, optional): '{[' to accept objects and arrays, '{' for objects only. Defaults to '{['.
+
+    Raises:
+        ValueError: If the text has no valid JSON object or array.
+    """
+    start = min((index for index in (text.find(opener) for opener in openers) if index >= 0), default=-1)
+    if start < 0:
+        raise ValueError('Model failed to generate a valid JSON string.')
+    try:
+        return JSON_DECODER.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    text = text[start:]
+    for start, end in scan_json(text, openers):
+        try:
+            return json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+
+    raise ValueError('Model failed to generate a valid JSON string.')
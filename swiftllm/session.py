@@ -0,0 +1,138 @@
+import contextvars
+
+# The Session whose prompt is running in the current thread or task. LanguageModel.end_call adds the finished call's usage
+# and cost to it, so a session's cost is exact even while other threads use the same model.
+current_session: contextvars.ContextVar = contextvars.ContextVar('swiftllm_current_session', default=None)
+
+END: object = object() # marks the end of a stream
+
+
+class Session:
+
+    """
+    One conversation with a shared model. The model holds everything that is the same for every conversation: the
+    configuration, the precomputed system messages (initial_messages) and the pooled clients, and a call never changes it, so
+    one model object can serve many threads. A session only holds the messages its own conversation added after the initial
+    messages, plus its usage and cost, in __slots__, so a server can keep tens of thousands of them around.
+
+    A session is one conversation: run one prompt at a time on it. Prompts on different sessions can run concurrently on any
+    threads or event loop tasks without locking.
+    """
+
+    __slots__ = ('model', 'messages', 'calls', 'prompt_tokens', 'completion_tokens', 'cost')
+
+    def __init__(self, model, messages: list | None = None):
+        """
+        Initialize the Session object. Use model.session() to create one.
+
+        Args:
+            model (LanguageModel): The shared model.
+            messages (list | None, optional): Messages the conversation starts with, after the initial messages. Defaults to None.
+        """
+        self.model = model
+        self.messages: list = list(messages) if messages else []
+        self.calls: int = 0
+        self.prompt_tokens: int = 0
+        self.completion_tokens: int = 0
+        self.cost: float = 0.0
+
+    def history(self):
+        """
+        Returns the full message history of the conversation: the model's initial messages followed by this session's.
+        """
+        return self.model.initial_messages + self.messages
+
+    def keep(self, history: list):
+        """
+        Stores what a call left in the history (the history policy may have dropped old turns) as this session's messages.
+        """
+        self.messages = history[len(self.model.initial_messages):]
+
+    def add_call(self, record):
+        """
+        Adds the usage and cost of a finished call (a CallRecord) to the session.
+        """
+        self.calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += record.cost
+
+    def within(self, function, *args, **kwargs):
+        """
+        Calls function(*args, **kwargs) with this session as the current session.
+        """
+        token = current_session.set(self)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            current_session.reset(token)
+
+    async def awithin(self, awaitable):
+        """
+        Awaits awaitable with this session as the current session.
+        """
+        token = current_session.set(self)
+        try:
+            return await awaitable
+        finally:
+            current_session.reset(token)
+
+    def prompt(self, prompt: str, retries=None, deadline: float | None = None, **kwargs):
+        """
+        Prompts the model with this conversation's history and keeps the new messages. Takes the arguments of
+        LanguageModel.prompt except history.
+        """
+        history = self.history()
+        response = self.within(self.model.prompt, prompt, retries, history, deadline, **kwargs)
+        self.keep(history)
+
+        return response
+
+    async def aprompt(self, prompt: str, retries=None, deadline: float | None = None, **kwargs):
+        """
+        Async version of the prompt method.
+        """
+        history = self.history()
+        response = await self.awithin(self.model.aprompt(prompt, retries, history, deadline, **kwargs))
+        self.keep(history)
+
+        return response
+
+    def stream(self, prompt: str, **kwargs):
+        """
+        Streams the response like LanguageModel.stream and keeps the new messages once the stream is finished. The session is
+        only current while the model's stream runs, not while the caller handles a delta.
+        """
+        history = self.history()
+        deltas = self.model.stream(prompt, history=history, **kwargs)
+        try:
+            while (delta := self.within(next, deltas, END)) is not END:
+                yield delta
+        finally:
+            self.within(deltas.close) # an abandoned stream still records its call
+        self.keep(history)
+
+    async def astream(self, prompt: str, **kwargs):
+        """
+        Async version of the stream method.
+        """
+        history = self.history()
+        deltas = self.model.astream(prompt, history=history, **kwargs)
+        try:
+            while (delta := await self.awithin(anext(deltas, END))) is not END:
+                yield delta
+        finally:
+            await self.awithin(deltas.aclose())
+        self.keep(history)
+
+    def clear(self):
+        """
+        Starts the conversation over. The usage and cost totals are kept.
+        """
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __repr__(self):
+        return f'Session(model={self.model.get_model_name()!r}, messages={len(self.messages)}, cost={self.cost})'
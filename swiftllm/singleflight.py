@@ -0,0 +1,97 @@
+import asyncio
+import copy
+import threading
+from .cache import make_request_key
+
+
+class Flight:
+
+    """
+    One provider call in flight that identical requests wait on.
+    """
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+
+    """
+    Coalesces identical requests that are in flight at the same time. The first caller of a request key (model, messages,
+    completion kwargs and response type) calls the provider, and callers that arrive with the same key before it finished wait
+    for that call instead of starting their own. Every caller gets its own copy of the response, or the exception if the call
+    failed. Unlike a ResponseCache nothing is kept: once a call finished, the next identical request calls the provider again.
+
+    Share one SingleFlight between models to coalesce their requests too (the key contains the model name). Sync and async
+    calls are coalesced separately, and async calls only with calls on the same event loop.
+    """
+
+    def __init__(self):
+        self.flights: dict = {} # key -> Flight of the sync calls in flight
+        self.tasks: dict = {} # (event loop, key) -> Task of the async calls in flight
+        self.lock = threading.Lock()
+        self.calls: int = 0 # requests that called the provider
+        self.coalesced: int = 0 # requests answered by another request's call
+
+    def make_key(self, kwargs: dict, response_type: str | None = None):
+        return make_request_key(kwargs, response_type)
+
+    def do(self, key: str, function):
+        """
+        Returns (result, shared): the result of function(), called once for all concurrent callers with the same key, and
+        whether this caller shared another caller's call. The exception of a failed call is raised in every caller.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = function()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    async def ado(self, key: str, function):
+        """
+        Async version of the do method. function is a coroutine function. The call runs in a task of its own, so a caller that
+        is cancelled doesn't cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            task = self.tasks.get((loop, key))
+            leader = task is None
+            if leader:
+                task = self.tasks[(loop, key)] = asyncio.ensure_future(function())
+                task.add_done_callback(lambda _: self.tasks.pop((loop, key), None))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        result = await asyncio.shield(task)
+
+        return (result, False) if leader else (copy.deepcopy(result), True)
+
+    def stats(self):
+        """
+        Returns a dict with the number of provider calls, coalesced requests, and the share of requests that were coalesced.
+        """
+        total = self.calls + self.coalesced
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'coalesced_rate': self.coalesced / total if total else 0.0}
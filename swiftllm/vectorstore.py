@@ -0,0 +1,523 @@
+import json
+import os
+import threading
+import uuid
+
+VECTOR_STORE_VERSION: int = 1
+BLOCK_ROWS: int = 65536 # rows scored per matrix product, bounds the memory of a search over a large index
+MIN_CAPACITY: int = 1024
+
+VECTORS_FILE: str = 'vectors.npy'
+OFFSETS_FILE: str = 'offsets.npy'
+CHUNKS_FILE: str = 'chunks.jsonl'
+STATE_FILE: str = 'vectorstore.json'
+CENTROIDS_FILE: str = 'centroids.npy'
+ASSIGNMENTS_FILE: str = 'assignments.npy'
+GENERATION_FILES: tuple = (VECTORS_FILE, OFFSETS_FILE, CHUNKS_FILE, ASSIGNMENTS_FILE) # rewritten by compact, named by generation
+
+
+def import_numpy():
+    """
+    Imports NumPy, which NumpyVectorStore needs but the rest of swiftllm doesn't.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumpyVectorStore requires numpy. Install it with "pip install numpy".')
+    return numpy
+
+
+class Chunk:
+
+    """
+    A stored chunk returned by searches when no document_class is given. Has the page_content and metadata attributes of a
+    LangChain Document.
+    """
+
+    __slots__ = ('id', 'page_content', 'metadata')
+
+    def __init__(self, page_content: str, metadata: dict | None = None, id: str | None = None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+        self.id = id
+
+    def __repr__(self):
+        return f'Chunk(id={self.id!r}, page_content={self.page_content[:50]!r}, metadata={self.metadata!r})'
+
+
+class NumpyVectorStore:
+
+    """
+    Vector store kept in plain files, as a lightweight alternative to Chroma. Embeddings are L2-normalized and stored in a
+    memory-mapped .npy matrix (float32 or float16), chunk texts and metadata in an append-only JSONL file indexed by an
+    offsets .npy, and the ids in a small JSON state file. Nothing is read until the store is first used, and searches only
+    page in the rows they score and read the texts of the hits.
+
+    Search is exact cosine similarity by default: a matrix product per block of rows and argpartition for the top k, with
+    one matrix-matrix product for a batch of queries. build_ivf() adds a coarse inverted file (spherical k-means centroids)
+    so large indexes only score the rows of the nprobe closest clusters. Deleted rows are masked until compact() drops them.
+
+    Implements the add_documents/delete/persist/similarity_search methods RAG uses, so it can replace Chroma.
+    """
+
+    def __init__(self, path: str = 'vectors', embedding_function=None, dtype: str = 'float32', block_rows: int = BLOCK_ROWS, document_class=None):
+        """
+        Initialize the NumpyVectorStore object. Existing files in path are opened lazily.
+
+        Args:
+            path (str, optional): Directory of the store's files. Defaults to 'vectors'.
+            embedding_function (optional): Object with embed_documents and embed_query methods. Only needed to add or search
+                by text. Defaults to None.
+            dtype (str, optional): 'float32' or 'float16' (half the disk and memory, ~3 significant digits). Only used when the
+                store is created. Defaults to 'float32'.
+            block_rows (int, optional): Rows scored per matrix product. Defaults to BLOCK_ROWS.
+            document_class (optional): Class results are returned as, called with page_content and metadata (e.g. LangChain's
+                Document). Defaults to None (Chunk).
+        """
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f'dtype must be float32 or float16, not {dtype}.')
+        self.np = import_numpy()
+        self.path = path
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.block_rows = block_rows
+        self.document_class = document_class or Chunk
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.generation: int = 0 # number of compactions, part of the names of the GENERATION_FILES
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, name: str, generation: int | None = None):
+        """
+        Returns the path of one of the store's files. The files compact rewrites carry the generation of the store in their
+        name after the first compaction (e.g. vectors.1.npy).
+        """
+        generation = self.generation if generation is None else generation
+        if generation and name in GENERATION_FILES:
+            stem, extension = os.path.splitext(name)
+            name = f'{stem}.{generation}{extension}'
+        return os.path.join(self.path, name)
+
+    def load(self):
+        """
+        Opens the store's files on first use: the state JSON is read, the vectors and offsets are memory-mapped.
+        """
+        np = self.np
+        with self.lock:
+            if self.loaded:
+                return
+            self.dim = None
+            self.count = 0
+            self.ids: list = [] # row -> id, None for deleted rows
+            self.vectors = None
+            self.offsets = None
+            self.centroids = None
+            self.assignments = None
+            self.nprobe = None
+            if os.path.exists(self.file(STATE_FILE)):
+                with open(self.file(STATE_FILE), encoding='utf-8') as file:
+                    state = json.load(file)
+                self.dim, self.count, self.ids, self.dtype = state['dim'], state['count'], state['ids'], state['dtype']
+                self.generation = state.get('generation', 0)
+                self.vectors = np.load(self.file(VECTORS_FILE), mmap_mode='r+')
+                self.offsets = np.load(self.file(OFFSETS_FILE), mmap_mode='r+')
+                if state.get('ivf'):
+                    self.centroids = np.load(self.file(CENTROIDS_FILE))
+                    self.assignments = np.load(self.file(ASSIGNMENTS_FILE))
+                    self.nprobe = state['ivf']['nprobe']
+            self.rows: dict = {id: row for row, id in enumerate(self.ids) if id is not None}
+            self.alive = np.zeros(len(self.vectors) if self.vectors is not None else 0, dtype=bool)
+            self.alive[:self.count] = [id is not None for id in self.ids]
+            self.ivf_lists = None # (rows sorted by cluster, start of each cluster), rebuilt lazily
+            self.loaded = True
+
+    def normalize(self, vectors):
+        np = self.np
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def grow(self, name: str, array, shape: tuple, dtype: str):
+        """
+        Returns a memory-mapped .npy of the given shape holding the first count rows of array. The file is written next to
+        the old one and swapped in, so a crash never leaves a truncated matrix behind.
+        """
+        np = self.np
+        path = self.file(name)
+        grown = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=dtype, shape=shape)
+        if array is not None and self.count:
+            grown[:self.count] = array[:self.count]
+        grown.flush()
+        del grown
+        os.replace(path + '.tmp', path)
+        return np.load(path, mmap_mode='r+')
+
+    def reserve(self, rows: int):
+        """
+        Makes room for rows more rows, doubling the capacity of the matrices so appends are amortized O(1).
+        """
+        np = self.np
+        needed = self.count + rows
+        capacity = len(self.vectors) if self.vectors is not None else 0
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, MIN_CAPACITY)
+        self.vectors = self.grow(VECTORS_FILE, self.vectors, (capacity, self.dim), self.dtype)
+        self.offsets = self.grow(OFFSETS_FILE, self.offsets, (capacity,), 'int64')
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.count] = self.alive[:self.count]
+        self.alive = alive
+
+    def add_vectors(self, vectors, texts: list, metadatas: list | None = None, ids: list | None = None):
+        """
+        Appends embeddings with their texts and metadata and returns their ids. Existing ids are replaced.
+        """
+        np = self.np
+        vectors = self.normalize(vectors)
+        if len(vectors) != len(texts):
+            raise ValueError('Expected one vector per text.')
+        metadatas = metadatas or [{}] * len(texts)
+        ids = [str(id) for id in ids] if ids else [uuid.uuid4().hex for _ in texts]
+        with self.lock:
+            self.load()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f'Expected vectors of dimension {self.dim}, got {vectors.shape[1]}.')
+            self.delete([id for id in ids if id in self.rows])
+            self.reserve(len(ids))
+            start = self.count
+            offsets = []
+            with open(self.file(CHUNKS_FILE), 'ab') as file:
+                for id, text, metadata in zip(ids, texts, metadatas):
+                    offsets.append(file.tell())
+                    file.write(json.dumps({'id': id, 'text': text, 'metadata': metadata}, default=str).encode('utf-8') + b'\n')
+            self.vectors[start:start + len(ids)] = vectors
+            self.offsets[start:start + len(ids)] = offsets
+            self.alive[start:start + len(ids)] = True
+            for row, id in enumerate(ids, start):
+                self.rows[id] = row
+            self.ids.extend(ids)
+            self.count += len(ids)
+            if self.centroids is not None:
+                self.assignments = np.concatenate([self.assignments, (vectors @ self.centroids.T).argmax(axis=1).astype(np.int32)])
+                self.ivf_lists = None
+        return ids
+
+    def add_texts(self, texts: list, metadatas: list | None = None, ids: list | None = None):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_vectors(self.embedding_function.embed_documents(texts), texts, metadatas, ids)
+
+    def add_documents(self, documents: list, ids: list | None = None):
+        return self.add_texts([document.page_content for document in documents], [document.metadata for document in documents], ids)
+
+    def delete(self, ids: list | None = None):
+        """
+        Deletes the chunks with the given ids. Their rows are masked out of searches until compact().
+        """
+        with self.lock:
+            self.load()
+            for id in ids or []:
+                row = self.rows.pop(str(id), None)
+                if row is not None:
+                    self.ids[row] = None
+                    self.alive[row] = False
+            self.ivf_lists = None
+
+    def persist(self):
+        """
+        Flushes the matrices and writes the state file. Compacts the store first if more than half of its rows are deleted.
+        """
+        with self.lock:
+            if not self.loaded:
+                return
+            if self.count >= MIN_CAPACITY and len(self.rows) < self.count / 2:
+                self.compact()
+            if self.vectors is None:
+                return
+            self.vectors.flush()
+            self.offsets.flush()
+            self.write_state()
+
+    def save_array(self, name: str, array):
+        """
+        Saves an array as a .npy file, written next to the old one and swapped in.
+        """
+        with open(self.file(name) + '.tmp', 'wb') as file:
+            self.np.save(file, array)
+        os.replace(self.file(name) + '.tmp', self.file(name))
+
+    def write_state(self):
+        """
+        Saves the IVF index, if there is one, and then the state file, which names the rows that are complete.
+        """
+        ivf = None
+        if self.centroids is not None:
+            self.save_array(CENTROIDS_FILE, self.centroids)
+            self.save_array(ASSIGNMENTS_FILE, self.assignments)
+            ivf = {'nlist': len(self.centroids), 'nprobe': self.nprobe}
+        state = {'version': VECTOR_STORE_VERSION, 'dim': self.dim, 'dtype': self.dtype, 'count': self.count, 'ivf': ivf, 'generation': self.generation, 'ids': self.ids}
+        with open(self.file(STATE_FILE) + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(self.file(STATE_FILE) + '.tmp', self.file(STATE_FILE))
+
+    def compact(self):
+        """
+        Rewrites the store without its deleted rows. The compacted files are written under the next generation's names, next
+        to the old ones, and the state file is swapped in last with os.replace, so until then the old state and files are
+        untouched and a crash leaves either the old store or the compacted one. The old files are removed after the swap.
+        """
+        np = self.np
+        with self.lock:
+            self.load()
+            if self.vectors is None:
+                return
+            keep = np.flatnonzero(self.alive[:self.count])
+            count, capacity = len(keep), max(len(keep), MIN_CAPACITY)
+            old, new = self.generation, self.generation + 1
+            chunks = self.read_rows(keep)
+            vectors = np.lib.format.open_memmap(self.file(VECTORS_FILE, new), mode='w+', dtype=self.dtype, shape=(capacity, self.dim))
+            offsets = np.lib.format.open_memmap(self.file(OFFSETS_FILE, new), mode='w+', dtype='int64', shape=(capacity,))
+            for start in range(0, count, self.block_rows):
+                rows = keep[start:start + self.block_rows]
+                vectors[start:start + len(rows)] = self.vectors[rows]
+            with open(self.file(CHUNKS_FILE, new), 'wb') as file:
+                for row, chunk in enumerate(chunks):
+                    offsets[row] = file.tell()
+                    file.write(json.dumps(chunk, default=str).encode('utf-8') + b'\n')
+            vectors.flush()
+            offsets.flush()
+            del vectors, offsets
+
+            self.generation = new
+            self.count = count
+            self.ids = [chunk['id'] for chunk in chunks]
+            self.rows = {id: row for row, id in enumerate(self.ids)}
+            self.alive = np.zeros(capacity, dtype=bool)
+            self.alive[:count] = True
+            if self.assignments is not None:
+                self.assignments = self.assignments[keep] # the kept rows keep their clusters
+            self.ivf_lists = None
+            self.vectors = np.load(self.file(VECTORS_FILE), mmap_mode='r+')
+            self.offsets = np.load(self.file(OFFSETS_FILE), mmap_mode='r+')
+            self.write_state() # saves the assignments of the new generation, then switches the state to it
+            for name in GENERATION_FILES:
+                if os.path.exists(self.file(name, old)):
+                    os.remove(self.file(name, old))
+
+    def read_rows(self, rows):
+        """
+        Returns the stored {'id', 'text', 'metadata'} of the given rows, reading only their lines of the chunks file.
+        """
+        chunks = []
+        with open(self.file(CHUNKS_FILE), 'rb') as file:
+            for row in rows:
+                file.seek(int(self.offsets[row]))
+                chunks.append(json.loads(file.readline()))
+        return chunks
+
+    def build_ivf(self, nlist: int | None = None, nprobe: int | None = None, iterations: int = 10, sample: int | None = None, seed: int = 0):
+        """
+        Partitions the vectors into nlist clusters with spherical k-means, so searches only score the rows of the nprobe
+        clusters closest to the query. Rows added later are assigned to their closest cluster; call it again after the
+        corpus has changed a lot. Trades a little recall for speed on large corpora.
+
+        Args:
+            nlist (int | None, optional): Number of clusters. Defaults to None (sqrt(rows)).
+            nprobe (int | None, optional): Clusters searched per query. Defaults to None (nlist / 8, at least 1).
+            iterations (int, optional): k-means iterations. Defaults to 10.
+            sample (int | None, optional): Rows the centroids are trained on. Defaults to None (64 per cluster).
+            seed (int, optional): Seed of the sampling. Defaults to 0.
+        """
+        np = self.np
+        with self.lock:
+            self.load()
+            rows = np.flatnonzero(self.alive[:self.count])
+            if not len(rows):
+                raise ValueError('Cannot build an IVF index over an empty store.')
+            nlist = min(nlist or max(1, int(len(rows) ** 0.5)), len(rows))
+            random = np.random.default_rng(seed)
+            training = np.asarray(self.vectors[np.sort(random.choice(rows, min(sample or 64 * nlist, len(rows)), replace=False))], dtype=np.float32)
+            centroids = training[random.choice(len(training), nlist, replace=False)]
+            for _ in range(iterations):
+                labels = (training @ centroids.T).argmax(axis=1)
+                order = np.argsort(labels, kind='stable')
+                clusters, starts = np.unique(labels[order], return_index=True)
+                centroids[clusters] = self.normalize(np.add.reduceat(training[order], starts, axis=0))
+                empty = np.setdiff1d(np.arange(nlist), clusters)
+                centroids[empty] = training[random.choice(len(training), len(empty), replace=False)] # reseed empty clusters
+            assignments = np.empty(self.count, dtype=np.int32)
+            for start in range(0, self.count, self.block_rows):
+                block = np.asarray(self.vectors[start:min(start + self.block_rows, self.count)], dtype=np.float32)
+                assignments[start:start + len(block)] = (block @ centroids.T).argmax(axis=1)
+            self.centroids, self.assignments = centroids, assignments
+            self.nprobe = nprobe or max(1, nlist // 8)
+            self.ivf_lists = None
+
+    def drop_ivf(self):
+        """
+        Removes the IVF index, so searches are exact again.
+        """
+        with self.lock:
+            self.load()
+            self.centroids = self.assignments = self.nprobe = self.ivf_lists = None
+            for name in (CENTROIDS_FILE, ASSIGNMENTS_FILE):
+                if os.path.exists(self.file(name)):
+                    os.remove(self.file(name))
+
+    def top_k(self, scores, k: int):
+        """
+        Returns the column indices of the k largest scores of each row, best first, using argpartition.
+        """
+        np = self.np
+        if scores.shape[1] > k:
+            columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            columns = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, columns, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(columns, order, axis=1)
+
+    def search_exact(self, queries, k: int, vectors, alive, count: int):
+        """
+        Scores every row against all queries, one block of rows at a time, and merges the per-block top k.
+        """
+        np = self.np
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, self.block_rows):
+            block = np.asarray(vectors[start:min(start + self.block_rows, count)], dtype=np.float32)
+            scores = queries @ block.T
+            scores[:, ~alive[start:start + len(block)]] = -np.inf
+            columns = self.top_k(scores, k)
+            rows = np.concatenate([best_rows, columns + start], axis=1)
+            scores = np.concatenate([best_scores, np.take_along_axis(scores, columns, axis=1)], axis=1)
+            keep = self.top_k(scores, k)
+            best_rows, best_scores = np.take_along_axis(rows, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+        return best_rows, best_scores
+
+    def ivf_candidates(self, query, nprobe: int):
+        """
+        Returns the sorted rows of the nprobe clusters closest to the query.
+        """
+        np = self.np
+        if self.ivf_lists is None:
+            order = np.argsort(self.assignments, kind='stable')
+            starts = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self.ivf_lists = (order, starts)
+        order, starts = self.ivf_lists
+        nprobe = min(nprobe, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([order[starts[cluster]:starts[cluster + 1]] for cluster in clusters]))
+
+    def search_vectors(self, queries, k: int = 4, nprobe: int | None = None):
+        """
+        Returns, for each query vector, a list of up to k (row, cosine similarity) pairs, best first.
+
+        Args:
+            queries: One vector or a matrix of query vectors.
+            k (int, optional): Number of results per query. Defaults to 4.
+            nprobe (int | None, optional): Clusters searched if an IVF index exists. Defaults to None (the index's nprobe;
+                0 searches exactly).
+        """
+        np = self.np
+        queries = self.normalize(queries)
+        with self.lock:
+            self.load()
+            count, vectors, alive = self.count, self.vectors, self.alive
+            use_ivf = self.centroids is not None and nprobe != 0
+            if use_ivf:
+                candidates = [self.ivf_candidates(query, nprobe or self.nprobe) for query in queries]
+        if not count or k <= 0:
+            return [[] for _ in queries]
+        if use_ivf:
+            results = []
+            for query, rows in zip(queries, candidates):
+                rows = rows[alive[rows]]
+                scores = (np.asarray(vectors[rows], dtype=np.float32) @ query)[None, :]
+                top = self.top_k(scores, k)[0]
+                results.append([(int(rows[column]), float(scores[0, column])) for column in top])
+            return results
+        rows, scores = self.search_exact(queries, k, vectors, alive, count)
+        return [[(int(row), float(score)) for row, score in zip(query_rows, query_scores) if score > -np.inf] for query_rows, query_scores in zip(rows, scores)]
+
+    def max_marginal_relevance(self, query, hits: list, k: int = 4, lambda_mult: float = 0.5):
+        """
+        Re-ranks (row, score) hits by maximal marginal relevance and returns the k selected ones: each pick maximizes
+        lambda_mult * similarity to the query - (1 - lambda_mult) * highest similarity to the chunks already picked, so
+        near-duplicate chunks don't crowd out the rest.
+        """
+        np = self.np
+        if len(hits) <= 1 or k <= 0:
+            return hits[:k]
+        rows = np.array([row for row, _ in hits])
+        with self.lock:
+            candidates = self.normalize(self.vectors[rows])
+        relevance = candidates @ self.normalize(query)[0]
+        similarity = candidates @ candidates.T
+        selected = [int(relevance.argmax())]
+        redundancy = similarity[selected[0]].copy()
+        while len(selected) < min(k, len(hits)):
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            pick = int(scores.argmax())
+            selected.append(pick)
+            redundancy = np.maximum(redundancy, similarity[pick])
+        return [hits[index] for index in selected]
+
+    def documents(self, hits: list):
+        """
+        Returns (document, score) pairs for (row, score) pairs.
+        """
+        with self.lock:
+            chunks = self.read_rows([row for row, _ in hits])
+        results = []
+        for chunk, (_, score) in zip(chunks, hits):
+            document = self.document_class(page_content=chunk['text'], metadata=chunk['metadata'])
+            if isinstance(document, Chunk):
+                document.id = chunk['id']
+            results.append((document, score))
+        return results
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, nprobe: int | None = None):
+        return [document for document, _ in self.documents(self.search_vectors(embedding, k, nprobe)[0])]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, nprobe: int | None = None):
+        """
+        Returns up to k (document, cosine similarity) pairs for the query, best first. Unlike Chroma, which returns distances,
+        higher scores are better.
+        """
+        return self.documents(self.search_vectors(self.embedding_function.embed_query(query), k, nprobe)[0])
+
+    def similarity_search(self, query: str, k: int = 4, nprobe: int | None = None):
+        return [document for document, _ in self.similarity_search_with_score(query, k, nprobe)]
+
+    def similarity_search_many(self, queries: list, k: int = 4, nprobe: int | None = None):
+        """
+        Returns a list of (document, cosine similarity) pairs per query. The queries are embedded as queries (in one call when
+        the embedding function has embed_queries) and scored with one matrix-matrix product.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        if hasattr(self.embedding_function, 'embed_queries'):
+            vectors = self.embedding_function.embed_queries(queries)
+        else:
+            vectors = [self.embedding_function.embed_query(query) for query in queries]
+        hits = self.search_vectors(vectors, k, nprobe)
+        return [self.documents(query_hits) for query_hits in hits]
+
+    def get(self, ids: list):
+        """
+        Returns the stored chunks with the given ids (missing ids are skipped).
+        """
+        with self.lock:
+            self.load()
+            rows = [self.rows[str(id)] for id in ids if str(id) in self.rows]
+        return [document for document, _ in self.documents([(row, None) for row in rows])]
+
+    def __len__(self):
+        self.load()
+        return len(self.rows)
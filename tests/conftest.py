@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+from mock_server import MockServer, MockConfig
+
+SCHEMA: dict = {'name': 'str', 'age': 'int'}
+JSON_CONTENT: dict = {'name': 'Zachary Ivie', 'age': 29}
+
+
+@pytest.fixture
+def server():
+    """
+    A mock OpenAI/Groq API on a free local port. Change server.config to change its replies.
+    """
+    with MockServer(MockConfig(json_content=JSON_CONTENT)) as server:
+        yield server
+
+
+@pytest.fixture
+def openai_model(server):
+    """
+    Returns a factory of OpenAI models that talk to the mock server. The models are closed after the test.
+    """
+    from swiftllm import OpenAI
+    models = []
+
+    def make(**kwargs):
+        model = OpenAI(model='gpt-4o', api_key='mock', base_url=server.openai_base_url, **kwargs)
+        models.append(model)
+        return model
+
+    yield make
+    for model in models:
+        model.close()
+
+
+@pytest.fixture
+def groq_model(server):
+    """
+    Returns a factory of Groq models that talk to the mock server. The models are closed after the test.
+    """
+    from swiftllm import Groq
+    models = []
+
+    def make(**kwargs):
+        model = Groq(model='llama3-8b', api_key='mock', base_url=server.groq_base_url, **kwargs)
+        models.append(model)
+        return model
+
+    yield make
+    for model in models:
+        model.close()
@@ -0,0 +1,61 @@
+import json
+import time
+
+from swiftllm.activity import ActivityLog, ActivityRecord, JSONLSink
+
+
+class Unserializable:
+
+    def __str__(self):
+        raise RuntimeError('cannot format')
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_sink_survives_a_record_that_cannot_be_serialized(tmp_path):
+    path = str(tmp_path / 'activity.jsonl')
+    sink = JSONLSink(path, flush_interval=0.05)
+    sink.write(ActivityRecord(0.0, 'user', 'before', 0.0))
+    sink.write(ActivityRecord(0.0, 'user', Unserializable(), 0.0))
+    sink.write(ActivityRecord(0.0, 'user', 'after', 0.0))
+    sink.close()
+
+    assert [line['message'] for line in read_lines(path)] == ['before', 'after']
+    assert sink.errors == 1 and sink.written == 2
+    assert not sink.thread.is_alive()
+
+
+def test_sink_survives_a_failed_write(tmp_path):
+    path = str(tmp_path / 'activity.jsonl')
+    sink = JSONLSink(path, flush_interval=0.05)
+    write = sink.file.write
+    failures = []
+
+    def fail_once(data):
+        if not failures:
+            failures.append(data)
+            raise OSError('No space left on device')
+        return write(data)
+
+    sink.file.write = fail_once
+    sink.write(ActivityRecord(0.0, 'user', 'lost', 0.0))
+    deadline = time.monotonic() + 5
+    while sink.errors == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.write(ActivityRecord(0.0, 'user', 'kept', 0.0))
+    sink.close()
+
+    assert [line['message'] for line in read_lines(path)] == ['kept']
+    assert sink.errors == 1 and isinstance(sink.last_error, OSError)
+
+
+def test_logged_dicts_are_snapshots():
+    log = ActivityLog()
+    response = {'name': 'Zachary Ivie'}
+    log.record('assistant', response, 0.0)
+    response['name'] = 'changed'
+
+    assert json.loads(log[-1]['message']) == {'name': 'Zachary Ivie'}
@@ -0,0 +1,34 @@
+import asyncio
+
+from swiftllm.clients import registry
+
+
+def test_models_work_across_event_loops(server, openai_model, groq_model):
+    for make in (openai_model, groq_model):
+        first = make()
+        assert asyncio.run(first.aprompt('Hello', retries=1)) is not None
+        second = make() # shares the first model's sync client, but not its async client of a closed loop
+        assert asyncio.run(second.aprompt('Hello', retries=1)) is not None
+        assert asyncio.run(first.aprompt('Hello', retries=1)) is not None
+
+
+def test_async_clients_of_closed_loops_are_dropped(server, openai_model):
+    model = openai_model()
+    for _ in range(3):
+        assert asyncio.run(model.aprompt('Hello', retries=1)) is not None
+    assert len(model.async_clients) == 1
+
+    keys = list(model.async_clients)
+    model.close()
+    assert not any(key in registry for key in keys)
+
+
+def test_async_clients_are_shared_on_one_loop(server, openai_model):
+    first, second = openai_model(), openai_model()
+
+    async def run():
+        await asyncio.gather(first.aprompt('Hello'), second.aprompt('Hello'))
+        return list(first.async_clients.values()), list(second.async_clients.values())
+
+    clients, others = asyncio.run(run())
+    assert clients == others
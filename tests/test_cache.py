@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from swiftllm.cache import LRUCache, SQLiteCache
+from swiftllm.retry import RetryPolicy
+
+from conftest import SCHEMA, JSON_CONTENT
+
+
+def test_identical_prompts_are_served_from_the_cache(server, openai_model):
+    model = openai_model(schema=SCHEMA, cache=LRUCache())
+
+    assert model.prompt('Who?', history=model.new_history()) == JSON_CONTENT
+    assert model.prompt('Who?', history=model.new_history()) == JSON_CONTENT
+    assert server.stats[200] == 1
+    assert model.cache.stats()['hits'] == 1
+
+
+def test_response_that_fails_validation_is_not_cached(server, openai_model):
+    model = openai_model(schema=SCHEMA, cache=LRUCache())
+    server.config.json_content = {'name': 'Zachary Ivie'} # no age
+
+    assert model.prompt('Who?', retries=RetryPolicy(max_attempts=2, validation_retries=1), history=model.new_history()) is None
+    assert len(model.cache) == 0
+    assert server.stats[200] == 2 # the retry asked the provider again instead of replaying the bad response
+
+    server.config.json_content = JSON_CONTENT
+    assert model.prompt('Who?', history=model.new_history()) == JSON_CONTENT
+    assert len(model.cache) == 1
+
+
+def test_async_response_that_fails_validation_is_not_cached(server, openai_model):
+    model = openai_model(schema=SCHEMA, cache=LRUCache())
+    server.config.json_content = 'not json'
+
+    assert asyncio.run(model.aprompt('Who?', retries=RetryPolicy(max_attempts=2, validation_retries=1), history=model.new_history())) is None
+    assert len(model.cache) == 0
+    assert server.stats[200] == 2
+
+
+def test_cached_response_that_fails_validation_is_evicted(server, openai_model, tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite'))
+    lenient = openai_model(schema={'name': 'str'}, cache=cache)
+    strict = openai_model(schema={'name': 'str'}, cache=cache)
+    server.config.json_content = {'name': 'Zachary Ivie'}
+    assert lenient.prompt('Who?', history=lenient.new_history()) == {'name': 'Zachary Ivie'}
+    assert len(cache) == 1
+
+    def reject(response):
+        raise KeyError('age') # e.g. the schema gained a field since the response was cached
+
+    strict.validator.validate = reject
+    assert strict.prompt('Who?', retries=1, history=strict.new_history()) is None
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_counters_are_exact_under_concurrency():
+    cache = LRUCache()
+    cache.set('hit', 'value')
+
+    def get(i):
+        return cache.get('hit' if i % 2 else 'miss')
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(get, range(4000)))
+    assert (cache.hits, cache.misses) == (2000, 2000)
@@ -0,0 +1,56 @@
+import pickle
+
+from swiftllm.embeddings import HashingEmbeddings, LangChainEmbeddings, CachedEmbeddings
+
+TEXTS: list = [f'document number {i} about topic {i % 3}' for i in range(40)]
+
+
+def test_process_pool_is_kept_between_calls():
+    expected = HashingEmbeddings(dimensions=64).embed_documents(TEXTS)
+    with HashingEmbeddings(dimensions=64, batch_size=4, processes=2) as embeddings:
+        assert embeddings.embed_documents(TEXTS) == expected
+        executor = embeddings.executor
+        assert executor is not None
+        assert embeddings.embed_documents(TEXTS[:20]) == expected[:20]
+        assert embeddings.executor is executor
+        assert pickle.loads(pickle.dumps(embeddings)).executor is None
+    assert embeddings.executor is None
+
+
+def test_cached_embeddings_close_the_wrapped_embeddings(tmp_path):
+    embeddings = HashingEmbeddings(dimensions=64, batch_size=4, processes=2)
+    cached = CachedEmbeddings(embeddings, str(tmp_path / 'embeddings.sqlite'))
+    cached.embed_documents(TEXTS)
+    assert embeddings.executor is not None
+    cached.close()
+    assert embeddings.executor is None
+
+
+class QueryModeEmbeddings:
+
+    """
+    LangChain-style embeddings that embed queries differently from documents.
+    """
+
+    def embed_documents(self, texts: list):
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_query(self, text: str):
+        return [0.0, 1.0]
+
+
+def test_queries_use_the_query_mode(tmp_path):
+    cached = CachedEmbeddings(LangChainEmbeddings(QueryModeEmbeddings()), str(tmp_path / 'embeddings.sqlite'))
+    assert cached.embed_documents(['cats']) == [[1.0, 0.0]]
+    assert cached.embed_queries(['cats', 'dogs']) == [[0.0, 1.0], [0.0, 1.0]]
+    assert cached.embed_query('cats') == [0.0, 1.0]
+    cached.close()
+
+
+def test_duplicate_texts_are_not_counted_as_hits(tmp_path):
+    cached = CachedEmbeddings(HashingEmbeddings(dimensions=64), str(tmp_path / 'embeddings.sqlite'))
+    cached.embed_documents(['cats', 'cats', 'dogs'])
+    assert (cached.hits, cached.misses) == (0, 2)
+    cached.embed_documents(['cats', 'cats', 'birds'])
+    assert (cached.hits, cached.misses) == (1, 3)
+    cached.close()
@@ -0,0 +1,91 @@
+import pytest
+
+from swiftllm.extract import split_windows, merge_results
+
+SENTENCES: list = [f'Sentence number {i} states one fact.' for i in range(60)]
+TEXT: str = ' '.join(SENTENCES)
+
+
+def window_spans(text: str, windows: list):
+    """
+    Returns the (start, end) position of every window in the text.
+    """
+    spans, start = [], 0
+    for window in windows:
+        start = text.index(window, start)
+        spans.append((start, start + len(window)))
+    return spans
+
+
+def test_short_text_is_one_window():
+    assert split_windows('A short text.', window_tokens=100) == ['A short text.']
+
+
+def test_windows_without_overlap_cover_the_text():
+    windows = split_windows(TEXT, window_tokens=50)
+    assert len(windows) > 1 and ''.join(windows) == TEXT
+    assert all(window.endswith('. ') for window in windows[:-1]) # cut at sentence boundaries
+
+
+def test_consecutive_windows_overlap_at_their_boundaries():
+    windows = split_windows(TEXT, window_tokens=50, overlap_tokens=10)
+    spans = window_spans(TEXT, windows)
+    assert spans[0][0] == 0 and spans[-1][1] == len(TEXT)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert start < next_start < end < next_end # each window starts inside the previous one and moves forward
+        assert TEXT[next_start - 1] == ' ' # at a word boundary
+        assert end - next_start <= 10 * 4 + len(SENTENCES[0]) # about overlap_tokens, up to the next boundary
+    for sentence in SENTENCES: # a fact cut by one boundary is complete in the next window
+        assert any(sentence in window for window in windows)
+
+
+def test_overlap_never_stops_the_windows_moving_forward():
+    windows = split_windows(TEXT, window_tokens=20, overlap_tokens=100)
+    spans = window_spans(TEXT, windows)
+    assert all(start < next_start < end < next_end for (start, end), (next_start, next_end) in zip(spans, spans[1:]))
+    assert spans[-1][1] == len(TEXT)
+
+
+def test_text_without_separators_is_cut_at_the_window_size():
+    text = 'x' * 1000
+    windows = split_windows(text, window_tokens=50)
+    assert ''.join(windows) == text and max(len(window) for window in windows) <= 200
+
+
+RESULTS: list = [
+    {'name': 'Ada Lovelace', 'born': 1815, 'title': 'Countess', 'topics': ['math']},
+    {'name': 'ada  lovelace', 'born': None, 'title': 'Countess of Lovelace', 'topics': ['Math', 'engines']},
+    {'name': 'Ada Byron', 'born': 1815, 'title': 'Countess', 'topics': []},
+]
+
+
+@pytest.mark.parametrize('conflict, name, title', [
+    ('first', 'Ada Lovelace', 'Countess'),
+    ('last', 'Ada Byron', 'Countess'),
+    ('most_common', 'Ada Lovelace', 'Countess'),
+    ('longest', 'ada  lovelace', 'Countess of Lovelace'),
+    ('collect', ['Ada Lovelace', 'Ada Byron'], ['Countess', 'Countess of Lovelace']),
+])
+def test_conflict_policies(conflict, name, title):
+    merged = merge_results(RESULTS, conflict)
+    assert (merged['name'], merged['title']) == (name, title)
+    assert merged['born'] == 1815 # a missing value never overrides a found one
+    assert merged['topics'] == ['math', 'engines'] # lists are concatenated without duplicates
+
+
+def test_most_common_ties_go_to_the_earliest_window():
+    assert merge_results([{'age': 30}, {'age': 31}], 'most_common') == {'age': 30}
+
+
+def test_callable_conflict_policy():
+    assert merge_results([{'age': 30}, {'age': 32}, {'age': 30}], lambda values: sum(values) / len(values)) == {'age': pytest.approx(30.67, abs=0.01)}
+
+
+def test_unknown_conflict_policy():
+    with pytest.raises(ValueError):
+        merge_results(RESULTS, 'average')
+
+
+def test_partial_records_are_merged_into_complete_ones():
+    merged = merge_results([{'people': [{'name': 'Ada', 'born': 1815}]}, {'people': [{'name': 'ada'}, {'name': 'Charles'}]}])
+    assert merged == {'people': [{'name': 'Ada', 'born': 1815}, {'name': 'Charles'}]}
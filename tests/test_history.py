@@ -0,0 +1,64 @@
+import pytest
+
+from swiftllm.history import StatelessHistory, LastNTurns, TokenBudget, split_turns, estimate_message_tokens
+
+PINNED: list = [{'role': 'system', 'content': 'Be brief.'}, {'role': 'assistant', 'content': 'OK.'}]
+
+
+def conversation(turns: int, words: int = 1):
+    messages = list(PINNED)
+    for i in range(turns):
+        messages.append({'role': 'user', 'content': ' '.join([f'question{i}'] * words)})
+        messages.append({'role': 'assistant', 'content': ' '.join([f'answer{i}'] * words)})
+    messages.append({'role': 'user', 'content': 'current'})
+    return messages
+
+
+def test_split_turns():
+    turns = split_turns(conversation(2)[2:])
+    assert [turn[0]['content'] for turn in turns] == ['question0', 'question1', 'current']
+    assert [len(turn) for turn in turns] == [2, 2, 1]
+
+
+def test_stateless_history_keeps_the_pinned_messages_and_the_current_turn():
+    messages = conversation(3)
+    assert StatelessHistory().select(messages, pinned=2) == PINNED + [messages[-1]]
+    assert len(messages) == 9 # the history itself is not modified
+
+
+def test_last_n_turns():
+    messages = conversation(3)
+    selected = LastNTurns(2).select(messages, pinned=2)
+    assert selected == PINNED + messages[-3:]
+    with pytest.raises(ValueError):
+        LastNTurns(0)
+
+
+def test_token_budget_drops_the_oldest_turns_first():
+    messages = conversation(4, words=20)
+    turn_tokens = estimate_message_tokens(messages[2:4])
+    budget = estimate_message_tokens(PINNED + messages[-1:]) + 2 * turn_tokens
+    selected = TokenBudget(budget).select(messages, pinned=2)
+    assert selected[:2] == PINNED
+    assert [message['content'].split()[0] for message in selected[2::2]] == ['question2', 'question3', 'current']
+
+
+def test_token_budget_keeps_the_pinned_messages_and_the_current_turn_over_budget():
+    messages = conversation(2, words=50)
+    assert TokenBudget(1).select(messages, pinned=2) == PINNED + messages[-1:]
+
+
+def test_token_budget_from_the_context_window():
+    messages = conversation(2)
+    assert TokenBudget().select(messages, pinned=2) == messages # no budget and no known context window
+    assert TokenBudget(reserve=10).get_budget(100) == 90
+
+
+def test_model_sends_the_pinned_messages_with_every_prompt(server, openai_model):
+    model = openai_model(history_policy=LastNTurns(1))
+    history = model.new_history()
+    for i in range(3):
+        model.prompt(f'question {i}', history=history)
+    selected = model.select_messages(history)
+    assert selected[:len(model.initial_messages)] == model.initial_messages
+    assert [message['role'] for message in selected[len(model.initial_messages):]] == ['user', 'assistant']
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from swiftllm.jsonstream import IncrementalJSONParser
+from swiftllm.schema import SchemaViolation
+
+from conftest import SCHEMA
+
+TRICKY: dict = {'name': 'Zach "the {brace}" \\ Ivie é', 'age': 29}
+
+
+def feed_all(parser, text: str, size: int = 1):
+    fields = []
+    for start in range(0, len(text), size):
+        fields.extend(parser.feed(text[start:start + size]))
+    return fields
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7])
+def test_chunks_split_inside_strings_and_escapes(size):
+    text = json.dumps(TRICKY) # escapes the quotes, the backslash and the accent
+    parser = IncrementalJSONParser(SCHEMA)
+    assert feed_all(parser, text, size) == list(TRICKY.items())
+    assert parser.result() == TRICKY
+
+
+def test_fields_are_reported_as_they_complete():
+    parser = IncrementalJSONParser(SCHEMA)
+    assert parser.feed('{"name": "Zach", "ag') == [('name', 'Zach')]
+    assert parser.feed('e": 29') == []
+    assert parser.feed('}') == [('age', 29)]
+
+
+def test_text_and_stray_braces_before_the_object_are_ignored():
+    parser = IncrementalJSONParser(SCHEMA)
+    feed_all(parser, 'Filled in the {name} and {age} template: {"name": "Zach", "age": 29} Done.')
+    assert parser.result() == {'name': 'Zach', 'age': 29}
+
+
+def test_unexpected_key_is_rejected_before_its_value():
+    parser = IncrementalJSONParser(SCHEMA)
+    with pytest.raises(SchemaViolation):
+        parser.feed('{"nickname"')
+
+
+def test_bool_is_not_an_int():
+    parser = IncrementalJSONParser(SCHEMA)
+    with pytest.raises(SchemaViolation):
+        feed_all(parser, '{"name": "Zach", "age": true}')
+
+
+def test_missing_key_is_rejected_when_the_object_closes():
+    parser = IncrementalJSONParser(SCHEMA)
+    with pytest.raises(SchemaViolation):
+        feed_all(parser, '{"name": "Zach"}')
+
+
+def test_incomplete_object():
+    parser = IncrementalJSONParser(SCHEMA)
+    feed_all(parser, '{"name": "Zach", "age": 2')
+    assert not parser.done
+    with pytest.raises(ValueError):
+        parser.result()
+
+
+def test_without_schema_any_object_is_accepted():
+    parser = IncrementalJSONParser()
+    feed_all(parser, '{"tags": ["a", {"b": [1, 2]}], "ok": null}')
+    assert parser.result() == {'tags': ['a', {'b': [1, 2]}], 'ok': None}
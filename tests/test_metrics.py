@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from swiftllm.metrics import Metrics, MetricsHook, current_call
+
+from conftest import SCHEMA, JSON_CONTENT
+from mock_server import split_tokens
+
+
+class RecordingHook(MetricsHook):
+
+    def __init__(self):
+        self.events = []
+
+    def on_request(self, record):
+        self.events.append('request')
+
+    def on_error(self, record, error):
+        self.events.append('error')
+
+    def on_response(self, record):
+        self.events.append('response')
+
+
+@pytest.mark.parametrize('provider, model_name', [('openai', 'gpt-4o'), ('groq', 'llama3-8b-8192')])
+def test_ledger_records_tokens_and_cost_per_call(server, openai_model, groq_model, provider, model_name):
+    hook = RecordingHook()
+    metrics = Metrics(hooks=[hook])
+    make = openai_model if provider == 'openai' else groq_model
+    model = make(schema=SCHEMA, metrics=metrics)
+    model.model = model_name
+    prompt_price, completion_price = model.get_token_prices()
+
+    for _ in range(2):
+        assert model.prompt('Who?', history=model.new_history()) == JSON_CONTENT
+    assert current_call.get() is None
+    assert hook.events == ['request', 'response'] * 2
+
+    record = metrics.calls[-1]
+    assert record.model == model_name
+    assert record.attempts == 1 and record.error is None
+    assert record.completion_tokens == len(split_tokens(json.dumps(JSON_CONTENT)))
+    assert record.prompt_tokens > 0
+    assert record.cost == pytest.approx(record.prompt_tokens * prompt_price + record.completion_tokens * completion_price)
+
+    ledger = metrics.summary()[model_name]
+    assert ledger['calls'] == 2 and ledger['errors'] == 0
+    assert ledger['completion_tokens'] == 2 * record.completion_tokens
+    assert ledger['cost'] == pytest.approx(2 * record.cost)
+    assert metrics.total_cost() == pytest.approx(2 * record.cost)
+
+
+def test_failed_call_is_recorded_with_its_error(server, openai_model):
+    hook = RecordingHook()
+    model = openai_model(metrics=Metrics(hooks=[hook]))
+    server.config.error_rate = 1.0
+
+    assert model.prompt('Hello', history=model.new_history(), retries=2) is None
+    record = model.metrics.calls[-1]
+    assert (record.attempts, record.error, record.cost) == (2, 'InternalServerError', 0.0)
+    assert hook.events == ['request', 'error', 'error', 'response']
+    assert model.metrics.summary()['gpt-4o']['errors'] == 1
@@ -0,0 +1,66 @@
+import asyncio
+import openai
+
+from conftest import SCHEMA
+
+
+def test_prompt_returns_none_when_every_attempt_fails(server, openai_model):
+    server.config.error_rate = 1.0
+    model = openai_model()
+
+    assert model.prompt('Hello', retries=1) is None
+
+
+def test_prompt_raise_errors(server, openai_model):
+    server.config.error_rate = 1.0
+    model = openai_model()
+
+    try:
+        model.prompt('Hello', retries=1, raise_errors=True)
+    except openai.InternalServerError:
+        pass
+    else:
+        raise AssertionError('prompt did not raise the error of the last attempt')
+
+
+def test_prompt_many_keeps_the_exception_of_a_failed_input(server, openai_model):
+    model = openai_model(schema=SCHEMA)
+    server.config.error_rate = 1.0
+    results = model.prompt_many(['a', 'b'], retries=1)
+
+    assert [type(result) for result in results] == [openai.InternalServerError] * 2
+
+
+def test_aprompt_many_keeps_the_exception_of_a_failed_input(server, openai_model):
+    model = openai_model()
+    server.config.error_rate = 1.0
+    results = asyncio.run(model.aprompt_many(['a', 'b'], retries=1))
+
+    assert [type(result) for result in results] == [openai.InternalServerError] * 2
+
+
+def test_schema_and_samples_are_sent_once_in_the_system_message(openai_model, groq_model):
+    samples = [{'name': 'Grace Hopper', 'age': 85}]
+    for model in (openai_model(schema=SCHEMA, sample_outputs=samples), groq_model(schema=SCHEMA, sample_outputs=samples)):
+        sent = []
+        send_request = model.send_request
+
+        def spy(kwargs, *args):
+            sent.append([dict(message) for message in kwargs['messages']])
+            return send_request(kwargs, *args)
+
+        model.send_request = spy
+        session = model.session()
+        for turn in range(3):
+            assert session.prompt(f'Describe person {turn}.') is not None
+
+        assert len(sent) == 3 and [len(messages) for messages in sent] == [3, 5, 7]
+        for messages in sent:
+            system = [message for message in messages if message['role'] == 'system']
+            assert len(system) == 1 and messages[0]['role'] == 'system'
+            assert system[0]['content'].count('{"name":"str","age":"int"}') == 1 # minified, once
+            assert system[0]['content'].count('Grace Hopper') == 1
+            for message in messages[1:]:
+                assert '"str"' not in message['content'] and 'Grace Hopper' not in message['content']
+            assert [message['content'] for message in messages if message['role'] == 'user'][-1].startswith('Describe person')
+        assert model.new_history()[0] is model.template.messages[0] # the system message is shared, not rebuilt per call
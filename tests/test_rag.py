@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('langchain_community')
+
+from langchain.schema import Document
+
+from swiftllm.ingest import IngestConfig
+from swiftllm.rag import RAG
+
+
+def write(path, text: str):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+@pytest.fixture
+def make_rag(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+
+    rags = []
+
+    def make(**kwargs):
+        rag = RAG(str(data), '*.txt', db_path=str(tmp_path / 'db'), embeddings='HashingEmbeddings', vector_store='numpy', embedding_cache=str(tmp_path / 'embeddings.sqlite'), ingest=IngestConfig(processes=1, progress=None), **kwargs)
+        rags.append(rag)
+        return rag
+
+    yield data, make
+    for rag in rags:
+        rag.close()
+
+
+def test_refresh_only_embeds_changed_files(make_rag):
+    data, make = make_rag
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    write(data / 'dogs.txt', 'Dogs are loyal companions that like to play fetch.')
+    write(data / 'birds.txt', 'Birds have feathers and most of them can fly.')
+    rag = make()
+    assert rag.last_refresh['added'] == 3
+    assert rag.refresh()['unchanged'] == 3
+
+    time.sleep(0.01)
+    os.utime(data / 'cats.txt') # touched, same content
+    write(data / 'dogs.txt', 'Dogs are loyal companions that like to chase cars.')
+    os.remove(data / 'birds.txt')
+    write(data / 'fish.txt', 'Fish live in water and breathe with gills.')
+    stats = rag.refresh()
+
+    assert (stats['added'], stats['updated'], stats['removed'], stats['unchanged']) == (1, 1, 1, 1)
+    assert len(rag.db) == 3
+    document, _ = rag.query('chase cars', k=1)[0]
+    assert 'chase cars' in document.page_content
+
+
+def test_a_new_rag_reuses_the_index(make_rag):
+    data, make = make_rag
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    make()
+
+    rag = make()
+    assert rag.last_refresh['unchanged'] == 1 and rag.last_refresh['added'] == 0
+
+
+def test_refresh_clears_cached_query_results(make_rag):
+    data, make = make_rag
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    rag = make()
+    assert len(rag.query('fish gills', k=5)) == 1
+
+    write(data / 'fish.txt', 'Fish live in water and breathe with gills.')
+    rag.refresh()
+    assert 'gills' in rag.query('fish gills', k=5)[0][0].page_content
+
+
+def test_default_embedding_cache_sits_next_to_the_database(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    db_path = tmp_path / 'index'
+    with RAG(str(data), '*.txt', db_path=str(db_path), embeddings='HashingEmbeddings', vector_store='numpy', ingest=IngestConfig(processes=1, progress=None)) as rag:
+        assert rag.embeddings.path == str(tmp_path / 'index_embeddings.sqlite')
+        assert len(rag.embeddings) == 1
+    with RAG(str(data), '*.txt', db_path=str(db_path), embeddings='HashingEmbeddings', vector_store='numpy', rebuild=True, ingest=IngestConfig(processes=1, progress=None)) as rag:
+        assert rag.embeddings.hits == 1 # the cache outlives the rebuild
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query_embeddings, n_results, include):
+        self.calls.append(len(query_embeddings))
+        return {
+            'documents': [[f'chunk {i}'] for i in range(len(query_embeddings))],
+            'metadatas': [[{'source': f'{i}.txt'}] for i in range(len(query_embeddings))],
+            'distances': [[0.5] for _ in query_embeddings],
+        }
+
+
+def test_chroma_queries_are_batched(make_rag):
+    data, make = make_rag
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    rag = make()
+    rag.vector_store = 'chroma'
+    rag.db = type('FakeChroma', (), {'_collection': FakeCollection()})()
+    results = rag.query_many(['cats', 'dogs', 'birds'], k=1)
+    assert rag.db._collection.calls == [3]
+    assert [result[0][0].metadata['source'] for result in results] == ['0.txt', '1.txt', '2.txt']
+    assert results[1][0][1] == 0.5
+
+
+class FakeChromaWithoutCollection:
+
+    def __init__(self):
+        self.calls = []
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k):
+        self.calls.append(k)
+        return [(Document(page_content=f'chunk {len(self.calls)}', metadata={}), 0.25)]
+
+
+def test_chroma_search_falls_back_without_the_private_collection(make_rag):
+    data, make = make_rag
+    write(data / 'cats.txt', 'Cats are small carnivorous mammals that like to sleep.')
+    rag = make()
+    rag.vector_store = 'chroma'
+    rag.db = FakeChromaWithoutCollection()
+    results = rag.query_many(['cats', 'dogs'], k=2)
+    assert rag.db.calls == [2, 2]
+    assert [(result[0][0].page_content, result[0][1]) for result in results] == [('chunk 1', 0.25), ('chunk 2', 0.25)]
@@ -0,0 +1,49 @@
+import pytest
+
+from swiftllm.ratelimit import TokenBucket, RateLimiter, get_rate_limiter
+
+LIMITS: dict = {'gpt-4o': {'rpm': 500, 'tpm': 30000}}
+
+
+def test_wait_time_under_the_limit():
+    bucket = TokenBucket(60, period=60.0) # one token per second
+    assert bucket.wait_time(60) == 0.0
+    bucket.tokens = 0.0
+    assert bucket.wait_time(2) == pytest.approx(2.0, abs=0.01)
+    assert bucket.wait_time(1000) == pytest.approx(60.0, abs=0.01) # capped at the capacity
+
+
+def test_reserve_precharges_and_reconcile_corrects():
+    limiter = RateLimiter(rpm=2, tpm=1000)
+    assert limiter.reserve(400) == 0.0
+    assert limiter.tokens.tokens == pytest.approx(600, abs=1)
+    assert limiter.requests.tokens == pytest.approx(1, abs=0.01)
+
+    limiter.reconcile(400, 100) # the request used fewer tokens than estimated: refund the rest
+    assert limiter.tokens.tokens == pytest.approx(900, abs=1)
+    limiter.reconcile(100, 300) # and more: charge the difference
+    assert limiter.tokens.tokens == pytest.approx(700, abs=1)
+
+
+def test_reserve_waits_without_taking_anything():
+    limiter = RateLimiter(rpm=60, tpm=600) # one request and 10 tokens per second
+    assert limiter.reserve(600) == 0.0
+    wait = limiter.reserve(100)
+    assert wait == pytest.approx(10.0, abs=0.1)
+    assert limiter.requests.tokens == pytest.approx(59, abs=0.1) # the refused request took nothing
+
+
+def test_acquire_sleeps_until_the_bucket_refills():
+    limiter = RateLimiter(rpm=600) # ten requests per second
+    limiter.requests.tokens = 0.0
+    assert limiter.acquire() == pytest.approx(0.1, abs=0.05)
+    assert limiter.waited > 0
+
+
+def test_limiters_are_shared_per_exact_model():
+    limiter = get_rate_limiter('test', 'gpt-4o', LIMITS)
+    assert get_rate_limiter('test', 'GPT-4o', LIMITS) is limiter
+    mini = get_rate_limiter('test', 'gpt-4o-mini', LIMITS)
+    assert mini is not limiter
+    assert mini.tokens.capacity == limiter.tokens.capacity # the prefix only gives the default limits
+    assert get_rate_limiter('test', 'llama3-8b', LIMITS) is None
@@ -0,0 +1,57 @@
+from swiftllm.retry import RetryPolicy, classify_error, TRANSPORT, RATE_LIMIT, VALIDATION, FATAL
+from swiftllm.schema import SchemaViolation
+
+from conftest import SCHEMA
+
+
+class StatusError(Exception):
+
+    def __init__(self, status_code: int):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+
+
+def test_classify_error():
+    assert classify_error(StatusError(429)) == RATE_LIMIT
+    assert classify_error(StatusError(503)) == TRANSPORT
+    assert classify_error(StatusError(400)) == FATAL
+    assert classify_error(TimeoutError()) == TRANSPORT
+    assert classify_error(SchemaViolation('off schema')) == VALIDATION
+    assert classify_error(RuntimeError()) == FATAL
+
+
+def test_validation_failures_are_not_retried_by_default():
+    policy = RetryPolicy(max_attempts=3)
+
+    assert policy.next_delay(KeyError('age'), 1, 0.0) is None
+    assert policy.next_delay(StatusError(503), 1, 0.0) is not None
+
+
+def test_validation_retries_are_opt_in():
+    policy = RetryPolicy(max_attempts=5, validation_retries=2)
+
+    assert policy.next_delay(ValueError('not JSON'), 1, 0.0) == 0.0
+    assert policy.next_delay(ValueError('not JSON'), 2, 0.0) == 0.0
+    assert policy.next_delay(ValueError('not JSON'), 3, 0.0) is None
+    assert policy.with_attempts(2).validation_retries == 2
+
+
+def test_aborted_streams_are_retried_by_default():
+    policy = RetryPolicy(max_attempts=3)
+    violation = SchemaViolation('Unexpected key "nickname".')
+    violation.aborted = True
+
+    assert policy.next_delay(violation, 1, 0.0) == 0.0
+    assert policy.next_delay(violation, 3, 0.0) is None
+
+
+def test_prompt_does_not_retry_an_invalid_response(server, openai_model):
+    model = openai_model(schema=SCHEMA)
+    server.config.json_content = {'name': 'Zachary Ivie'}
+
+    assert model.prompt('Who?', retries=3) is None
+    assert server.stats[200] == 1
+
+    model.retry_policy = RetryPolicy(validation_retries=1)
+    assert model.prompt('Who?', retries=3) is None
+    assert server.stats[200] == 3
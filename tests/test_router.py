@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from swiftllm import OpenAI
+from swiftllm.router import Router, BackendStats
+
+from conftest import MockServer, MockConfig, JSON_CONTENT
+
+
+def test_models_must_share_the_instructions(openai_model):
+    with pytest.raises(ValueError):
+        Router([openai_model(instructions='Answer in English.'), openai_model(instructions='Answer in French.')])
+
+
+def test_a_consistently_slow_primary_stops_being_chosen(server):
+    with MockServer(MockConfig(latency=0.4, json_content=JSON_CONTENT)) as slow:
+        router = Router([
+            OpenAI(model='gpt-4o', api_key='mock', base_url=slow.openai_base_url),
+            OpenAI(model='gpt-4o', api_key='mock', base_url=server.openai_base_url),
+        ], hedge=True, hedge_delay=0.05, min_samples=3)
+        history = router.new_history()
+        assert router.prompt('Hello', history=history) is not None
+        assert len(history) == len(router.new_history()) + 2 # only the winner's messages are kept
+        for _ in range(9):
+            assert router.prompt('Hello') is not None
+        slow_stats, fast_stats = router.stats
+        assert router.rank()[0] == 1
+        assert fast_stats.hedges == 3 # the slow backend is only tried first until it has min_samples (censored) latencies
+        assert (fast_stats.calls, slow_stats.wins) == (10, 0) # the fast backend may still be hedged by the slow one when it lags
+        assert slow_stats.calls >= 3 and slow_stats.percentile(50) < 0.4 # recorded when they lost, not when they finished
+        router.close()
+
+
+def test_a_quickly_lost_race_does_not_lower_the_median():
+    stats = BackendStats()
+    for latency in (0.3, 0.3, 0.3):
+        stats.add(latency, True)
+    stats.add(0.01, True, censored=True) # lost a race it joined late: at least 0.01 s, not 0.01 s
+    stats.add(0.5, True, censored=True)
+    assert sorted(stats.latencies) == [0.3, 0.3, 0.3, 0.3, 0.5] and stats.calls == 5
+
+
+def test_cancelled_async_loser_is_recorded(server):
+    with MockServer(MockConfig(latency=0.4, json_content=JSON_CONTENT)) as slow:
+        router = Router([
+            OpenAI(model='gpt-4o', api_key='mock', base_url=slow.openai_base_url),
+            OpenAI(model='gpt-4o', api_key='mock', base_url=server.openai_base_url),
+        ], hedge=True, hedge_delay=0.05)
+        assert asyncio.run(router.aprompt('Hello')) is not None
+        slow_stats, fast_stats = router.stats
+        assert (slow_stats.calls, slow_stats.errors, fast_stats.wins) == (1, 0, 1)
+        assert 0.05 <= slow_stats.percentile(50) < 0.4
+        router.close()
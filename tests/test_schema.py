@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from swiftllm.schema import SchemaValidator, SchemaViolation, find_json, scan_json
+
+from conftest import SCHEMA, JSON_CONTENT
+
+NESTED: dict = {'name': 'str', 'score': 'float', 'alive': 'bool', 'tags': ['str'], 'address': {'city': 'str', 'zip': 'int | None'}, 'notes': 'anything the model wants to add'}
+VALID: dict = {'name': 'Zach', 'score': 3, 'alive': True, 'tags': ['a', 'b'], 'address': {'city': 'Provo', 'zip': None}, 'notes': [1, 'x']}
+
+
+def test_valid_response():
+    assert SchemaValidator(NESTED).validate(VALID)
+    assert SchemaValidator().validate({'anything': 1})
+
+
+@pytest.mark.parametrize('field, value', [
+    ('name', 1),
+    ('score', '3'),
+    ('score', True), # a bool is not a number in JSON
+    ('alive', 1), # and an int is not a bool
+    ('tags', 'a'),
+    ('tags', ['a', 2]),
+    ('address', 'Provo'),
+])
+def test_wrong_types(field, value):
+    with pytest.raises(SchemaViolation):
+        SchemaValidator(NESTED).validate({**VALID, field: value})
+
+
+def test_bool_is_not_an_int():
+    validator = SchemaValidator(SCHEMA)
+    with pytest.raises(SchemaViolation):
+        validator.validate({'name': 'Zach', 'age': True})
+    with pytest.raises(SchemaViolation):
+        validator.validate_field('age', False)
+    validator.validate_field('age', 29)
+
+
+def test_keys_must_match():
+    validator = SchemaValidator(NESTED)
+    with pytest.raises(KeyError):
+        validator.validate({**VALID, 'address': {'city': 'Provo'}})
+    with pytest.raises(SchemaViolation):
+        validator.validate_field('nickname', 'Z')
+    with pytest.raises(SchemaViolation): # the KeyError of a nested object is a SchemaViolation for a single field
+        validator.validate_field('address', {'city': 'Provo'})
+
+
+def test_find_json_in_prose_and_fences():
+    assert find_json('```json\n' + json.dumps(JSON_CONTENT) + '\n```') == JSON_CONTENT
+    assert find_json('Sure! Here it is: ' + json.dumps(JSON_CONTENT) + ' Anything else?') == JSON_CONTENT
+
+
+def test_find_json_skips_a_stray_object_before_the_real_one():
+    text = 'I replaced {placeholder} with the data: ' + json.dumps(JSON_CONTENT)
+    assert find_json(text) == JSON_CONTENT
+    assert find_json('Options: [a, b]. Result: {"ok": true}', openers='{') == {'ok': True}
+
+
+def test_find_json_ignores_brackets_and_escapes_inside_strings():
+    value = {'text': 'a } b ] c { d "quoted" \\ e'}
+    text = 'Note {see "}" below} ' + json.dumps(value)
+    assert find_json(text) == value
+
+
+def test_find_json_incomplete_object():
+    with pytest.raises(ValueError):
+        find_json('{"name": "Zach", "age": 2')
+    with pytest.raises(ValueError):
+        find_json('no JSON here')
+
+
+def test_scan_json_spans():
+    text = 'a {"x": "}"} b [1, [2]] c { ] d {}'
+    assert [text[start:end] for start, end in scan_json(text)] == ['{"x": "}"}', '[1, [2]]', '{}']
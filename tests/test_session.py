@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_sessions_keep_their_own_histories(openai_model):
+    model = openai_model(instructions='Answer briefly.')
+    initial_messages, prev_messages = list(model.initial_messages), list(model.prev_messages)
+    sessions = [model.session() for _ in range(8)]
+    barrier = threading.Barrier(len(sessions))
+
+    def converse(index: int):
+        session = sessions[index]
+        barrier.wait() # every session prompts at once
+        for turn in range(3):
+            assert session.prompt(f'session {index} turn {turn}') is not None
+
+    with ThreadPoolExecutor(len(sessions)) as executor:
+        list(executor.map(converse, range(len(sessions))))
+
+    for index, session in enumerate(sessions):
+        assert [message['content'] for message in session.messages if message['role'] == 'user'] == [f'session {index} turn {turn}' for turn in range(3)]
+        assert len(session) == 6 and session.calls == 3
+        assert session.history() == initial_messages + session.messages
+    assert sessions[0].prompt_tokens == sessions[1].prompt_tokens > 0 # each call only sees its own session's turns
+    assert (model.initial_messages, model.prev_messages) == (initial_messages, prev_messages)
+
+
+def test_concurrent_async_sessions_keep_their_own_histories(openai_model):
+    model = openai_model()
+    initial_messages = list(model.initial_messages)
+    sessions = [model.session() for _ in range(8)]
+
+    async def converse(index: int):
+        for turn in range(2):
+            assert await sessions[index].aprompt(f'session {index} turn {turn}') is not None
+
+    async def run():
+        await asyncio.gather(*(converse(index) for index in range(len(sessions))))
+        await model.aclose()
+
+    asyncio.run(run())
+    for index, session in enumerate(sessions):
+        assert [message['content'] for message in session.messages if message['role'] == 'user'] == [f'session {index} turn {turn}' for turn in range(2)]
+        assert session.calls == 2
+    assert model.initial_messages == initial_messages and model.prev_messages == initial_messages
+
+
+def test_clear_keeps_the_totals(openai_model):
+    session = openai_model().session()
+    session.prompt('Hello')
+    cost = session.cost
+    session.clear()
+    assert (len(session), session.calls, session.cost) == (0, 1, cost)
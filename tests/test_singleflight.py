@@ -0,0 +1,48 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+from conftest import SCHEMA, JSON_CONTENT
+
+CALLERS: int = 5
+
+
+def test_failed_call_raises_in_every_caller(server, openai_model):
+    model = openai_model(schema=SCHEMA, single_flight=True)
+    server.config.error_rate, server.config.latency = 1.0, 0.3
+
+    barrier = threading.Barrier(CALLERS)
+
+    def call(_):
+        barrier.wait() # every caller arrives while the first call is in flight
+        with pytest.raises(openai.InternalServerError):
+            model.prompt('Who?', history=model.new_history(), retries=1, raise_errors=True)
+
+    with ThreadPoolExecutor(CALLERS) as executor:
+        list(executor.map(call, range(CALLERS)))
+    assert server.stats.get(500) == 1
+    assert model.single_flight.stats()['coalesced'] == CALLERS - 1
+
+    server.config.error_rate, server.config.latency = 0.0, 0.0
+    assert model.prompt('Who?', history=model.new_history(), retries=1) == JSON_CONTENT # the failure is not kept: the next call asks the provider again
+    assert server.stats.get(200) == 1
+
+
+def test_failed_async_call_raises_in_every_caller(server, openai_model):
+    model = openai_model(schema=SCHEMA, single_flight=True)
+    server.config.error_rate, server.config.latency = 1.0, 0.3
+
+    async def main():
+        calls = [model.aprompt('Who?', history=model.new_history(), retries=1, raise_errors=True) for _ in range(CALLERS)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, openai.InternalServerError) for result in results)
+    assert server.stats.get(500) == 1
+
+    server.config.error_rate, server.config.latency = 0.0, 0.0
+    assert asyncio.run(model.aprompt('Who?', history=model.new_history(), retries=1)) == JSON_CONTENT
+    assert server.stats.get(200) == 1
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from swiftllm.ratelimit import RateLimiter
+from swiftllm.schema import SchemaViolation
+
+from conftest import SCHEMA, JSON_CONTENT
+
+
+def test_stream_records_cost_and_time_to_first_token(server, openai_model):
+    model = openai_model()
+    text = ''.join(model.stream('Hello'))
+
+    assert text == server.config.content
+    record = model.metrics.calls[-1]
+    assert record.streamed and record.completion_tokens > 0 and record.cost > 0
+    assert record.time_to_first_token is not None
+    assert model.last_stream_stats['completion_tokens'] == record.completion_tokens
+
+
+def test_streamed_prompt_costs_the_same_as_a_plain_prompt(server, openai_model):
+    plain, streamed = openai_model(), openai_model()
+    assert plain.prompt('Hello', history=plain.new_history()) == streamed.prompt('Hello', history=streamed.new_history(), stream=True)
+
+    assert streamed.last_inference_cost == plain.last_inference_cost > 0
+    record = streamed.metrics.calls[-1]
+    assert record.streamed and record.completion_tokens > 0
+    assert record.time_to_first_token is not None
+    assert streamed.last_stream_stats['time_to_first_token'] == record.time_to_first_token
+
+
+def test_groq_stream_default_is_priced_and_reconciles_the_rate_limiter(server, groq_model):
+    limiter = RateLimiter(tpm=100000)
+    model = groq_model(stream=True, rate_limit=limiter)
+    assert model.stream_default is True and callable(model.stream) # the default no longer hides the stream method
+
+    assert model.prompt('Hello') == server.config.content
+    record = model.metrics.calls[-1]
+    assert record.completion_tokens > 0 and record.cost > 0
+    assert record.time_to_first_token is not None
+    assert limiter.tokens.tokens > limiter.tokens.capacity - model.max_tokens # the unused max_tokens estimate was returned
+
+
+def test_async_streamed_prompt_is_priced(server, openai_model, groq_model):
+    for model in (openai_model(), groq_model()):
+        assert asyncio.run(model.aprompt('Hello', stream=True)) == server.config.content
+        record = model.metrics.calls[-1]
+        assert record.completion_tokens > 0 and record.cost > 0
+        assert record.time_to_first_token is not None
+
+
+def test_off_schema_stream_is_aborted_and_retried(server, openai_model):
+    model = openai_model(schema=SCHEMA, response_type='JSON', stream_validation=True)
+    server.config.json_content = {'nickname': 'Zach', 'bio': ' '.join(['word'] * 100), **JSON_CONTENT} # unexpected first key
+    server.config.tokens_per_second = 50 # the whole reply would take about 2 seconds
+
+    start = time.perf_counter()
+    with pytest.raises(SchemaViolation) as error:
+        model.prompt('Who?', history=model.new_history(), retries=3, raise_errors=True)
+    assert error.value.aborted
+    assert model.metrics.calls[-1].attempts == 3 # retried without opting in to validation_retries
+    assert time.perf_counter() - start < 1.5 # every attempt was cancelled after the first key
+
+    server.config.json_content = JSON_CONTENT
+    assert asyncio.run(model.aprompt('Who?', history=model.new_history(), retries=2)) == JSON_CONTENT
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from swiftllm.embeddings import HashingEmbeddings
+from swiftllm.vectorstore import NumpyVectorStore, MIN_CAPACITY
+
+TEXTS: list = ['Cats sleep most of the day.', 'Dogs like to play fetch.', 'Birds have feathers and fly.', 'Fish breathe with gills.']
+
+
+def random_vectors(rows: int, dim: int = 32, seed: int = 0):
+    return np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+
+
+def test_add_delete_and_search(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), HashingEmbeddings(dimensions=256))
+    ids = store.add_texts(TEXTS, [{'source': f'{i}.txt'} for i in range(len(TEXTS))], ids=['cats', 'dogs', 'birds', 'fish'])
+    assert ids == ['cats', 'dogs', 'birds', 'fish'] and len(store) == 4
+
+    document, score = store.similarity_search_with_score('Which animals play fetch?', k=1)[0]
+    assert document.id == 'dogs' and document.metadata == {'source': '1.txt'} and 0 < score <= 1
+
+    store.delete(['dogs'])
+    assert len(store) == 3
+    assert all(document.id != 'dogs' for document in store.similarity_search('Which animals play fetch?', k=4))
+
+    store.add_texts(['Cats purr.'], ids=['cats']) # an existing id is replaced
+    assert len(store) == 3
+    assert [document.page_content for document in store.get(['cats', 'dogs'])] == ['Cats purr.']
+
+
+def test_batched_search_matches_single_queries(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), HashingEmbeddings(dimensions=256))
+    store.add_texts(TEXTS)
+    queries = ['feathers', 'gills', 'fetch']
+    batched = store.similarity_search_many(queries, k=2)
+    single = [store.similarity_search_with_score(query, k=2) for query in queries]
+    assert [[document.page_content for document, _ in hits] for hits in batched] == [[document.page_content for document, _ in hits] for hits in single]
+
+
+class QueryEmbeddings(HashingEmbeddings):
+
+    def embed_documents(self, texts: list):
+        raise AssertionError('queries must not be embedded as documents')
+
+    def embed_queries(self, texts: list):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_batched_search_embeds_queries_as_queries(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), HashingEmbeddings(dimensions=256))
+    store.add_texts(TEXTS)
+    store.embedding_function = QueryEmbeddings(dimensions=256)
+    assert store.similarity_search_many(['gills'], k=1)[0][0][0].page_content == 'Fish breathe with gills.'
+
+
+def test_ivf_search_matches_exact_search(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = random_vectors(2000)
+    store.add_vectors(vectors, [str(i) for i in range(len(vectors))])
+    queries = random_vectors(20, seed=1)
+    exact = store.search_vectors(queries, k=5)
+
+    store.build_ivf(nlist=16, nprobe=4)
+    assert store.search_vectors(queries, k=5, nprobe=0) == exact # nprobe=0 bypasses the index
+    assert [[row for row, _ in hits] for hits in store.search_vectors(queries, k=5, nprobe=16)] == [[row for row, _ in hits] for hits in exact]
+    approximate = store.search_vectors(queries, k=5)
+    recall = np.mean([len({row for row, _ in a} & {row for row, _ in e}) / 5 for a, e in zip(approximate, exact)])
+    assert recall > 0.3
+
+
+def test_compaction_and_reload(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = random_vectors(MIN_CAPACITY + 200)
+    ids = store.add_vectors(vectors, [f'text {i}' for i in range(len(vectors))], [{'row': i} for i in range(len(vectors))])
+    store.build_ivf(nlist=8, nprobe=8)
+    store.delete(ids[:800])
+    expected = store.search_vectors(vectors[900:905], k=3)
+    store.persist() # more than half of the rows are deleted: compacts
+
+    assert store.count == len(vectors) - 800 and store.generation == 1
+    assert sorted(os.listdir(tmp_path)) == ['assignments.1.npy', 'centroids.npy', 'chunks.1.jsonl', 'offsets.1.npy', 'vectors.1.npy', 'vectorstore.json']
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == len(vectors) - 800
+    hits = reloaded.search_vectors(vectors[900:905], k=3)
+    assert [[reloaded.ids[row] for row, _ in query_hits] for query_hits in hits] == [[ids[row] for row, _ in query_hits] for query_hits in expected]
+    assert [score for query_hits in hits for _, score in query_hits] == pytest.approx([score for query_hits in expected for _, score in query_hits])
+    assert reloaded.get([ids[900]])[0].metadata == {'row': 900}
+
+
+def test_crash_during_compaction_leaves_the_old_store(tmp_path, monkeypatch):
+    store = NumpyVectorStore(str(tmp_path))
+    vectors = random_vectors(MIN_CAPACITY)
+    ids = store.add_vectors(vectors, [f'text {i}' for i in range(len(vectors))])
+    store.persist()
+    store.delete(ids[:600])
+
+    def crash():
+        raise OSError('disk full')
+
+    monkeypatch.setattr(store, 'write_state', crash)
+    with pytest.raises(OSError):
+        store.compact()
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == MIN_CAPACITY and reloaded.generation == 0
+    hits = reloaded.search_vectors(vectors[:3], k=1)
+    assert [reloaded.get([reloaded.ids[query_hits[0][0]]])[0].page_content for query_hits in hits] == ['text 0', 'text 1', 'text 2']